@@ -0,0 +1,363 @@
+"""
+Script pour mesurer les performances du pipeline et des graphiques sur des données synthétiques
+(voir src/synthetic_data.py).
+
+Chaque étape de treat_data.py et chaque fonction de src/charts est exécutée sur des données générées
+à différents facteurs d'échelle. Les résultats (temps et mémoire) sont ajoutés à ``RESULTS_PATH``
+avec le commit courant, pour pouvoir comparer les performances entre deux commits :
+
+    python benchmark.py --scales 1 5
+    python benchmark.py --compare <commit_avant> <commit_apres>
+
+On mesure aussi la latence des requêtes d'itinéraires (voir src/routing.py) sur toutes les paires de
+gares, ou sur un échantillon de ``--routing-pairs`` paires si elles sont trop nombreuses, et le débit
+du rattachement de points aux polygones des communes (voir src/spatial_join.py) :
+
+    python benchmark.py --spatial-points 100000
+"""
+import os
+import json
+import time
+import argparse
+import platform
+import subprocess
+import tracemalloc
+from datetime import datetime
+
+import numpy as np
+import geopandas as gpd
+
+import src.data_processing_utils as data_utils
+from src import synthetic_data
+from src import station_metrics
+from src import routing
+from src import spatial_join
+from src import validation
+from src.charts import covid, emissions, reseau
+
+RESULTS_PATH = "./data/reports/benchmarks.jsonl" # Fichier où sont ajoutés les résultats
+
+def current_commit() -> str:
+    """
+    Returns:
+        str: Le hash court du commit courant, suivi de "-dirty" si l'arbre de travail est modifié.
+    """
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+        dirty = subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "inconnu"
+    return commit + ("-dirty" if dirty else "")
+
+def measure(func, *args, repeat: int = 3) -> dict:
+    """
+    Mesure le temps d'exécution et le pic de mémoire d'une fonction.
+    Les temps sont mesurés sans tracemalloc (qui ralentit fortement le code), puis on fait
+    une exécution supplémentaire avec tracemalloc pour le pic de mémoire allouée.
+
+    Args:
+        func (callable): Fonction à mesurer.
+        *args: Arguments de la fonction.
+        repeat (int): Nombre d'exécutions pour la mesure du temps.
+    Returns:
+        dict: Les mesures, et le résultat de la fonction dans la clé "result".
+    """
+    wall_times = []
+    cpu_times = []
+    for _ in range(repeat):
+        cpu_start = time.process_time()
+        wall_start = time.perf_counter()
+        result = func(*args)
+        wall_times.append(time.perf_counter() - wall_start)
+        cpu_times.append(time.process_time() - cpu_start)
+
+    tracemalloc.start()
+    func(*args)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {
+        "wall_min_s": round(min(wall_times), 6),
+        "wall_mean_s": round(sum(wall_times) / len(wall_times), 6),
+        "cpu_mean_s": round(sum(cpu_times) / len(cpu_times), 6),
+        "peak_alloc_mb": round(peak / (1024 * 1024), 3),
+        "result": result,
+    }
+
+def validation_stage(source: str, reference: str = None):
+    """
+    Validation d'une source brute (voir src/validation.py), sans écrire de fichier de quarantaine.
+    Si ``reference`` est donnée, la deuxième entrée de l'étape est la source de référence, qui a une colonne de ce nom.
+    """
+    def stage(df, reference_df=None):
+        references = {reference: reference_df[reference]} if reference else None
+        return validation.validate(df, source, references, quarantine_path=None)[0]
+    return stage
+
+def pipeline_stages() -> list:
+    """
+    Étapes de treat_data.py, dans l'ordre. Chaque étape est un tuple (nom, fonction, clés des entrées, clé de la sortie).
+    Les entrées et sorties sont lues et écrites dans le dictionnaire des données générées.
+    """
+    return [
+        ("validate shapes", validation_stage("shapes"), ["shapes"], "shapes"),
+        ("validate speeds", validation_stage("speeds"), ["speeds"], "speeds"),
+        ("validate communes", validation_stage("communes"), ["communes"], "communes"),
+        ("validate gares", validation_stage("gares"), ["gares"], "gares"),
+        ("validate population", validation_stage("population", "code_commune_INSEE"), ["population", "communes"], "population"),
+        ("validate frequentations", validation_stage("frequentations", "code_uic"), ["frequentations", "gares"], "frequentations"),
+        ("validate emissions", validation_stage("emissions"), ["emissions"], "emissions"),
+        ("process_shapes", data_utils.process_shapes, ["shapes"], "processed_shapes"),
+        ("process_speeds", data_utils.process_speeds, ["speeds"], "processed_speeds"),
+        ("merge_shapes_speeds", data_utils.merge_shapes_speeds, ["processed_shapes", "processed_speeds"], "shapes_speeds"),
+        ("add_segment_lengths", data_utils.add_segment_lengths, ["shapes_speeds", "communes"], "shapes_speeds"),
+        ("compute_length_totals", data_utils.compute_length_totals, ["shapes_speeds"], "length_totals"),
+        ("process_frequentations", data_utils.process_frequentations, ["frequentations"], "processed_frequentations"),
+        ("process_gares", data_utils.process_gares, ["gares"], "processed_gares"),
+        ("treat_and_merge_communes_population", data_utils.treat_and_merge_communes_population, ["communes", "population"], "communes_population"),
+        ("merge_gares_frequentations", data_utils.merge_gares_frequentations, ["processed_gares", "processed_frequentations"], "gares_frequentations"),
+        ("merge_gares_communes", data_utils.merge_gares_communes, ["gares_frequentations", "communes_population"], "gares_communes"),
+        ("add_station_metrics", station_metrics.add_station_metrics, ["gares_communes"], "gares_communes"),
+        ("build_graph", routing.build_graph, ["shapes_speeds", "processed_gares"], "graph"),
+        ("process_emissions", data_utils.process_emissions, ["emissions"], "emissions_processed"),
+    ]
+
+def chart_builders() -> list:
+    """
+    Fonctions de src/charts à mesurer. Chaque élément est un tuple (nom, fonction, clés des entrées).
+    """
+    def render_map(shapes_speeds, gares_communes):
+        # Comme dans le callback update_map de main.py, on mesure aussi le rendu HTML
+        return reseau.generate_map(shapes_speeds, gares_communes).get_root().render()
+
+    return [
+        ("reseau.generate_map", render_map, ["shapes_speeds", "gares_communes"]),
+        ("reseau.generate_histogram", reseau.generate_histogram, ["shapes_speeds"]),
+        ("reseau.generate_histogram (longueur)", lambda shapes_speeds: reseau.generate_histogram(shapes_speeds, "Longueur (km)"), ["shapes_speeds"]),
+        ("reseau.generate_region_lengths_chart", reseau.generate_region_lengths_chart, ["length_totals"]),
+        ("reseau.generate_scatterplot", reseau.generate_scatterplot, ["gares_communes"]),
+        ("reseau.generate_piechart", reseau.generate_piechart, ["gares_communes"]),
+        ("covid.generate_line_plot", covid.generate_line_plot, ["gares_communes"]),
+        ("covid.generate_bar_chart", covid.generate_bar_chart, ["gares_communes"]),
+        ("emissions.generate_line_chart", emissions.generate_line_chart, ["emissions_processed"]),
+        ("emissions.generate_bar_chart", emissions.generate_bar_chart, ["emissions_processed"]),
+    ]
+
+def station_pairs(graph: dict, max_pairs: int, seed: int) -> list:
+    """
+    Paires (départ, arrivée) de nœuds de gares distinctes : toutes les paires s'il y en a au plus
+    ``max_pairs``, sinon un échantillon aléatoire de ``max_pairs`` paires.
+    """
+    nodes = np.unique(graph["station_node"][graph["station_node"] >= 0])
+    n_pairs = len(nodes) * (len(nodes) - 1)
+    if n_pairs <= max_pairs:
+        return [(int(source), int(target)) for source in nodes for target in nodes if source != target]
+    rng = np.random.default_rng(seed)
+    sources = rng.choice(nodes, max_pairs)
+    targets = rng.choice(nodes, max_pairs)
+    return [(int(source), int(target)) for source, target in zip(sources, targets) if source != target]
+
+def routing_queries(graph: dict, pairs: list) -> list:
+    """
+    Requêtes d'itinéraires à mesurer. Chaque élément est un tuple (nom, fonction appelée avec une paire de nœuds).
+    Dijkstra sans heuristique sert de référence pour mesurer le gain des repères ALT.
+    """
+    return [
+        ("routing.shortest_path (ALT)", lambda source, target: routing.shortest_path(graph, source, target)),
+        ("routing.shortest_path (Dijkstra)", lambda source, target: routing.shortest_path(graph, source, target, use_landmarks=False)),
+        ("routing.isochrone (60 min)", lambda source, target: routing.isochrone(graph, source, 3600)),
+    ]
+
+def measure_latencies(func, pairs: list) -> dict:
+    """
+    Mesure la latence de chaque requête.
+
+    Returns:
+        dict: Temps total (somme des latences, wall_total_s, à ne pas confondre avec le temps minimal
+        wall_min_s des autres étapes), et latences moyenne, médiane, 95e centile et maximale en millisecondes.
+    """
+    latencies = []
+    for source, target in pairs:
+        start = time.perf_counter()
+        func(source, target)
+        latencies.append(time.perf_counter() - start)
+    latencies = np.array(latencies) * 1000
+    return {
+        "wall_total_s": round(latencies.sum() / 1000, 6),
+        "latency_mean_ms": round(float(latencies.mean()), 4),
+        "latency_p50_ms": round(float(np.percentile(latencies, 50)), 4),
+        "latency_p95_ms": round(float(np.percentile(latencies, 95)), 4),
+        "latency_max_ms": round(float(latencies.max()), 4),
+        "peak_alloc_mb": None,
+    }
+
+def run_benchmarks(scales: list, repeat: int, seed: int, results_path: str, routing_pairs: int = 2000):
+    """
+    Exécute toutes les étapes et tous les graphiques pour chaque facteur d'échelle,
+    et ajoute les résultats au fichier ``results_path``.
+    """
+    commit = current_commit()
+    date = datetime.now().isoformat(timespec="seconds")
+    os.makedirs(os.path.dirname(results_path) or ".", exist_ok=True)
+
+    for scale in scales:
+        t1 = time.perf_counter()
+        data = synthetic_data.generate_raw_datasets(scale, seed)
+        t2 = time.perf_counter()
+        print(f"Échelle {scale} : données générées ({round(t2-t1,3)}s)")
+
+        benchmarks = [("pipeline",) + stage for stage in pipeline_stages()]
+        benchmarks += [("chart", name, func, inputs, None) for name, func, inputs in chart_builders()]
+
+        for kind, name, func, inputs, output in benchmarks:
+            args = [data[key] for key in inputs]
+            measures = measure(func, *args, repeat=repeat)
+            result = measures.pop("result")
+            if output is not None:
+                data[output] = result
+            record = {
+                "commit": commit,
+                "date": date,
+                "kind": kind,
+                "stage": name,
+                "scale": scale,
+                "seed": seed,
+                "rows_in": sum(len(arg) for arg in args),
+                "rows_out": len(result) if output is not None and not isinstance(result, dict) else None,
+                **measures,
+                "python": platform.python_version(),
+            }
+            with open(results_path, "a", encoding="utf-8") as results_file:
+                results_file.write(json.dumps(record, ensure_ascii=False) + "\n")
+            print(f"  {name:<40} {measures['wall_min_s']:>10.4f}s {measures['peak_alloc_mb']:>10.1f} Mo")
+
+        pairs = station_pairs(data["graph"], routing_pairs, seed)
+        for name, func in routing_queries(data["graph"], pairs) if pairs else []:
+            measures = measure_latencies(func, pairs)
+            record = {
+                "commit": commit,
+                "date": date,
+                "kind": "routing",
+                "stage": name,
+                "scale": scale,
+                "seed": seed,
+                "rows_in": len(pairs),
+                "rows_out": None,
+                **measures,
+                "python": platform.python_version(),
+            }
+            with open(results_path, "a", encoding="utf-8") as results_file:
+                results_file.write(json.dumps(record, ensure_ascii=False) + "\n")
+            print(f"  {name:<40} {measures['latency_p50_ms']:>8.3f}ms (médiane) {measures['latency_p95_ms']:>8.3f}ms (95e centile) sur {len(pairs)} paires")
+
+def run_spatial_benchmark(n_points: int, repeat: int, seed: int, results_path: str, moved_share: float = 0.01):
+    """
+    Mesure le rattachement de ``n_points`` points aux polygones des communes synthétiques (échelle 1) :
+    construction de l'index, rattachement de tous les points en un seul appel, puis rattachement
+    incrémental après le déplacement d'une part ``moved_share`` des points.
+    """
+    commit = current_commit()
+    date = datetime.now().isoformat(timespec="seconds")
+    os.makedirs(os.path.dirname(results_path) or ".", exist_ok=True)
+
+    communes, _ = synthetic_data.generate_communes_population(1.0, seed)
+    polygons = synthetic_data.generate_commune_polygons(communes)
+    index = spatial_join.build_commune_index(polygons, source_hash="synthetique")
+    points = synthetic_data.generate_points(n_points, seed)
+    stations = gpd.GeoDataFrame({"code_uic": np.arange(n_points)}, geometry=points, crs="EPSG:4326")
+    previous = spatial_join.assign_stations(stations, index)
+    moved = stations.copy()
+    moved_rows = np.random.default_rng(seed).choice(n_points, int(n_points * moved_share), replace=False)
+    moved.loc[moved_rows, "geometry"] = synthetic_data.generate_points(len(moved_rows), seed + 1)
+    print(f"Rattachement de {n_points} points à {len(polygons)} communes")
+
+    benchmarks = [
+        ("spatial_join.build_commune_index", spatial_join.build_commune_index, [polygons], len(polygons)),
+        ("spatial_join.assign_communes", lambda: spatial_join.assign_communes(index, points), [], n_points),
+        ("spatial_join.assign_stations (incrémental)", lambda: spatial_join.assign_stations(moved, index, previous), [], n_points),
+    ]
+    for name, func, args, rows in benchmarks:
+        measures = measure(func, *args, repeat=repeat)
+        measures.pop("result")
+        record = {
+            "commit": commit,
+            "date": date,
+            "kind": "spatial",
+            "stage": name,
+            "scale": 1.0,
+            "seed": seed,
+            "rows_in": rows,
+            "rows_out": None,
+            "points_per_s": round(rows / measures["wall_min_s"]) if measures["wall_min_s"] else None,
+            **measures,
+            "python": platform.python_version(),
+        }
+        with open(results_path, "a", encoding="utf-8") as results_file:
+            results_file.write(json.dumps(record, ensure_ascii=False) + "\n")
+        print(f"  {name:<45} {measures['wall_min_s']:>10.4f}s {str(record['points_per_s']):>12} objets/s")
+
+def load_results(results_path: str) -> list:
+    """
+    Returns:
+        list: Les résultats enregistrés dans ``results_path``.
+    """
+    with open(results_path, "r", encoding="utf-8") as results_file:
+        return [json.loads(line) for line in results_file if line.strip()]
+
+def _ratio(record_after: dict, record_before: dict, key: str) -> float:
+    if not record_before.get(key) or record_after.get(key) is None:
+        return float("nan")
+    return record_after[key] / record_before[key]
+
+def compare(results_path: str, before: str, after: str):
+    """
+    Affiche, pour chaque étape et chaque échelle mesurées aux deux commits, le rapport des temps
+    minimaux et des pics de mémoire (après / avant). Si un commit a été mesuré plusieurs fois,
+    on garde la dernière mesure. Les itinéraires, mesurés en latences par requête, sont comparés
+    à part : temps total, médiane et 95e centile des latences.
+    """
+    latest = {}
+    for record in load_results(results_path):
+        latest[(record["commit"], record["stage"], record["scale"])] = record
+
+    pairs = []
+    for (commit, stage, scale), record_before in sorted(latest.items(), key=lambda item: (item[0][2], item[0][1])):
+        if commit == before and (after, stage, scale) in latest:
+            pairs.append((stage, scale, record_before, latest[(after, stage, scale)]))
+
+    print(f"{'Étape':<40} {'Échelle':>8} {'Temps':>10} {'Mémoire':>10}")
+    for stage, scale, record_before, record_after in pairs:
+        if record_before.get("kind") == "routing":
+            continue
+        time_ratio = _ratio(record_after, record_before, "wall_min_s")
+        memory_ratio = _ratio(record_after, record_before, "peak_alloc_mb")
+        print(f"{stage:<40} {scale:>8} {time_ratio:>9.2f}x {memory_ratio:>9.2f}x")
+
+    routing_pairs = [pair for pair in pairs if pair[2].get("kind") == "routing"]
+    if routing_pairs:
+        print(f"\n{'Itinéraires':<40} {'Échelle':>8} {'Total':>10} {'Médiane':>10} {'95e c.':>10}")
+    for stage, scale, record_before, record_after in routing_pairs:
+        ratios = [_ratio(record_after, record_before, key) for key in ("wall_total_s", "latency_p50_ms", "latency_p95_ms")]
+        print(f"{stage:<40} {scale:>8} " + " ".join(f"{ratio:>9.2f}x" for ratio in ratios))
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark du pipeline et des graphiques sur des données synthétiques.")
+    parser.add_argument("--scales", type=float, nargs="+", default=[1.0], help="Facteurs d'échelle des données générées.")
+    parser.add_argument("--repeat", type=int, default=3, help="Nombre d'exécutions de chaque étape.")
+    parser.add_argument("--seed", type=int, default=0, help="Graine du générateur de données.")
+    parser.add_argument("--results", default=RESULTS_PATH, help="Fichier JSON lines des résultats.")
+    parser.add_argument("--routing-pairs", type=int, default=2000, help="Nombre maximal de paires de gares pour la latence des itinéraires.")
+    parser.add_argument("--spatial-points", type=int, help="Mesure seulement le rattachement de ce nombre de points aux communes.")
+    parser.add_argument("--compare", nargs=2, metavar=("AVANT", "APRES"), help="Compare les résultats de deux commits.")
+    args = parser.parse_args()
+
+    if args.compare:
+        compare(args.results, *args.compare)
+        return
+    if args.spatial_points:
+        run_spatial_benchmark(args.spatial_points, args.repeat, args.seed, args.results)
+        return
+    run_benchmarks(args.scales, args.repeat, args.seed, args.results, args.routing_pairs)
+
+if __name__ == "__main__":
+    main()
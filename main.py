@@ -1,45 +1,227 @@
-from src.charts.emissions import generate_widget as emissions_widget
-from src.charts.reseau import generate_widget as reseau_widget
-from src.charts.covid import generate_widget as covid_widget
+import time
+START_TIME = time.perf_counter() # Pour mesurer le temps de démarrage, imports compris
 
-from src.charts.covid import generate_line_plot
-from src.charts.reseau import generate_histogram
-from src.charts.reseau import generate_map
+import os
+import uuid
+import argparse
+import functools
+import threading
 
-import pandas as pd
-import geopandas as gpd
 import dash
 from dash import dcc
 from dash import html
-from dash.dependencies import Input, Output
+from dash.dependencies import Input, Output, State
+
+from src import profiling
+from src import snapshot
+from src.data_store import DataStore
+from src.jobs import JobQueue
+from src.export import register_export_routes
+from src.charts.job_status import job_status
+
+# pandas, geopandas, plotly.express, folium et les modules de src/charts sont importés au premier
+# usage : avec un instantané valide, le dashboard démarre sans construire aucune figure.
+
+EMISSIONS_PATH = "data/processed/emissions.csv"
+SHAPES_SPEEDS_PATH = "data/processed/shapes_speeds.geojson"
+GARES_COMMUNES_PATH = "data/processed/gares_communes.geojson"
+GRAPH_PATH = "data/processed/reseau_graph.npz" # Voir src/routing.py
+LONGUEURS_PATH = "data/processed/longueurs_reseau.csv" # Voir compute_length_totals dans src/data_processing_utils.py
+
+# Code dont dépend l'état du dashboard : s'il change, l'instantané est reconstruit
+CODE_PATHS = ["main.py", "src/charts/", "src/station_metrics.py", "src/routing.py"]
+
+# Colonnes utilisées par les graphiques de l'onglet COVID-19
+COVID_COLUMNS = ["nom_region", "Total Voyageurs"]
+
+def load_state(partitioned: bool = False) -> dict:
+    """
+    Lit les données traitées et construit le layout du dashboard avec toutes ses figures.
+
+    Args:
+        partitioned (bool): Si True, la fréquentation des gares est lue dans le jeu de données Parquet
+            partitionné par année (voir src/partitioned_data.py) au lieu de gares_communes.geojson.
+            Chaque onglet ne lit alors que les années et les colonnes dont il a besoin.
+    Returns:
+        dict: Les DataFrames utilisées par les callbacks et le layout du dashboard.
+    """
+    import pandas as pd
+    import geopandas as gpd
+    from src import partitioned_data
+    from src import routing
+    from src.charts.emissions import generate_widget as emissions_widget
+    from src.charts.reseau import generate_widget as reseau_widget
+    from src.charts.covid import generate_widget as covid_widget
+    from src.charts.gares import generate_widget as gares_widget
+    from src.charts.gares import prepare_metrics
+    from src.charts.gares import COLUMNS as GARES_COLUMNS
+    from src.charts.itineraires import generate_widget as itineraires_widget
+
+    # Lectures instrumentées (voir src/profiling.py), activées avec SNCF_PROFILE=1
+    read_file = profiling.instrument(gpd.read_file, name="gpd.read_file")
+    read_csv = profiling.instrument(pd.read_csv, name="pd.read_csv")
 
-def main():
     # Obtenir les données
-    emissions_df = pd.read_csv("data/processed/emissions.csv")
-    shapes_speeds_df = gpd.read_file("data/processed/shapes_speeds.geojson")
-    gares_communes = gpd.read_file("data/processed/gares_communes.geojson")
-    
-    app = dash.Dash(__name__)
-    
-    app.layout = html.Div([
-        dcc.Tabs([
-            dcc.Tab(label='Réseau ferroviaire', children=[
-                reseau_widget(shapes_speeds_df, gares_communes)
-            ]),
-            dcc.Tab(label='COVID-19', children=[
-                covid_widget(gares_communes)
-            ]),
-            dcc.Tab(label='Émissions de CO2', children=[
-                emissions_widget(emissions_df)
-            ]),
+    emissions_df = read_csv(EMISSIONS_PATH)
+    shapes_speeds_df = read_file(SHAPES_SPEEDS_PATH)
+    longueurs_df = read_csv(LONGUEURS_PATH)
+    if partitioned:
+        # La carte, le pie chart et le scatterplot ne montrent que l'année 2023
+        gares_reseau = partitioned_data.read_gares_communes(years=[2023])
+        # Le graphique en courbes (et l'export) montre toutes les années, le bar chart seulement 2019 et 2020
+        gares_covid = partitioned_data.read_gares_communes(columns=COVID_COLUMNS)
+        gares_covid_2019_2020 = partitioned_data.read_gares_communes(years=[2019, 2020], columns=COVID_COLUMNS)
+        gares_metrics = prepare_metrics(partitioned_data.read_gares_communes(columns=GARES_COLUMNS))
+    else:
+        gares_communes = read_file(GARES_COMMUNES_PATH)
+        gares_reseau = gares_communes
+        gares_covid = gares_communes
+        gares_covid_2019_2020 = gares_communes
+        gares_metrics = prepare_metrics(gares_communes)
+
+    # Le graphe est construit par treat_data.py, on le reconstruit s'il n'a pas encore été enregistré
+    if os.path.isfile(GRAPH_PATH):
+        graph = routing.load_graph(GRAPH_PATH)
+    else:
+        graph = routing.build_graph(shapes_speeds_df, gares_reseau)
+
+    with profiling.profile_stage("construction du layout"):
+        layout = html.Div([
+            dcc.Tabs([
+                dcc.Tab(label='Réseau ferroviaire', children=[
+                    reseau_widget(shapes_speeds_df, gares_reseau, longueurs_df)
+                ]),
+                dcc.Tab(label='COVID-19', children=[
+                    covid_widget(gares_covid, gares_covid_2019_2020)
+                ]),
+                dcc.Tab(label='Gares', children=[
+                    gares_widget(gares_metrics)
+                ]),
+                dcc.Tab(label='Itinéraires', children=[
+                    itineraires_widget(shapes_speeds_df, graph)
+                ]),
+                dcc.Tab(label='Émissions de CO2', children=[
+                    emissions_widget(emissions_df)
+                ]),
+            ])
         ])
-    ])
-    
+
+    return {
+        "emissions_df": emissions_df,
+        "shapes_speeds_df": shapes_speeds_df,
+        "longueurs_df": longueurs_df,
+        "gares_reseau": gares_reseau,
+        "gares_covid": gares_covid,
+        "gares_metrics": gares_metrics,
+        "graph": graph,
+        "layout": layout,
+    }
+
+def data_paths(partitioned: bool) -> list:
+    """
+    Returns:
+        list: Les fichiers et répertoires de data/processed lus par le dashboard.
+    """
+    if partitioned:
+        from src.partitioned_data import DATASET_PATH
+        return [EMISSIONS_PATH, SHAPES_SPEEDS_PATH, LONGUEURS_PATH, DATASET_PATH, GRAPH_PATH]
+    return [EMISSIONS_PATH, SHAPES_SPEEDS_PATH, LONGUEURS_PATH, GARES_COMMUNES_PATH, GRAPH_PATH]
+
+def state_hashes(partitioned: bool) -> dict:
+    """
+    Empreintes des données traitées et du code dont dépend l'état du dashboard (voir src/snapshot.py).
+    """
+    return snapshot.compute_hashes([*data_paths(partitioned), *CODE_PATHS])
+
+def load_state_with_snapshot(partitioned: bool = False) -> tuple:
+    """
+    Charge l'état du dashboard depuis l'instantané s'il est à jour, sinon le construit avec load_state
+    et enregistre un nouvel instantané.
+
+    Returns:
+        tuple: (état, True si l'état vient de l'instantané)
+    """
+    with profiling.profile_stage("empreintes des données"):
+        hashes = state_hashes(partitioned)
+    with profiling.profile_stage("lecture de l'instantané"):
+        state = snapshot.load_snapshot(hashes)
+    if state is not None:
+        return state, True
+    state = load_state(partitioned)
+    with profiling.profile_stage("écriture de l'instantané"):
+        snapshot.save_snapshot(state, hashes)
+    return state, False
+
+def time_first_call(func):
+    """
+    Décorateur qui affiche la durée du premier appel de la fonction. Les imports de pandas, plotly.express,
+    folium et des modules de src/charts sont faits au premier usage : avec un instantané, c'est le premier
+    rendu de chaque callback qui les paie, et non plus le démarrage.
+    """
+    first_call = threading.Event()
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        if first_call.is_set():
+            return func(*args, **kwargs)
+        first_call.set()
+        start = time.perf_counter()
+        result = func(*args, **kwargs)
+        print(f"Premier rendu de {func.__name__} en {round(time.perf_counter() - start, 3)}s")
+        return result
+
+    return wrapper
+
+def main(partitioned: bool = False, use_snapshot: bool = False, watch: bool = True):
+    """
+    Lance le dashboard.
+
+    Args:
+        partitioned (bool): Voir load_state.
+        use_snapshot (bool): Si True, l'état du dashboard est lu depuis l'instantané de src/snapshot.py
+            quand il est à jour (démarrage à chaud), et enregistré sinon (démarrage à froid).
+        watch (bool): Si True, les données sont rechargées à chaud quand les fichiers de data/processed
+            changent (voir src/data_store.py).
+    """
+    from_snapshot = False # Vrai si le dernier chargement vient de l'instantané
+
+    def load():
+        nonlocal from_snapshot
+        if use_snapshot:
+            state, from_snapshot = load_state_with_snapshot(partitioned)
+            return state
+        return load_state(partitioned)
+
+    store = DataStore(load, data_paths(partitioned))
+    print(f"Démarrage {'à chaud' if from_snapshot else 'à froid'} en {round(time.perf_counter() - START_TIME, 3)}s")
+    if watch:
+        store.start()
+
+    app = dash.Dash(__name__)
+    job_queue = JobQueue() # Rendus coûteux exécutés en arrière-plan (voir src/jobs.py)
+
+    def serve_layout():
+        # Appelée à chaque chargement de la page, pour afficher la dernière version des données.
+        # L'identifiant de la page permet d'annuler ses demandes remplacées sans toucher à celles des autres pages.
+        with store.acquire() as version:
+            return html.Div([dcc.Store(id="session_id", data=uuid.uuid4().hex), version.state["layout"]])
+
+    def job_result(job, group, n_outputs: int) -> tuple:
+        # Résultat d'une tâche terminée, ou sorties inchangées tant qu'elle ne l'est pas
+        result = job_queue.take_result(job, group) if job is not None else None
+        return result if result is not None else (dash.no_update,) * n_outputs
+
+    app.layout = serve_layout
+    register_export_routes(app, store) # Routes /export/... (voir src/export.py)
+
     # Callbacks
     @app.callback(
         Output('covid_line_plot', 'figure'),
-        [Input('covid_checklist', 'value')]
+        [Input('covid_checklist', 'value')],
+        prevent_initial_call=True, # La figure initiale est déjà dans le layout
     )
+    @profiling.instrument(name="callback update_line_plot")
+    @time_first_call
     def update_line_plot(selected_regions):
         """
         Pour mettre à jour le graphique selon si l'utilisateur a coché la région Île-de-France ou pas.
@@ -48,49 +230,174 @@ def main():
         Returns:
             fig (go.Figure): Figure Plotly Express contenant le graphique.
         """
+        from src.charts.covid import generate_line_plot
         with_idf = 'Île-de-France' in selected_regions
-        fig = generate_line_plot(gares_communes, with_idf)
+        with store.acquire() as version:
+            fig = generate_line_plot(version.state["gares_covid"], with_idf)
         return fig
-    
+
     @app.callback(
         Output('reseau_histogram', 'figure'),
-        [Input('reseau_slider', 'value')]
+        [Input('reseau_slider', 'value'), Input('reseau_histogram_mode', 'value')],
+        prevent_initial_call=True,
     )
-    def update_histogram(selected_range):
+    @profiling.instrument(name="callback update_histogram")
+    @time_first_call
+    def update_histogram(selected_range, mode):
         """
         Met à jour l'histogramme selon la plage de vitesse sélectionnée par l'utilisateur.
+        Les longueurs des tronçons sont précalculées par treat_data.py : aucun calcul géométrique ici.
         Args:
             selected_range (list): Liste contenant la plage de vitesse sélectionnée.
+            mode (str): Nombre de tronçons ou longueur (voir HISTOGRAM_MODES dans src/charts/reseau.py).
         Returns:
             fig (go.Figure): Figure Plotly Express contenant le graphique.
         """
-        filtered_df = shapes_speeds_df[(shapes_speeds_df['v_max'] >= selected_range[0]) & (shapes_speeds_df['v_max'] <= selected_range[1])]
-        fig = generate_histogram(filtered_df)
+        from src.charts.reseau import generate_histogram, filter_speed_range
+        with store.acquire() as version:
+            filtered_df = filter_speed_range(version.state["shapes_speeds_df"], selected_range)
+            fig = generate_histogram(filtered_df, mode)
         return fig
-    
+
     @app.callback(
-        Output("reseau_map", "srcDoc"),
-        [Input("reseau_radio", "value")],
+        [Output("reseau_map", "srcDoc"), Output("reseau_map_caption", "children"),
+         Output("reseau_map_job", "data"), Output("reseau_map_interval", "disabled"), Output("reseau_map_status", "children")],
+        [Input("reseau_radio", "value"), Input("reseau_map_interval", "n_intervals")],
+        [State("reseau_map_job", "data"), State("session_id", "data")],
+        prevent_initial_call=True,
     )
-    def update_map(selected_option):
+    @profiling.instrument(name="callback update_map")
+    def update_map(selected_option, _, job_id, session_id):
         """
         Met à jour la carte selon l'option sélectionnée par l'utilisateur.
+        Le rendu est fait en arrière-plan (voir src/jobs.py) : quand l'option change, on soumet une tâche,
+        puis l'intervalle rappelle ce callback jusqu'à ce que la carte soit prête.
         Args:
             selected_option (str): Option sélectionnée par l'utilisateur.
+            job_id (str): Identifiant de la tâche en cours.
+            session_id (str): Identifiant de la page, pour annuler la demande précédente de la même page.
         Returns:
-            fig (go.Figure): Figure Plotly Express contenant le graphique.
+            tuple: HTML de la carte Folium, longueur des lignes affichées, et état de la tâche.
         """
-        if selected_option == "Lignes à faible vitesse (< 100 km/h)":
-            filtered_df = shapes_speeds_df[shapes_speeds_df['v_max'] < 100]
-        elif selected_option == "Lignes à grande vitesse (> 100 km/h)":
-            filtered_df = shapes_speeds_df[shapes_speeds_df['v_max'] > 100]
+        if dash.ctx.triggered_id == "reseau_radio":
+            job = job_queue.submit(
+                ("reseau_map", store.current.number, selected_option),
+                lambda job: render_reseau_map(job, selected_option),
+                group=(session_id, "reseau_map"),
+            )
         else:
-            filtered_df = shapes_speeds_df
-        map_fig = generate_map(filtered_df, gares_communes)
-        map_html = map_fig.get_root().render()
-        return map_html
+            job = job_queue.get(job_id)
+        return (*job_result(job, (session_id, "reseau_map"), 2), *job_status(job))
+
+    @time_first_call
+    def render_reseau_map(job, selected_option):
+        from src.charts.reseau import generate_map, map_caption
+
+        def render_map(shapes_speeds_df, gares_reseau):
+            job.progress(0.1, "Filtrage des tronçons")
+            if selected_option == "Lignes à faible vitesse (< 100 km/h)":
+                filtered_df = shapes_speeds_df[shapes_speeds_df['v_max'] < 100]
+            elif selected_option == "Lignes à grande vitesse (> 100 km/h)":
+                filtered_df = shapes_speeds_df[shapes_speeds_df['v_max'] > 100]
+            else:
+                filtered_df = shapes_speeds_df
+            job.progress(0.2, "Construction de la carte")
+            map_fig = generate_map(filtered_df, gares_reseau, progress=job.progress)
+            job.progress(0.5, "Rendu de la carte") # Dernier point d'annulation : le rendu HTML est l'étape la plus longue
+            return map_fig.get_root().render()
+
+        # Le rendu ne dépend que de l'option et des données : on le garde en cache pour la version courante
+        with store.acquire() as version:
+            map_html = version.cached(
+                ("reseau_map", selected_option),
+                lambda: render_map(version.state["shapes_speeds_df"], version.state["gares_reseau"])
+            )
+            caption = map_caption(version.state["longueurs_df"], selected_option)
+        return map_html, caption
+
+    @app.callback(
+        [Output('gares_ranking_chart', 'figure'), Output('gares_table', 'data')],
+        [Input('gares_year', 'value'), Input('gares_metric', 'value'), Input('gares_regions', 'value'),
+         Input('gares_options', 'value'), Input('gares_top_n', 'value')],
+        prevent_initial_call=True,
+    )
+    @profiling.instrument(name="callback update_gares_ranking")
+    @time_first_call
+    def update_gares_ranking(year, metric, regions, options, top_n):
+        """
+        Met à jour le classement des gares selon les filtres choisis par l'utilisateur.
+        Les indicateurs sont précalculés (voir src/station_metrics.py), on ne fait que filtrer et trier.
+        Args:
+            year (int): Année sélectionnée.
+            metric (str): Indicateur sélectionné.
+            regions (list): Régions sélectionnées.
+            options (list): Options cochées ("anomalies", "ascending").
+            top_n (int): Nombre de gares à afficher.
+        Returns:
+            tuple: Figure Plotly Express du classement, et lignes du tableau.
+        """
+        from src.charts.gares import filter_metrics, generate_ranking_chart
+        with store.acquire() as version:
+            ranked_df = filter_metrics(version.state["gares_metrics"], year, metric, regions,
+                                       anomalies_only="anomalies" in options, top_n=top_n, ascending="ascending" in options)
+        return generate_ranking_chart(ranked_df, metric), ranked_df.round(2).to_dict("records")
+
+    @app.callback(
+        [Output("itineraires_map", "srcDoc"), Output("itineraires_summary", "children"),
+         Output("itineraires_job", "data"), Output("itineraires_interval", "disabled"), Output("itineraires_status", "children")],
+        [Input("itineraires_origin", "value"), Input("itineraires_destination", "value"), Input("itineraires_budget", "value"),
+         Input("itineraires_interval", "n_intervals")],
+        [State("itineraires_job", "data"), State("session_id", "data")],
+        prevent_initial_call=True,
+    )
+    @profiling.instrument(name="callback update_itineraires")
+    def update_itineraires(origin, destination, budget_minutes, _, job_id, session_id):
+        """
+        Met à jour l'itinéraire et les gares atteignables selon les gares choisies par l'utilisateur.
+        Le calcul est fait en arrière-plan, comme pour update_map.
+        Args:
+            origin (int): Code UIC de la gare de départ.
+            destination (int): Code UIC de la gare d'arrivée.
+            budget_minutes (int): Temps de trajet maximal pour l'isochrone, en minutes.
+            job_id (str): Identifiant de la tâche en cours.
+            session_id (str): Identifiant de la page.
+        Returns:
+            tuple: HTML de la carte Folium, texte du résumé, et état de la tâche.
+        """
+        if dash.ctx.triggered_id != "itineraires_interval":
+            job = job_queue.submit(
+                ("itineraires", store.current.number, origin, destination, budget_minutes),
+                lambda job: render_itineraires(job, origin, destination, budget_minutes),
+                group=(session_id, "itineraires"),
+            )
+        else:
+            job = job_queue.get(job_id)
+        return (*job_result(job, (session_id, "itineraires"), 2), *job_status(job))
+
+    @time_first_call
+    def render_itineraires(job, origin, destination, budget_minutes):
+        from src.charts.itineraires import compute_route, generate_route_map
+
+        def render(graph, shapes_speeds_df):
+            job.progress(0.1, "Calcul de l'itinéraire")
+            segments, reachable, summary = compute_route(graph, origin, destination, budget_minutes)
+            job.progress(0.4, "Construction de la carte")
+            map_fig = generate_route_map(shapes_speeds_df, segments, reachable, budget_minutes)
+            job.progress(0.6, "Rendu de la carte")
+            return map_fig.get_root().render(), summary
+
+        with store.acquire() as version:
+            return version.cached(
+                ("itineraires", origin, destination, budget_minutes),
+                lambda: render(version.state["graph"], version.state["shapes_speeds_df"])
+            )
 
     app.run(debug=True)
-    
+
 if __name__ == '__main__':
-    main()
+    parser = argparse.ArgumentParser(description="Lance le dashboard.")
+    parser.add_argument("--partitioned", action="store_true", help="Lit la fréquentation dans le jeu de données Parquet partitionné par année.")
+    parser.add_argument("--snapshot", action="store_true", help="Démarre depuis l'instantané de l'état du dashboard s'il est à jour (voir src/snapshot.py).")
+    parser.add_argument("--no-watch", action="store_true", help="Ne recharge pas les données quand les fichiers de data/processed changent.")
+    args = parser.parse_args()
+    main(partitioned=args.partitioned, use_snapshot=args.snapshot, watch=not args.no_watch)
@@ -3,7 +3,23 @@ import plotly.graph_objects as go
 import plotly.express as px
 from dash import dcc
 from dash import html
-import branca.colormap as cm
+
+def region_year_totals(gares_communes: pd.DataFrame, with_idf = True) -> pd.DataFrame:
+    """
+    Nombre total de voyageurs par région et par année, les données du graphique de generate_line_plot.
+    Également utilisée par l'export des données (voir src/export.py).
+
+    Args:
+        gares_communes (pd.DataFrame): Dataframe contenant les gares et leur fréquentation.
+        with_idf (bool): Si False, on retire l'Île-de-France.
+    Returns:
+        pd.DataFrame: Colonnes Année, nom_region et Total Voyageurs, triées par région et par année.
+    """
+    region_year_travelers = gares_communes.groupby(['Année', 'nom_region'])['Total Voyageurs'].sum().reset_index()
+    if not with_idf:
+        region_year_travelers = region_year_travelers.query('nom_region != "Île-de-France"').copy()
+    region_year_travelers['Année'] = region_year_travelers['Année'].astype(int)
+    return region_year_travelers.sort_values(['nom_region', 'Année']).reset_index(drop=True)
 
 def generate_line_plot(gares_communes: pd.DataFrame, with_idf = False) -> go.Figure:
     """
@@ -16,13 +32,8 @@ def generate_line_plot(gares_communes: pd.DataFrame, with_idf = False) -> go.Fig
     Returns:
         fig (go.Figure): Figure Plotly contenant le graphique.
     """
-    region_year_travelers = gares_communes.groupby(['Année', 'nom_region'])['Total Voyageurs'].sum().reset_index()
-    if not with_idf:
-        region_year_travelers = region_year_travelers.query('nom_region != "Île-de-France"').copy()
-    region_year_travelers['Année'] = region_year_travelers['Année'].astype(int)
-
     fig = px.line(
-        region_year_travelers.sort_values(['nom_region', 'Année']),
+        region_year_totals(gares_communes, with_idf),
         x='Année',
         y='Total Voyageurs',
         color='nom_region',
@@ -46,8 +57,8 @@ def generate_bar_chart(gares_communes: pd.DataFrame) -> go.Figure:
     Returns:
         fig (go.Figure): Figure Plotly contenant le graphique.
     """
-    region_year_travelers = gares_communes.groupby(['Année', 'nom_region'])['Total Voyageurs'].sum().reset_index()
-    region_year_travelers_2019_2020 = region_year_travelers.query('Année in [2019, 2020]').reset_index(drop=True)
+    gares_communes_2019_2020 = gares_communes[gares_communes['Année'].isin([2019, 2020])] # On filtre les années avant d'agréger
+    region_year_travelers_2019_2020 = gares_communes_2019_2020.groupby(['Année', 'nom_region'])['Total Voyageurs'].sum().reset_index()
     region_year_travelers_loss = region_year_travelers_2019_2020.pivot(index='nom_region', columns='Année', values='Total Voyageurs').reset_index()
     region_year_travelers_loss = region_year_travelers_loss.rename(columns={2019.0: "2019", 2020.0: "2020"})
     
@@ -67,7 +78,15 @@ def generate_bar_chart(gares_communes: pd.DataFrame) -> go.Figure:
     fig.update_layout(xaxis_tickangle=45)
     return fig
 
-def generate_widget(gares_communes: pd.DataFrame) -> dcc.Graph:
+def generate_widget(gares_communes: pd.DataFrame, gares_communes_2019_2020: pd.DataFrame = None) -> dcc.Graph:
+    """
+    Args:
+        gares_communes (pd.DataFrame): Gares et fréquentation de toutes les années, pour le graphique en courbes.
+        gares_communes_2019_2020 (pd.DataFrame): Gares et fréquentation de 2019 et 2020 pour le bar chart,
+            par exemple lues seules dans le jeu de données partitionné. Par défaut, gares_communes.
+    """
+    if gares_communes_2019_2020 is None:
+        gares_communes_2019_2020 = gares_communes
     layout = html.Div([
         dcc.Markdown(
             '''
@@ -86,7 +105,7 @@ def generate_widget(gares_communes: pd.DataFrame) -> dcc.Graph:
         ),
         dcc.Graph(
             id='covid_line_plot',
-            figure=generate_line_plot(gares_communes)
+            figure=generate_line_plot(gares_communes, with_idf=True) # Même valeur que la checklist ci-dessus
         ),
         dcc.Markdown(
             '''
@@ -99,7 +118,7 @@ def generate_widget(gares_communes: pd.DataFrame) -> dcc.Graph:
         ),
         dcc.Graph(
             id='covid_bar_chart',
-            figure=generate_bar_chart(gares_communes)
+            figure=generate_bar_chart(gares_communes_2019_2020)
         ),
         dcc.Markdown(
             '''
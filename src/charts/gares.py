@@ -0,0 +1,139 @@
+import pandas as pd
+import plotly.graph_objects as go
+import plotly.express as px
+from dash import dcc
+from dash import html
+from dash import dash_table
+
+from src.station_metrics import METRICS, BASELINE_YEAR, ANOMALY_THRESHOLD
+
+# Colonnes de gares_communes utilisées par l'onglet, on ne garde qu'elles pour que le filtrage soit rapide
+COLUMNS = ["code_uic", "libelle", "nom_region", "Année", "Total Voyageurs", *METRICS, "anomalie"]
+
+def prepare_metrics(gares_communes: pd.DataFrame) -> pd.DataFrame:
+    """
+    Réduit gares_communes (qui contient déjà les indicateurs de src/station_metrics.py) aux colonnes
+    utiles à l'onglet, sans géométrie. Appelé une seule fois au lancement du dashboard.
+
+    Args:
+        gares_communes (pd.DataFrame): Dataframe contenant les gares, leur fréquentation et leurs indicateurs.
+    Returns:
+        pd.DataFrame: Dataframe réduite.
+    """
+    metrics_df = pd.DataFrame(gares_communes[COLUMNS]).dropna(subset=["Année"]) # Gares sans fréquentation
+    metrics_df = metrics_df.astype({"code_uic": "int64", "Année": "int64"})
+    metrics_df["nom_region"] = metrics_df["nom_region"].fillna("Inconnue")
+    metrics_df["anomalie"] = metrics_df["anomalie"].fillna(False).astype(bool)
+    return metrics_df
+
+def filter_metrics(metrics_df: pd.DataFrame, year: int, metric: str, regions: list = None,
+                   anomalies_only: bool = False, top_n: int = 20, ascending: bool = False) -> pd.DataFrame:
+    """
+    Filtre et classe les gares selon un indicateur précalculé. Aucun indicateur n'est recalculé ici.
+
+    Args:
+        metrics_df (pd.DataFrame): Dataframe renvoyée par prepare_metrics.
+        year (int): Année à afficher.
+        metric (str): Colonne de l'indicateur (clé de METRICS).
+        regions (list): Régions à garder, toutes si None ou vide.
+        anomalies_only (bool): Si True, on ne garde que les variations anormales.
+        top_n (int): Nombre de gares à garder.
+        ascending (bool): Si True, on garde les plus petites valeurs (les plus fortes baisses par exemple).
+    Returns:
+        pd.DataFrame: Les ``top_n`` gares classées selon l'indicateur.
+    """
+    mask = (metrics_df["Année"] == year) & metrics_df[metric].notna()
+    if regions:
+        mask &= metrics_df["nom_region"].isin(regions)
+    if anomalies_only:
+        mask &= metrics_df["anomalie"]
+    filtered_df = metrics_df[mask]
+    if ascending:
+        return filtered_df.nsmallest(top_n, metric)
+    return filtered_df.nlargest(top_n, metric)
+
+def generate_ranking_chart(ranked_df: pd.DataFrame, metric: str) -> go.Figure:
+    """
+    Génère un bar chart horizontal des gares classées selon un indicateur.
+
+    Args:
+        ranked_df (pd.DataFrame): Dataframe renvoyée par filter_metrics.
+        metric (str): Colonne de l'indicateur (clé de METRICS).
+    Returns:
+        fig (go.Figure): Figure Plotly Express contenant le bar chart.
+    """
+    fig = px.bar(
+        ranked_df.iloc[::-1], # La première gare du classement est affichée en haut
+        x=metric,
+        y="libelle",
+        orientation="h",
+        color="nom_region",
+        hover_data=["Total Voyageurs"],
+        labels={metric: METRICS[metric], "libelle": "Gare", "nom_region": "Région"},
+        title=f"Classement des gares : {METRICS[metric]}",
+    )
+    fig.update_layout(height=max(400, 25 * len(ranked_df)), yaxis={"categoryorder": "trace"})
+    return fig
+
+def generate_widget(metrics_df: pd.DataFrame) -> html.Div:
+    """
+    Génère l'onglet de classement des gares selon leurs indicateurs d'évolution.
+
+    Args:
+        metrics_df (pd.DataFrame): Dataframe renvoyée par prepare_metrics.
+    Returns:
+        layout (html.Div): Layout Dash contenant le widget.
+    """
+    years = sorted(metrics_df["Année"].dropna().unique().tolist())
+    regions = sorted(metrics_df["nom_region"].unique().tolist())
+    default_year = years[-1]
+    default_metric = "ratio_reprise"
+    ranked_df = filter_metrics(metrics_df, default_year, default_metric)
+
+    layout = html.Div([
+        dcc.Markdown(f'''
+        ## Évolution de la fréquentation par gare
+
+        Pour chaque gare, on a calculé la variation de fréquentation d'une année sur l'autre, le ratio de reprise
+        par rapport à {BASELINE_YEAR} (1 signifie que la gare a retrouvé sa fréquentation d'avant le COVID),
+        le taux de croissance annuel moyen sur toute la période, et un z-score qui compare la variation de la gare
+        à celle des autres gares la même année. Une variation est considérée comme anormale si son z-score
+        dépasse {ANOMALY_THRESHOLD} en valeur absolue.
+        '''),
+        html.Div([
+            html.Label("Année"),
+            dcc.Dropdown(id="gares_year", options=years, value=default_year, clearable=False),
+            html.Label("Indicateur"),
+            dcc.Dropdown(
+                id="gares_metric",
+                options=[{"label": label, "value": metric} for metric, label in METRICS.items()],
+                value=default_metric,
+                clearable=False,
+            ),
+            html.Label("Régions"),
+            dcc.Dropdown(id="gares_regions", options=regions, value=[], multi=True, placeholder="Toutes les régions"),
+            dcc.Checklist(
+                id="gares_options",
+                options=[
+                    {"label": "Variations anormales seulement", "value": "anomalies"},
+                    {"label": "Plus petites valeurs d'abord", "value": "ascending"},
+                ],
+                value=[],
+            ),
+            html.Label("Nombre de gares"),
+            dcc.Slider(id="gares_top_n", min=5, max=100, step=5, value=20),
+        ]),
+        dcc.Graph(
+            id="gares_ranking_chart",
+            figure=generate_ranking_chart(ranked_df, default_metric),
+        ),
+        dash_table.DataTable(
+            id="gares_table",
+            columns=[{"name": name, "id": name} for name in COLUMNS],
+            data=ranked_df.round(2).to_dict("records"),
+            page_size=20,
+            sort_action="native",
+        ),
+    ])
+
+    return layout
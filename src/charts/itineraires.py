@@ -0,0 +1,139 @@
+import pandas as pd
+from dash import dcc
+from dash import html
+
+from src import routing
+from src.charts.job_status import generate_job_status
+
+DEFAULT_BUDGET_MINUTES = 60
+
+def station_options(graph: dict) -> list:
+    """
+    Returns:
+        list: Options des listes déroulantes, une par gare rattachée au réseau, triées par nom.
+    """
+    mapped = graph["station_node"] >= 0
+    options = [
+        {"label": name, "value": int(code_uic)}
+        for name, code_uic in zip(graph["station_name"][mapped], graph["station_code_uic"][mapped])
+    ]
+    return sorted(options, key=lambda option: option["label"])
+
+def format_duration(seconds: float) -> str:
+    """
+    Returns:
+        str: La durée au format "1 h 05" ou "45 min".
+    """
+    minutes = int(round(seconds / 60))
+    return f"{minutes // 60} h {minutes % 60:02d}" if minutes >= 60 else f"{minutes} min"
+
+def compute_route(graph: dict, origin: int, destination: int, budget_minutes: float) -> tuple:
+    """
+    Calcule l'itinéraire le plus rapide entre deux gares et les gares atteignables depuis la gare de départ.
+
+    Args:
+        graph (dict): Graphe du réseau (voir src/routing.py).
+        origin (int): Code UIC de la gare de départ, ou None.
+        destination (int): Code UIC de la gare d'arrivée, ou None.
+        budget_minutes (float): Temps maximal pour l'isochrone, en minutes.
+    Returns:
+        tuple: (positions des tronçons de l'itinéraire dans shapes_speeds_df, gares atteignables, texte du résumé)
+    """
+    if origin is None:
+        return [], None, "Choisissez une gare de départ."
+    # -1 pour une gare inconnue (options d'une version précédente des données) ou trop loin du réseau :
+    # ce n'est pas un nœud, l'index -1 désignerait le dernier nœud du graphe
+    source = routing.station_node(graph, origin)
+    if source < 0:
+        return [], None, "Gare de départ non rattachée au réseau."
+    reachable = routing.isochrone(graph, source, budget_minutes * 60)
+    summary = f"{(reachable['code_uic'] != origin).sum()} gares atteignables en moins de {format_duration(budget_minutes * 60)} à vitesse maximale."
+    if destination is None:
+        return [], reachable, summary
+
+    target = routing.station_node(graph, destination)
+    if target < 0:
+        return [], reachable, f"Gare d'arrivée non rattachée au réseau. {summary}"
+    seconds, meters, _, segments = routing.shortest_path(graph, source, target)
+    if seconds == float("inf"):
+        return [], reachable, f"Aucun itinéraire sur le réseau entre ces deux gares. {summary}"
+    return segments, reachable, f"Trajet le plus rapide : {format_duration(seconds)} à vitesse maximale, {meters / 1000:.0f} km. {summary}"
+
+def generate_route_map(shapes_speeds_df: pd.DataFrame, segments: list, reachable: pd.DataFrame,
+                       budget_minutes: float) -> "folium.Map":
+    """
+    Carte de l'itinéraire et des gares atteignables. Seuls les tronçons de l'itinéraire sont dessinés,
+    pour que la carte reste légère.
+
+    Args:
+        shapes_speeds_df (pd.DataFrame): Dataframe contenant les formes des lignes et les vitesses maximales.
+        segments (list): Positions des tronçons de l'itinéraire dans shapes_speeds_df.
+        reachable (pd.DataFrame): Gares atteignables (voir routing.isochrone), ou None.
+        budget_minutes (float): Temps maximal de l'isochrone, pour l'échelle de couleurs.
+    Returns:
+        fig (folium.Map): Figure Folium contenant la carte.
+    """
+    import folium
+    import branca.colormap as cm
+
+    fig = folium.Map(location=(46.539758, 2.430331), tiles='OpenStreetMap', zoom_start=6)
+
+    if reachable is not None and not reachable.empty:
+        colormap = cm.linear.YlOrRd_09.scale(0, budget_minutes)
+        colormap.caption = "Temps de trajet (min)"
+        for row in reachable.itertuples():
+            folium.CircleMarker(
+                location=[row.lat, row.lon],
+                radius=4,
+                color=colormap(row.temps / 60),
+                fill=True,
+                fill_opacity=0.8,
+                popup=folium.Popup(f"{row.libelle}<br>{format_duration(row.temps)}", max_width=250),
+            ).add_to(fig)
+        colormap.add_to(fig)
+
+    if segments:
+        folium.GeoJson(
+            shapes_speeds_df.iloc[segments][["v_max", "lib_ligne", "geometry"]],
+            style_function=lambda x: {'color': 'blue', 'weight': 5, 'opacity': 0.9},
+            tooltip=folium.GeoJsonTooltip(fields=['v_max', "lib_ligne"], aliases=['Vitesse (km/h)', 'Ligne']),
+        ).add_to(fig)
+
+    return fig
+
+def generate_widget(shapes_speeds_df: pd.DataFrame, graph: dict) -> html.Div:
+    """
+    Génère l'onglet des itinéraires entre gares.
+
+    Args:
+        shapes_speeds_df (pd.DataFrame): Dataframe contenant les formes des lignes et les vitesses maximales.
+        graph (dict): Graphe du réseau (voir src/routing.py).
+    Returns:
+        layout (html.Div): Layout Dash contenant le widget.
+    """
+    options = station_options(graph)
+    # Aucune gare n'est sélectionnée au départ : la carte initiale est vide
+    map_html = generate_route_map(shapes_speeds_df, [], None, DEFAULT_BUDGET_MINUTES).get_root().render()
+
+    layout = html.Div([
+        dcc.Markdown('''
+        ## Itinéraires sur le réseau ferré
+
+        Le réseau est modélisé comme un graphe dont les arêtes sont les tronçons de lignes, parcourus à leur vitesse
+        maximale. Les temps affichés sont donc des temps de parcours minimaux, sans arrêts ni correspondances.
+        Choisissez une gare de départ pour voir les gares atteignables, et une gare d'arrivée pour voir le trajet le plus rapide.
+        '''),
+        html.Div([
+            html.Label("Gare de départ"),
+            dcc.Dropdown(id="itineraires_origin", options=options, placeholder="Gare de départ"),
+            html.Label("Gare d'arrivée"),
+            dcc.Dropdown(id="itineraires_destination", options=options, placeholder="Gare d'arrivée"),
+            html.Label("Temps de trajet maximal (minutes)"),
+            dcc.Slider(id="itineraires_budget", min=15, max=240, step=15, value=DEFAULT_BUDGET_MINUTES),
+        ]),
+        dcc.Markdown("Choisissez une gare de départ.", id="itineraires_summary"),
+        generate_job_status("itineraires"), # Le calcul est fait en arrière-plan (voir src/jobs.py)
+        html.Iframe(id="itineraires_map", srcDoc=map_html, style={'width': '100%', 'height': '600px'}),
+    ])
+
+    return layout
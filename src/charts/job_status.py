@@ -0,0 +1,41 @@
+from dash import dcc
+from dash import html
+
+POLL_INTERVAL_MS = 300 # Intervalle entre deux consultations de l'état d'une tâche (voir src/jobs.py)
+
+def generate_job_status(prefix: str) -> html.Div:
+    """
+    Composants pour suivre une tâche en arrière-plan : l'identifiant de la tâche, un intervalle qui
+    déclenche la consultation de son état (désactivé quand aucune tâche n'est en cours), et la zone
+    où s'affichent la progression ou l'erreur.
+
+    Args:
+        prefix (str): Préfixe des identifiants des composants, par exemple "reseau_map".
+    Returns:
+        layout (html.Div): Layout Dash contenant les composants.
+    """
+    return html.Div([
+        dcc.Store(id=f"{prefix}_job"),
+        dcc.Interval(id=f"{prefix}_interval", interval=POLL_INTERVAL_MS, disabled=True),
+        html.Div(id=f"{prefix}_status"),
+    ])
+
+def job_status(job) -> tuple:
+    """
+    État d'une tâche pour les sorties des composants de generate_job_status.
+
+    Args:
+        job (Job): La tâche, ou None si elle est inconnue.
+    Returns:
+        tuple: (identifiant de la tâche, True si l'intervalle doit être désactivé, contenu de la zone d'état)
+    """
+    if job is None:
+        return None, True, "La tâche a expiré, veuillez réessayer."
+    if job.status == "erreur":
+        return job.id, True, html.Span(f"Erreur : {job.error}", style={"color": "red"})
+    if job.done:
+        return job.id, True, None
+    return job.id, False, html.Div([
+        html.Progress(value=str(job.fraction), max="1", style={"width": "300px"}),
+        html.Span(f" {job.message}"),
+    ])
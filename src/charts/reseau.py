@@ -1,13 +1,15 @@
 import pandas as pd
 import plotly.graph_objects as go
 import plotly.express as px
-from plotly.subplots import make_subplots
 from dash import dcc
 from dash import html
-import folium
-import branca.colormap as cm
 
-def generate_map(shapes_speeds_df : pd.DataFrame, gares_communes : pd.DataFrame) -> folium.Map:
+from src.charts.job_status import generate_job_status
+
+# Options de l'histogramme : on compte les tronçons, ou on somme leurs longueurs (calculées par add_segment_lengths)
+HISTOGRAM_MODES = ["Nombre de tronçons", "Longueur (km)"]
+
+def generate_map(shapes_speeds_df : pd.DataFrame, gares_communes : pd.DataFrame, progress = None) -> "folium.Map":
     """
     Voir notebooks/3_merge_shapes_speeds.ipynb et 6_merge_gares_frequentation.ipynb
     Il s'agit d'une carte qui montre les lignes de train et la vitesse maximale sur chaque
@@ -16,9 +18,17 @@ def generate_map(shapes_speeds_df : pd.DataFrame, gares_communes : pd.DataFrame)
     Args:
         shapes_speeds_df (pd.DataFrame): Dataframe contenant les formes des lignes et les vitesses maximales.
         gares_communes (pd.DataFrame): Dataframe contenant les gares et leur fréquentation.
+        progress (callable): Si donnée, appelée avec (avancement, message) entre les étapes, par exemple
+            Job.progress pour qu'une tâche annulée s'arrête au plus tôt (voir src/jobs.py).
     Returns:    
         fig (folium.Map): Figure Folium contenant la carte.
     """
+    if progress is None:
+        progress = lambda fraction, message: None
+    # folium et branca ne sont importés qu'ici, car ils ne servent qu'à la carte
+    import folium
+    import branca.colormap as cm
+
     # On crée une carte Folium
     linear = cm.linear.viridis.scale(0, 300)
     fig = folium.Map(
@@ -47,6 +57,7 @@ def generate_map(shapes_speeds_df : pd.DataFrame, gares_communes : pd.DataFrame)
     ).add_to(fig)
     
     # On ajoute les gares
+    progress(0.4, "Ajout des gares")
     gares_les_plus_frequentees_2023 = gares_communes.query("`Total Voyageurs` > 5000000 and Année == 2023").copy()
     # On ne prend que les gares dont la fréquentation était supérieure à 5 millions de voyageurs en 2023.
     # Pour plus de clareté, on enlève les gares hors de l'île de France
@@ -72,26 +83,50 @@ def generate_map(shapes_speeds_df : pd.DataFrame, gares_communes : pd.DataFrame)
     
     return fig
 
-def generate_histogram(shapes_speeds_df : pd.DataFrame) -> go.Figure:
+def filter_speed_range(shapes_speeds_df: pd.DataFrame, selected_range: list) -> pd.DataFrame:
+    """
+    Tronçons dont la vitesse maximale est dans la plage sélectionnée avec le slider de l'histogramme.
+    Également utilisée par l'export des données (voir src/export.py).
+
+    Args:
+        shapes_speeds_df (pd.DataFrame): Dataframe contenant les formes des lignes et les vitesses maximales.
+        selected_range (list): Vitesses minimale et maximale, bornes comprises.
+    Returns:
+        pd.DataFrame: Les tronçons filtrés.
+    """
+    return shapes_speeds_df[(shapes_speeds_df['v_max'] >= selected_range[0]) & (shapes_speeds_df['v_max'] <= selected_range[1])]
+
+def generate_histogram(shapes_speeds_df : pd.DataFrame, mode : str = HISTOGRAM_MODES[0]) -> go.Figure:
     """
     Voir notebooks/2_speeds.ipynb 
     Il s'agit d'un histogramme qui montre les vitesses maximales sur chaque tronçon de ligne.
+    Il peut compter les tronçons, ou être pondéré par leur longueur précalculée (colonne longueur_km).
     
     Args:
         shapes_speeds_df (pd.DataFrame): Dataframe contenant les formes des lignes et les vitesses maximales.
+        mode (str): Une des options de HISTOGRAM_MODES.
     Returns:    
         fig (go.Figure): Figure Plotly contenant l'histogramme.
     """
     fig = go.Figure()
-    fig.add_trace(go.Histogram(
-        x=shapes_speeds_df['v_max'],
-        nbinsx=50,
-        hovertemplate='Vitesse: %{x} km/h<br>Nombre de tronçons: %{y}<extra></extra>',
-    ))
+    if mode == "Longueur (km)":
+        fig.add_trace(go.Histogram(
+            x=shapes_speeds_df['v_max'],
+            y=shapes_speeds_df['longueur_km'],
+            histfunc='sum',
+            nbinsx=50,
+            hovertemplate='Vitesse: %{x} km/h<br>Longueur: %{y:.0f} km<extra></extra>',
+        ))
+    else:
+        fig.add_trace(go.Histogram(
+            x=shapes_speeds_df['v_max'],
+            nbinsx=50,
+            hovertemplate='Vitesse: %{x} km/h<br>Nombre de tronçons: %{y}<extra></extra>',
+        ))
     fig.update_layout(
         title='Vitesse maximale sur chaque tronçon de ligne',
         xaxis_title='Vitesse (km/h)',
-        yaxis_title='Nombre de tronçons',
+        yaxis_title=mode,
         xaxis=dict(
             tickmode='linear',
             dtick=10
@@ -100,6 +135,60 @@ def generate_histogram(shapes_speeds_df : pd.DataFrame) -> go.Figure:
     
     return fig
 
+def speed_lengths(longueurs_df : pd.DataFrame) -> pd.DataFrame:
+    """
+    Returns:
+        pd.DataFrame: Longueur totale du réseau pour chaque vitesse maximale (colonnes v_max et longueur_km),
+        extraite des totaux précalculés par compute_length_totals.
+    """
+    speeds_df = longueurs_df.query("groupe == 'vitesse'")
+    return pd.DataFrame({
+        "v_max": pd.to_numeric(speeds_df["cle"], errors="coerce"),
+        "longueur_km": speeds_df["longueur_km"],
+    })
+
+def map_caption(longueurs_df : pd.DataFrame, selected_option : str) -> str:
+    """
+    Texte affiché sous les boutons radio de la carte : longueur des lignes affichées et part du réseau.
+
+    Args:
+        longueurs_df (pd.DataFrame): Totaux précalculés par compute_length_totals.
+        selected_option (str): Option sélectionnée dans les boutons radio de la carte.
+    """
+    speeds_df = speed_lengths(longueurs_df)
+    total_km = speeds_df["longueur_km"].sum()
+    if selected_option == "Lignes à faible vitesse (< 100 km/h)":
+        selected_km = speeds_df.loc[speeds_df["v_max"] < 100, "longueur_km"].sum()
+    elif selected_option == "Lignes à grande vitesse (> 100 km/h)":
+        selected_km = speeds_df.loc[speeds_df["v_max"] > 100, "longueur_km"].sum()
+    else:
+        selected_km = total_km
+    share = 100 * selected_km / total_km if total_km else 0
+    selected_km = f"{selected_km:,.0f}".replace(",", " ") # Séparateur des milliers à la française
+    return f"Lignes affichées : {selected_km} km, soit {share:.0f} % du réseau."
+
+def generate_region_lengths_chart(longueurs_df : pd.DataFrame) -> go.Figure:
+    """
+    Génère un bar chart de la longueur du réseau par région, en distinguant les lignes à plus de 100 km/h.
+
+    Args:
+        longueurs_df (pd.DataFrame): Totaux précalculés par compute_length_totals.
+    Returns:
+        fig (go.Figure): Figure Plotly Express contenant le bar chart.
+    """
+    regions_df = longueurs_df.query("groupe == 'region'").copy()
+    regions_df["Lignes à grande vitesse (> 100 km/h)"] = regions_df["longueur_grande_vitesse_km"]
+    regions_df["Autres lignes"] = regions_df["longueur_km"] - regions_df["longueur_grande_vitesse_km"]
+    fig = px.bar(
+        regions_df.sort_values("longueur_km"),
+        x=["Lignes à grande vitesse (> 100 km/h)", "Autres lignes"],
+        y="libelle",
+        orientation="h",
+        labels={"value": "Longueur (km)", "libelle": "Région", "variable": ""},
+        title="Longueur du réseau par région",
+    )
+    return fig
+
 def generate_scatterplot(gares_communes: pd.DataFrame) -> go.Figure:
     """
     Génère un scatterplot montrant la fréquentation des gares à fort trafic (> 5M voyageurs)
@@ -149,15 +238,23 @@ def generate_piechart(gares_communes: pd.DataFrame) -> go.Figure:
     )
     return fig
 
-def generate_widget(shapes_speeds_df : pd.DataFrame, gares_frequentations : pd.DataFrame) -> html.Div:
+def generate_widget(shapes_speeds_df : pd.DataFrame, gares_frequentations : pd.DataFrame, longueurs_df : pd.DataFrame) -> html.Div:
     
-    map_fig = generate_map(shapes_speeds_df, gares_frequentations)
+    # La carte initiale correspond à l'option sélectionnée par défaut dans les boutons radio
+    map_fig = generate_map(shapes_speeds_df[shapes_speeds_df['v_max'] > 100], gares_frequentations)
     map_html = map_fig.get_root().render()
     
     histogram = generate_histogram(shapes_speeds_df)
     min_speed = shapes_speeds_df['v_max'].min()
     max_speed = shapes_speeds_df['v_max'].max()
     
+    region_lengths_chart = generate_region_lengths_chart(longueurs_df)
+    speeds_df = speed_lengths(longueurs_df)
+    # Comme dans map_caption : 0 % si le réseau est vide (par exemple si tous les tronçons sont en quarantaine)
+    total_km = speeds_df["longueur_km"].sum()
+    high_speed_share = 100 * speeds_df.loc[speeds_df["v_max"] > 100, "longueur_km"].sum() / total_km if total_km else 0
+    high_speed_count_share = 100 * (shapes_speeds_df['v_max'] > 100).mean() if len(shapes_speeds_df) else 0
+    
     scatterplot = generate_scatterplot(gares_frequentations)
     piechart = generate_piechart(gares_frequentations)
 
@@ -169,6 +266,12 @@ def generate_widget(shapes_speeds_df : pd.DataFrame, gares_frequentations : pd.D
         '''
         ),
         html.Div([
+            dcc.RadioItems(
+                id='reseau_histogram_mode',
+                options=HISTOGRAM_MODES,
+                value=HISTOGRAM_MODES[0],
+                inline=True,
+            ),
             dcc.Graph(
                 id='reseau_histogram',
                 figure=histogram,
@@ -181,10 +284,10 @@ def generate_widget(shapes_speeds_df : pd.DataFrame, gares_frequentations : pd.D
                 step=25
             ),
         ]),
-        dcc.Markdown('''
+        dcc.Markdown(f'''
         On constate que la majorité des tronçons de lignes sont à faible vitesse (< 150 km/h).
-        Il est important de noter que le nombre de tronçons de lignes à grande vitesse est très faible, mais qu'ils représentent la moitié du réseau ferroviaire français, car ils sont plus longs que les tronçons lents.
-        On peut le voir en regardant la carte ci-dessous en jouant avec les boutons radio.
+        Il est important de noter que le nombre de tronçons de lignes à plus de 100 km/h est faible ({high_speed_count_share:.0f} % des tronçons), mais qu'ils représentent {high_speed_share:.0f} % de la longueur du réseau ferroviaire français, car ils sont plus longs que les tronçons lents.
+        On peut le voir en pondérant l'histogramme par la longueur des tronçons, ou en regardant la carte ci-dessous en jouant avec les boutons radio.
                      
         On peut également visualiser la carte du réseau ferroviaire français, avec les gares les plus fréquentées (> 5 millions de voyageurs en 2023) et la vitesse maximale sur chaque tronçon de ligne.
         Pour des raisons de clareté, on ne montre pas les gares de l'île de France, qui sont de loin les plus fréquentées (voir le scatterplot ci-dessous).
@@ -195,12 +298,18 @@ def generate_widget(shapes_speeds_df : pd.DataFrame, gares_frequentations : pd.D
                 options=["Lignes à faible vitesse (< 100 km/h)", "Lignes à grande vitesse (> 100 km/h)", "Réseau complet"],
                 value="Lignes à grande vitesse (> 100 km/h)",
             ),
+            dcc.Markdown(map_caption(longueurs_df, "Lignes à grande vitesse (> 100 km/h)"), id='reseau_map_caption'),
+            generate_job_status('reseau_map'), # La carte est rendue en arrière-plan (voir src/jobs.py)
             html.Iframe(
                 id='reseau_map',
                 srcDoc=map_html,
                 style={'width': '100%', 'height': '600px'}
             ),
         ]),
+        dcc.Graph(
+            id='reseau_region_lengths',
+            figure=region_lengths_chart,
+        ),
         dcc.Markdown('''
         On remarque que la zone où le réseau est le plus dense est l'Île-de-France, car Paris est le hub de transport français (il n'existe pas de ligne TGV directe entre Montpellier et Marseille par exemple).
         Les zones où le réseau est le moins exploité par les TGV sont le Massif Central, les Pyrénnées, et le Grand Est.
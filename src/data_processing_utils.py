@@ -2,6 +2,11 @@ import pandas as pd
 import numpy as np
 import geopandas as gpd
 
+from src.profiling import instrument
+
+LAMBERT_93 = "EPSG:2154" # Projection métrique officielle pour la France métropolitaine
+
+@instrument
 def process_shapes(shapes_df : pd.DataFrame) -> pd.DataFrame:
     """
     Voir notebooks/1_shapes.ipynb
@@ -21,6 +26,7 @@ def process_shapes(shapes_df : pd.DataFrame) -> pd.DataFrame:
     shapes_df_processed = shapes_df_processed.reset_index(drop=True)
     return shapes_df_processed
 
+@instrument
 def process_speeds(speeds_df : pd.DataFrame, ignore_na=True) -> pd.DataFrame:
     """
     Voir notebooks/2_speeds.ipynb
@@ -35,9 +41,11 @@ def process_speeds(speeds_df : pd.DataFrame, ignore_na=True) -> pd.DataFrame:
     """
     relevant_columns = ["code_ligne", "lib_ligne", "v_max","geometry","pkd","pkf"] # On garde les colonnes qui peuvent être des clés primaires (voir 1_shapes.ipynb)
     speeds_df_processed = speeds_df[relevant_columns].copy() # On garde une copie pour éviter de modifier l'original
-    speeds_df_processed["v_max"] = speeds_df_processed["v_max"].astype("Int64") # v_max est par défaut un object, on le convertit en int64
-    # On convertit la vitesse max en entier nullable (la méthode .astype(int) ne fonctionne que pour les entiers non-nullables, 
-    # voir https://stackoverflow.com/questions/21287624/convert-pandas-column-containing-nans-to-dtype-int)
+    # v_max est par défaut un object : on le convertit en nombre (une valeur non numérique devient NaN au lieu de faire
+    # échouer la conversion, voir src/validation.py), puis en entier nullable (la méthode .astype(int) ne fonctionne que
+    # pour les entiers non-nullables, voir https://stackoverflow.com/questions/21287624/convert-pandas-column-containing-nans-to-dtype-int)
+    # Sans arrondi : une vitesse décimale est mise en quarantaine par la validation, et fait échouer la conversion sinon
+    speeds_df_processed["v_max"] = pd.to_numeric(speeds_df_processed["v_max"], errors="coerce").astype("Int64")
     if ignore_na:
         speeds_df_processed = speeds_df_processed[~speeds_df_processed["v_max"].isna()]
         # Si on ignore les NaN, on supprime les lignes qui en contiennent
@@ -50,6 +58,7 @@ def process_speeds(speeds_df : pd.DataFrame, ignore_na=True) -> pd.DataFrame:
     speeds_df_processed = speeds_df_processed.rename(columns={"pkd":"pk_debut_r","pkf":"pk_fin_r"})
     return speeds_df_processed
 
+@instrument
 def merge_shapes_speeds(shapes_df, speeds_df):
     """
     Voir notebooks/3_merge_shapes_speeds.ipynb
@@ -85,6 +94,73 @@ def merge_shapes_speeds(shapes_df, speeds_df):
     
     return merged_df
 
+@instrument
+def add_segment_lengths(shapes_speeds_df: gpd.GeoDataFrame, communes_df: pd.DataFrame) -> gpd.GeoDataFrame:
+    """
+    Ajoute à chaque tronçon sa longueur et sa région. Les longueurs en degrés n'ont pas de sens : on reprojette
+    les tronçons une seule fois en Lambert-93 (projection métrique officielle pour la France métropolitaine),
+    et les longueurs sont ensuite enregistrées avec les données traitées pour que le dashboard n'ait aucun
+    calcul géométrique à faire.
+
+    Les tronçons n'ont pas de région : on prend celle de la commune la plus proche du milieu du tronçon.
+    Un tronçon à cheval sur deux régions est donc compté entièrement dans l'une des deux.
+
+    Args:
+        shapes_speeds_df (gpd.GeoDataFrame): Tronçons et vitesses fusionnés par merge_shapes_speeds.
+        communes_df (pd.DataFrame): DataFrame contenant les données de communes-france.csv (avec latitude et longitude).
+    Returns:
+        gpd.GeoDataFrame: Dataframe avec les colonnes longueur_km et nom_region en plus.
+    """
+    shapes_speeds_df = shapes_speeds_df.reset_index(drop=True)
+    projected = shapes_speeds_df.geometry.to_crs(LAMBERT_93)
+    result_df = shapes_speeds_df.copy()
+    result_df["longueur_km"] = projected.length.to_numpy() / 1000
+
+    communes_df = communes_df.dropna(subset=["latitude", "longitude", "nom_region"])
+    communes_points = gpd.GeoDataFrame(
+        communes_df[["nom_region"]].reset_index(drop=True),
+        geometry=gpd.points_from_xy(communes_df["longitude"], communes_df["latitude"]),
+        crs="EPSG:4326"
+    ).to_crs(LAMBERT_93)
+    midpoints = gpd.GeoDataFrame(geometry=projected.interpolate(0.5, normalized=True), crs=LAMBERT_93) # À mi-longueur du tronçon
+    nearest = gpd.sjoin_nearest(midpoints, communes_points, how="left")
+    nearest = nearest[~nearest.index.duplicated()] # En cas d'égalité, sjoin_nearest renvoie plusieurs communes
+    result_df["nom_region"] = nearest["nom_region"].reindex(result_df.index).fillna("Inconnue").to_numpy()
+    return result_df
+
+@instrument
+def compute_length_totals(shapes_speeds_df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Longueurs totales du réseau par vitesse maximale, par ligne et par région, à partir des longueurs
+    calculées par add_segment_lengths. Le résultat est petit (quelques centaines de lignes) et sert directement
+    au dashboard.
+
+    Args:
+        shapes_speeds_df (pd.DataFrame): Dataframe renvoyée par add_segment_lengths.
+    Returns:
+        pd.DataFrame: Une ligne par groupe ("vitesse", "ligne" ou "region") et par valeur (colonne cle),
+        avec le nombre de tronçons, la longueur totale, la longueur à plus de 100 km/h et la part du réseau (en %).
+    """
+    segments_df = pd.DataFrame(shapes_speeds_df[["code_ligne", "lib_ligne", "v_max", "nom_region", "longueur_km"]])
+    segments_df["longueur_grande_vitesse_km"] = segments_df["longueur_km"].where(segments_df["v_max"] > 100, 0)
+    total_km = segments_df["longueur_km"].sum()
+
+    totals = []
+    for groupe, key, label in [("vitesse", "v_max", "v_max"), ("ligne", "code_ligne", "lib_ligne"), ("region", "nom_region", "nom_region")]:
+        grouped = segments_df.assign(cle=segments_df[key].astype(str), libelle=segments_df[label].astype(str)).groupby("cle", sort=False)
+        group_totals = grouped.agg(
+            libelle=("libelle", "first"),
+            nombre_troncons=("longueur_km", "size"),
+            longueur_km=("longueur_km", "sum"),
+            longueur_grande_vitesse_km=("longueur_grande_vitesse_km", "sum"),
+        ).reset_index()
+        group_totals.insert(0, "groupe", groupe)
+        totals.append(group_totals.sort_values("longueur_km", ascending=False))
+    totals_df = pd.concat(totals, ignore_index=True)
+    totals_df["part_km"] = 100 * totals_df["longueur_km"] / total_km if total_km else 0.0
+    return totals_df
+
+@instrument
 def process_frequentations(frequentations_df : pd.DataFrame) -> pd.DataFrame:
     """
     Voir notebooks/4_frequentation_gares.ipynb
@@ -114,6 +190,7 @@ def process_frequentations(frequentations_df : pd.DataFrame) -> pd.DataFrame:
     frequentations_df_processed = frequentations_df_processed.reset_index(drop=True)
     return frequentations_df_processed
 
+@instrument
 def process_gares(gares_df : pd.DataFrame) -> pd.DataFrame:
     """
     Voir notebooks/5_liste_gares.ipynb
@@ -128,7 +205,7 @@ def process_gares(gares_df : pd.DataFrame) -> pd.DataFrame:
     gares_processed_df = gares_df.query("voyageurs == 'O'")
     gares_processed_df = gares_processed_df.drop(columns=["voyageurs"])
     gares_processed_df = gares_processed_df.reset_index(drop=True)
-    gares_processed_df["fret"] = gares_processed_df["fret"].apply(lambda x: x == "O") # Par défaut, la colonne fret est un object, on la convertit en booléen
+    gares_processed_df["fret"] = gares_processed_df["fret"].eq("O") # Par défaut, la colonne fret est un object, on la convertit en booléen
     # fret contient des valeurs "O" et "N", on les remplace par True et False
 
     # On ne garde que les colonnes qui nous intéressent
@@ -138,6 +215,7 @@ def process_gares(gares_df : pd.DataFrame) -> pd.DataFrame:
     gares_processed_df["code_uic"] = gares_processed_df["code_uic"].astype("Int64") # On convertit le code UIC en entier pour éviter les problèmes de type
     return gares_processed_df
 
+@instrument
 def merge_gares_frequentations(gares_df : pd.DataFrame, frequentations_df : pd.DataFrame) -> gpd.GeoDataFrame:
     """
     Voir notebooks/6_merge_gares_frequentation.ipynb
@@ -156,6 +234,7 @@ def merge_gares_frequentations(gares_df : pd.DataFrame, frequentations_df : pd.D
     merged_df = gpd.GeoDataFrame(merged_df, geometry=merged_df.geometry) # On convertit le DataFrame en GeoDataFrame
     return merged_df
 
+@instrument
 def treat_and_merge_communes_population(communes_df,population_df):
     """
     Voir notebooks/6_merge_gares_frequentation.ipynb
@@ -185,11 +264,15 @@ def treat_and_merge_communes_population(communes_df,population_df):
     
     return communes_population_df
 
+@instrument
 def merge_gares_communes(gares_frequentations_df: gpd.GeoDataFrame, communes_population_df: pd.DataFrame) -> gpd.GeoDataFrame:
     """
     Voir notebooks/6_merge_gares_frequentation.ipynb
     Fusion des données de gares et de communes.
-    On utilise la colonne code_postal pour faire la jointure entre les deux dataframes.
+    Si les gares ont été rattachées à la commune qui les contient (colonne code_commune_INSEE, voir
+    src/spatial_join.py), on fait la jointure sur le code INSEE. Sinon, et pour les gares qui n'ont pas pu
+    être rattachées, on utilise la colonne code_postal : un code postal pouvant couvrir plusieurs communes,
+    on garde alors la première.
     
     Args:
         gares_frequentations_df (gpd.GeoDataFrame): DataFrame contenant les données de gares et de fréquentation
@@ -197,10 +280,21 @@ def merge_gares_communes(gares_frequentations_df: gpd.GeoDataFrame, communes_pop
     Returns:
         gpd.GeoDataFrame: Dataframe fusionnée.
     """
-    merged_df = gares_frequentations_df.merge(communes_population_df, on="code_postal", how="left")
+    if "code_commune_INSEE" in gares_frequentations_df.columns:
+        located = gares_frequentations_df["code_commune_INSEE"].isin(communes_population_df["code_commune_INSEE"])
+        # Le fichier des communes a une ligne par couple (commune, code postal) : une seule ligne par commune suffit ici
+        communes_by_insee = communes_population_df.drop_duplicates(subset=["code_commune_INSEE"]).drop(columns=["code_postal"])
+        by_insee_df = gares_frequentations_df[located].merge(communes_by_insee, on="code_commune_INSEE", how="left")
+        by_postal_df = gares_frequentations_df[~located].drop(columns=["code_commune_INSEE"])
+        by_postal_df = by_postal_df.merge(communes_population_df, on="code_postal", how="left")
+        merged_df = pd.concat([by_insee_df, by_postal_df], ignore_index=True)
+        merged_df = gpd.GeoDataFrame(merged_df, geometry="geometry", crs=gares_frequentations_df.crs)
+    else:
+        merged_df = gares_frequentations_df.merge(communes_population_df, on="code_postal", how="left")
     merged_df = merged_df.drop_duplicates(subset=["code_uic", "Année"])
     return merged_df
 
+@instrument
 def process_emissions(emissions_df: pd.DataFrame) -> pd.DataFrame:
     emissions_processed_df = emissions_df.copy()
     emissions_processed_df = emissions_processed_df.rename(columns={
@@ -0,0 +1,239 @@
+"""
+Versions des données du dashboard, rechargées à chaud.
+
+Le dashboard lit ses données dans un ``DataStore`` au lieu de les capturer une fois pour toutes dans
+les callbacks. Un thread surveille le marqueur ``COMPLETION_MARKER_PATH``, que treat_data.py supprime
+au début du traitement et écrit en dernier : quand un nouveau marqueur apparaît, tous les fichiers de
+data/processed sont complets. La nouvelle version est alors chargée en arrière-plan puis remplace
+l'ancienne d'un coup, sans interrompre le serveur :
+
+- les callbacks en cours gardent la version qu'ils ont acquise jusqu'à la fin de la requête ;
+- l'ancienne version est libérée dès que la dernière requête qui l'utilise est terminée ;
+- chaque version a son propre cache, de taille limitée, qui disparaît avec elle (pas d'invalidation à gérer) ;
+- on ne charge jamais une nouvelle version tant qu'une ancienne est encore utilisée, donc on a au
+  plus une version de plus en mémoire que la version courante.
+"""
+import os
+import time
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+
+POLL_INTERVAL = 5.0 # Intervalle en secondes entre deux vérifications des fichiers surveillés
+COMPLETION_MARKER_PATH = "./data/processed/_TRAITEMENT_TERMINE" # Écrit par treat_data.py à la fin du traitement
+CACHE_MAX_ENTRIES = 16 # Nombre de valeurs gardées dans le cache d'une version (cartes HTML de plusieurs Mo)
+
+def files_signature(paths: list) -> dict:
+    """
+    Signature peu coûteuse des fichiers surveillés (date de modification et taille), recalculée à chaque
+    vérification. Pour un répertoire (jeu de données Parquet partitionné), on prend tous ses fichiers.
+
+    Args:
+        paths (list): Chemins des fichiers ou répertoires.
+    Returns:
+        dict: Dictionnaire chemin -> liste de (nom, date de modification, taille).
+    """
+    signature = {}
+    for path in paths:
+        if os.path.isdir(path):
+            file_paths = sorted(os.path.join(root, name) for root, _, names in os.walk(path) for name in names)
+        elif os.path.isfile(path):
+            file_paths = [path]
+        else:
+            file_paths = []
+        entries = []
+        for file_path in file_paths:
+            try:
+                stat = os.stat(file_path)
+            except FileNotFoundError: # Fichier supprimé pendant le parcours, il sera vu à la prochaine vérification
+                continue
+            entries.append((file_path, stat.st_mtime_ns, stat.st_size))
+        signature[path] = entries
+    return signature
+
+def clear_completion_marker(marker_path: str = COMPLETION_MARKER_PATH):
+    """
+    Supprime le marqueur de fin de traitement, avant d'écrire le moindre fichier de data/processed :
+    le dashboard ne recharge pas les données tant que le marqueur n'est pas écrit à nouveau.
+    """
+    if os.path.isfile(marker_path):
+        os.remove(marker_path)
+
+def write_completion_marker(marker_path: str = COMPLETION_MARKER_PATH):
+    """
+    Écrit le marqueur de fin de traitement, une fois tous les fichiers de data/processed écrits.
+    Le marqueur est écrit dans un fichier temporaire puis renommé, le renommage étant atomique.
+    """
+    temporary_path = marker_path + ".tmp"
+    with open(temporary_path, "w", encoding="utf-8") as marker_file:
+        marker_file.write(f"{time.time()}\n")
+    os.replace(temporary_path, marker_path)
+
+class DataVersion:
+    """
+    Une version des données : l'état du dashboard (voir main.load_state) et un cache propre à cette version.
+    """
+    def __init__(self, number: int, state: dict, signature: dict, cache_max_entries: int = CACHE_MAX_ENTRIES):
+        self.number = number
+        self.state = state
+        self.signature = signature
+        self.readers = 0 # Nombre de requêtes en cours qui utilisent cette version
+        self.retired = False # True quand une version plus récente l'a remplacée
+        self._cache = OrderedDict() # Du moins récemment utilisé au plus récemment utilisé
+        self._cache_max_entries = cache_max_entries
+        self._cache_lock = threading.Lock()
+
+    def cached(self, key, compute):
+        """
+        Renvoie la valeur associée à ``key`` dans le cache de la version, en la calculant avec ``compute()``
+        si elle n'y est pas encore. Deux requêtes simultanées peuvent calculer la même valeur, la dernière gagne.
+        Le cache est limité à ``CACHE_MAX_ENTRIES`` valeurs : au-delà, la valeur la moins récemment utilisée
+        est oubliée, pour que la mémoire d'une version ne grandisse pas avec le nombre de combinaisons demandées.
+
+        Args:
+            key: Clé hashable, par exemple ("carte", option sélectionnée).
+            compute (callable): Fonction sans argument qui calcule la valeur.
+        """
+        with self._cache_lock:
+            if key in self._cache:
+                self._cache.move_to_end(key)
+                return self._cache[key]
+        value = compute()
+        with self._cache_lock:
+            self._cache[key] = value
+            self._cache.move_to_end(key)
+            while len(self._cache) > self._cache_max_entries:
+                self._cache.popitem(last=False)
+        return value
+
+    def release(self):
+        """
+        Libère les données et le cache de la version. Les objets sont ensuite détruits par le ramasse-miettes.
+        """
+        self.state = None
+        with self._cache_lock:
+            self._cache.clear()
+
+class DataStore:
+    """
+    Gère la version courante des données et son remplacement à chaud (voir la documentation du module).
+
+    Args:
+        loader (callable): Fonction sans argument qui charge l'état du dashboard.
+        watched_paths (list): Fichiers et répertoires lus par ``loader``, dont la signature identifie la version.
+        poll_interval (float): Intervalle en secondes entre deux vérifications.
+        marker_path (str): Marqueur de fin de traitement dont l'apparition déclenche un rechargement.
+    """
+    def __init__(self, loader, watched_paths: list, poll_interval: float = POLL_INTERVAL,
+                 marker_path: str = COMPLETION_MARKER_PATH):
+        self.loader = loader
+        self.watched_paths = watched_paths
+        self.poll_interval = poll_interval
+        self.marker_path = marker_path
+        self._condition = threading.Condition()
+        self._retired = [] # Versions remplacées mais encore utilisées par des requêtes en cours
+        self._stop = threading.Event()
+        self._thread = None
+        self._marker = self._marker_signature()
+        signature = files_signature(watched_paths)
+        self._current = DataVersion(1, loader(), signature)
+
+    @property
+    def current(self) -> DataVersion:
+        """
+        La version courante. Dans un callback, préférer ``acquire`` qui garantit que la version
+        n'est pas libérée pendant la requête.
+        """
+        return self._current
+
+    @contextmanager
+    def acquire(self):
+        """
+        Donne la version courante pour la durée du bloc ``with``. Une version remplacée pendant le bloc
+        reste utilisable jusqu'à sa fin.
+
+        Yields:
+            DataVersion: La version courante au début du bloc.
+        """
+        with self._condition:
+            version = self._current
+            version.readers += 1
+        try:
+            yield version
+        finally:
+            with self._condition:
+                version.readers -= 1
+                if version.retired and version.readers == 0:
+                    self._release(version)
+
+    def _release(self, version: DataVersion):
+        # Appelée avec self._condition acquis
+        version.release()
+        if version in self._retired:
+            self._retired.remove(version)
+        self._condition.notify_all()
+
+    def reload(self, signature: dict = None) -> DataVersion:
+        """
+        Charge une nouvelle version et la rend courante. On attend d'abord que les versions déjà remplacées
+        soient libérées, pour ne jamais avoir plus d'une version en plus de la version courante.
+
+        Args:
+            signature (dict): Signature des fichiers correspondant à la nouvelle version, recalculée si None.
+        Returns:
+            DataVersion: La nouvelle version.
+        """
+        with self._condition:
+            self._condition.wait_for(lambda: not self._retired)
+        if signature is None:
+            signature = files_signature(self.watched_paths)
+        state = self.loader() # En dehors du verrou : les requêtes continuent sur la version courante
+        with self._condition:
+            old_version = self._current
+            self._current = DataVersion(old_version.number + 1, state, signature)
+            old_version.retired = True
+            if old_version.readers == 0:
+                old_version.release()
+            else:
+                self._retired.append(old_version)
+        return self._current
+
+    def _marker_signature(self) -> list:
+        """
+        Returns:
+            list: Signature du marqueur de fin de traitement, vide s'il n'existe pas (traitement en cours).
+        """
+        return files_signature([self.marker_path])[self.marker_path]
+
+    def _watch(self):
+        """
+        Boucle du thread de surveillance. On ne recharge que quand un nouveau marqueur de fin de traitement
+        est écrit : les dates de modification des fichiers ne disent pas si treat_data.py a fini de les écrire
+        (un paquet lent du jeu Parquet partitionné ressemble à une écriture terminée).
+        """
+        failed = None # Marqueur dont le chargement a échoué, on attend un nouveau traitement
+        while not self._stop.wait(self.poll_interval):
+            marker = self._marker_signature()
+            if not marker or marker == self._marker or marker == failed:
+                continue
+            try:
+                version = self.reload()
+                self._marker = marker
+                print(f"Données rechargées (version {version.number})")
+            except Exception as error: # Données invalides : on garde la version courante
+                print(f"Échec du rechargement des données : {error}")
+                failed = marker
+
+    def start(self):
+        """
+        Démarre le thread de surveillance des fichiers.
+        """
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._watch, name="data-store-watcher", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        """
+        Arrête le thread de surveillance des fichiers.
+        """
+        self._stop.set()
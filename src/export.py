@@ -0,0 +1,254 @@
+"""
+Export des données filtrées du dashboard, pour les analyses hors du dashboard.
+
+Les routes sont ajoutées au serveur Flask de Dash (``app.server``) :
+
+- ``/export/troncons`` : les tronçons de lignes, filtrés par vitesse maximale comme l'histogramme
+  de l'onglet Réseau (paramètres ``v_min`` et ``v_max``) ;
+- ``/export/voyageurs_regions`` : le nombre total de voyageurs par région et par année, les données du
+  graphique de l'onglet COVID-19 (paramètres ``idf``, comme la case à cocher, ``regions`` et ``annees``).
+
+Paramètres communs : ``format`` (``csv``, ``parquet`` ou ``geojson``, ce dernier pour les tronçons
+seulement) et ``columns``, la liste des colonnes à exporter séparées par des virgules.
+
+La réponse est envoyée par paquets de ``CHUNK_ROWS`` lignes : chaque paquet est sérialisé puis envoyé,
+le fichier complet n'est jamais construit en mémoire. En Parquet, chaque paquet devient un groupe de
+lignes (row group) du fichier.
+
+Chaque réponse a un ETag calculé à partir de la version des données (voir src/data_store.py) et des
+paramètres normalisés. Un client qui renvoie cet ETag dans ``If-None-Match`` reçoit une réponse 304
+sans contenu tant que les données n'ont pas changé.
+"""
+import io
+import json
+import hashlib
+
+from flask import Response, abort, request
+
+# pandas, pyarrow et les modules de src/charts sont importés au premier export, comme dans main.py
+
+CHUNK_ROWS = 5000 # Nombre de lignes sérialisées et envoyées à la fois
+
+FORMATS = {
+    "csv": "text/csv; charset=utf-8",
+    "parquet": "application/vnd.apache.parquet",
+    "geojson": "application/geo+json",
+}
+
+def _parse_list(name: str) -> list:
+    """
+    Returns:
+        list: Valeurs du paramètre ``name`` séparées par des virgules, ou None s'il est absent.
+    """
+    value = request.args.get(name)
+    if value is None:
+        return None
+    return [item.strip() for item in value.split(",") if item.strip()]
+
+def _parse_number(name: str, default: float) -> float:
+    value = request.args.get(name)
+    if value is None:
+        return default
+    try:
+        return float(value)
+    except ValueError:
+        abort(400, description=f"Le paramètre {name} doit être un nombre : {value}")
+
+def _select_troncons(state: dict) -> tuple:
+    """
+    Tronçons filtrés par vitesse maximale (voir filter_speed_range dans src/charts/reseau.py).
+
+    Returns:
+        tuple: (tronçons filtrés, paramètres normalisés)
+    """
+    from src.charts.reseau import filter_speed_range
+
+    shapes_speeds_df = state["shapes_speeds_df"]
+    selected_range = [
+        _parse_number("v_min", float(shapes_speeds_df["v_max"].min())),
+        _parse_number("v_max", float(shapes_speeds_df["v_max"].max())),
+    ]
+    return filter_speed_range(shapes_speeds_df, selected_range), {"v_min": selected_range[0], "v_max": selected_range[1]}
+
+def _select_voyageurs_regions(state: dict) -> tuple:
+    """
+    Total des voyageurs par région et par année (voir region_year_totals dans src/charts/covid.py).
+
+    Returns:
+        tuple: (totaux filtrés, paramètres normalisés)
+    """
+    from src.charts.covid import region_year_totals
+
+    with_idf = request.args.get("idf", "1").lower() not in ("0", "false", "non")
+    regions = _parse_list("regions")
+    years = _parse_list("annees")
+    try:
+        years = sorted(int(year) for year in years) if years is not None else None
+    except ValueError:
+        abort(400, description=f"Le paramètre annees doit être une liste d'années : {request.args['annees']}")
+
+    totals = region_year_totals(state["gares_covid"], with_idf)
+    if regions is not None:
+        regions = sorted(regions)
+        totals = totals[totals["nom_region"].isin(regions)]
+    if years is not None:
+        totals = totals[totals["Année"].isin(years)]
+    return totals, {"idf": with_idf, "regions": regions, "annees": years}
+
+# Jeu de données -> (fonction de sélection, formats disponibles)
+DATASETS = {
+    "troncons": (_select_troncons, ["csv", "parquet", "geojson"]),
+    "voyageurs_regions": (_select_voyageurs_regions, ["csv", "parquet"]),
+}
+
+def _project(df, columns: list):
+    """
+    Garde les colonnes demandées, dans l'ordre demandé.
+    """
+    if columns is None:
+        return df
+    unknown = [column for column in columns if column not in df.columns]
+    if unknown:
+        abort(400, description=f"Colonnes inconnues : {', '.join(unknown)}. Colonnes disponibles : {', '.join(map(str, df.columns))}")
+    return df[columns]
+
+def _chunks(df):
+    for start in range(0, len(df), CHUNK_ROWS):
+        yield df.iloc[start:start + CHUNK_ROWS]
+
+def stream_csv(df):
+    """
+    Yields:
+        bytes: Le CSV paquet par paquet, l'en-tête avec le premier paquet. La géométrie est écrite en WKT.
+    """
+    import pandas as pd
+    import geopandas as gpd
+
+    header = True
+    for chunk in _chunks(df):
+        if isinstance(chunk, gpd.GeoDataFrame):
+            chunk = pd.DataFrame(chunk).assign(**{chunk.geometry.name: chunk.geometry.to_wkt()})
+        yield chunk.to_csv(index=False, header=header).encode("utf-8")
+        header = False
+    if header: # Aucune ligne : on envoie quand même l'en-tête
+        yield df.head(0).to_csv(index=False).encode("utf-8")
+
+def stream_geojson(df):
+    """
+    Yields:
+        bytes: Une FeatureCollection GeoJSON, paquet par paquet.
+    """
+    yield b'{"type": "FeatureCollection", "features": ['
+    separator = ""
+    for chunk in _chunks(df):
+        features = ",".join(json.dumps(feature, ensure_ascii=False) for feature in chunk.iterfeatures(na="null", drop_id=True))
+        if features:
+            yield (separator + features).encode("utf-8")
+            separator = ","
+    yield b"]}"
+
+class _StreamSink(io.RawIOBase):
+    """
+    Fichier en écriture dont on récupère le contenu au fur et à mesure. La position (``tell``) continue d'avancer
+    après chaque récupération : le writer Parquet s'en sert pour les positions écrites dans les métadonnées.
+    """
+    def __init__(self):
+        self._buffer = bytearray()
+        self._position = 0
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        self._buffer += data
+        self._position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self._position
+
+    def take(self) -> bytes:
+        data = bytes(self._buffer)
+        self._buffer.clear()
+        return data
+
+def stream_parquet(df):
+    """
+    Yields:
+        bytes: Le fichier Parquet, un groupe de lignes par paquet. La géométrie est écrite en WKB.
+    """
+    import pandas as pd
+    import geopandas as gpd
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    sink = _StreamSink()
+    writer = None
+    schema = None
+    for chunk in _chunks(df) if len(df) else [df]: # Sans ligne, on écrit quand même le schéma
+        if isinstance(chunk, gpd.GeoDataFrame):
+            chunk = pd.DataFrame(chunk).assign(**{chunk.geometry.name: chunk.geometry.to_wkb()})
+        # Le schéma du premier paquet est imposé aux suivants, où une colonne peut être entièrement vide
+        table = pa.Table.from_pandas(chunk, schema=schema, preserve_index=False)
+        if writer is None:
+            schema = table.schema
+            writer = pq.ParquetWriter(pa.PythonFile(sink, mode="w"), schema)
+        writer.write_table(table)
+        yield sink.take()
+    writer.close()
+    yield sink.take()
+
+STREAMS = {
+    "csv": stream_csv,
+    "parquet": stream_parquet,
+    "geojson": stream_geojson,
+}
+
+def compute_etag(version, dataset: str, data_format: str, columns: list, params: dict) -> str:
+    """
+    ETag d'un export : il change avec la version des données ou avec les paramètres normalisés.
+    La signature des fichiers est incluse car les numéros de version recommencent à 1 à chaque démarrage.
+    """
+    key = json.dumps([version.number, version.signature, dataset, data_format, columns, params], sort_keys=True, default=str)
+    return hashlib.sha1(key.encode("utf-8")).hexdigest()
+
+def register_export_routes(app, store):
+    """
+    Ajoute les routes d'export au serveur Flask du dashboard.
+
+    Args:
+        app (dash.Dash): L'application Dash.
+        store (DataStore): Les versions des données du dashboard (voir src/data_store.py).
+    """
+    @app.server.route("/export/<dataset>")
+    def export(dataset):
+        if dataset not in DATASETS:
+            abort(404, description=f"Jeu de données inconnu : {dataset}. Jeux de données disponibles : {', '.join(DATASETS)}")
+        select, formats = DATASETS[dataset]
+        data_format = request.args.get("format", "csv").lower()
+        if data_format not in formats:
+            abort(400, description=f"Format non disponible pour {dataset} : {data_format}. Formats disponibles : {', '.join(formats)}")
+        columns = _parse_list("columns")
+
+        # La version est gardée jusqu'à la fin de l'envoi : un rechargement des données pendant un export
+        # ne la libère pas (voir DataStore.acquire)
+        context = store.acquire()
+        version = context.__enter__()
+        try:
+            df, params = select(version.state)
+            if data_format == "geojson" and columns is not None and df.geometry.name not in columns: # Géométrie obligatoire en GeoJSON
+                columns = [*columns, df.geometry.name]
+            df = _project(df, columns)
+            etag = compute_etag(version, dataset, data_format, columns, params)
+            if request.if_none_match.contains(etag):
+                response = Response(status=304)
+            else:
+                response = Response(STREAMS[data_format](df), mimetype=FORMATS[data_format])
+                response.headers["Content-Disposition"] = f'attachment; filename="{dataset}.{data_format}"'
+        except BaseException:
+            context.__exit__(None, None, None)
+            raise
+        response.set_etag(etag)
+        response.headers["Cache-Control"] = "no-cache" # Le client revalide avec l'ETag à chaque téléchargement
+        response.call_on_close(lambda: context.__exit__(None, None, None))
+        return response
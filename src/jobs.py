@@ -0,0 +1,177 @@
+"""
+File de tâches en arrière-plan pour les callbacks coûteux du dashboard (rendu de la carte, itinéraires).
+
+Un callback lent bloque le thread de la requête, et les requêtes des autres utilisateurs attendent derrière
+lui. Ici, le callback soumet une tâche à un pool de threads et répond tout de suite avec l'identifiant de la
+tâche ; la page interroge ensuite régulièrement l'état de la tâche (voir src/charts/job_status.py) et affiche
+le résultat quand il est prêt.
+
+- Regroupement : deux demandes avec la même clé (mêmes entrées, même version des données) partagent la même
+  tâche, qu'elle soit en cours ou déjà terminée.
+- Mémoire : le résultat d'une tâche est libéré dès que tous les groupes qui l'attendaient l'ont lu
+  (``JobQueue.take_result``). Les rendus restent disponibles dans le cache de la version des données.
+- Annulation : chaque demande appartient à un groupe (par exemple la carte d'une page ouverte). Une nouvelle
+  demande dans le groupe remplace la précédente, qui est annulée si plus aucun groupe ne l'attend. Une tâche
+  en attente n'est jamais exécutée ; une tâche en cours s'arrête au prochain appel à ``Job.progress``.
+"""
+import uuid
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+MAX_WORKERS = 2 # Nombre de tâches exécutées en parallèle
+MAX_FINISHED_JOBS = 100 # Nombre de tâches terminées gardées pour le regroupement et la consultation de leur résultat
+
+class JobCancelled(Exception):
+    """
+    Levée dans une tâche annulée, au prochain appel à ``Job.progress``.
+    """
+
+class Job:
+    """
+    Une tâche soumise à la file. La fonction exécutée reçoit la tâche en argument pour signaler sa progression.
+    """
+    def __init__(self, key):
+        self.id = uuid.uuid4().hex
+        self.key = key
+        self.status = "en attente" # "en attente", "en cours", "terminée", "annulée" ou "erreur"
+        self.fraction = 0.0
+        self.message = "En attente"
+        self.result = None
+        self.error = None
+        self.groups = set() # Groupes qui attendent le résultat
+        self.result_taken = False # True quand tous les groupes ont lu le résultat, qui a été libéré
+        self.future = None
+        self._cancelled = threading.Event()
+
+    @property
+    def done(self) -> bool:
+        return self.status in ("terminée", "annulée", "erreur")
+
+    @property
+    def cancelled(self) -> bool:
+        """
+        True si la tâche a été annulée, même si elle ne s'est pas encore arrêtée.
+        """
+        return self._cancelled.is_set()
+
+    def progress(self, fraction: float, message: str):
+        """
+        Signale l'avancement de la tâche. Appelée entre deux étapes, c'est aussi le point où une tâche
+        annulée s'arrête.
+
+        Args:
+            fraction (float): Avancement entre 0 et 1.
+            message (str): Étape en cours, affichée dans le dashboard.
+        """
+        if self._cancelled.is_set():
+            raise JobCancelled()
+        self.fraction = fraction
+        self.message = message
+
+    def cancel(self):
+        self._cancelled.set()
+        if self.future is not None and self.future.cancel(): # La tâche n'avait pas commencé
+            self.status = "annulée"
+
+class JobQueue:
+    """
+    File de tâches exécutées par un pool de threads local (voir la documentation du module).
+
+    Args:
+        max_workers (int): Nombre de tâches exécutées en parallèle.
+    """
+    def __init__(self, max_workers: int = MAX_WORKERS):
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="dashboard-job")
+        self._lock = threading.Lock()
+        self._jobs = OrderedDict() # Identifiant -> tâche, dans l'ordre de soumission
+        self._by_key = {}
+        self._by_group = {}
+
+    def submit(self, key, func, group=None) -> Job:
+        """
+        Soumet une tâche, ou renvoie la tâche existante pour la même clé si elle est en cours ou terminée avec succès.
+
+        Args:
+            key: Clé hashable qui identifie le résultat, par exemple ("carte", version des données, option).
+            func (callable): Fonction appelée avec la tâche en argument, qui renvoie le résultat.
+            group: Groupe de la demande, par exemple (identifiant de la page, "carte"). La demande précédente
+                du groupe est remplacée.
+        Returns:
+            Job: La tâche.
+        """
+        with self._lock:
+            job = self._by_key.get(key)
+            if job is None or job.status in ("annulée", "erreur") or job.cancelled or job.result_taken:
+                job = Job(key)
+                self._jobs[job.id] = job
+                self._by_key[key] = job
+                job.future = self._executor.submit(self._run, job, func)
+            if group is not None:
+                previous = self._by_group.get(group)
+                if previous is not None and previous is not job:
+                    previous.groups.discard(group)
+                    if not previous.groups and not previous.done:
+                        previous.cancel() # Plus personne n'attend ce résultat
+                self._by_group[group] = job
+                job.groups.add(group)
+            self._prune()
+            return job
+
+    def get(self, job_id: str) -> Job:
+        """
+        Returns:
+            Job: La tâche, ou None si elle est inconnue (par exemple trop ancienne).
+        """
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def take_result(self, job: Job, group=None):
+        """
+        Lit le résultat d'une tâche terminée pour un groupe. Quand plus aucun groupe ne l'attend, le résultat
+        est libéré : une nouvelle demande avec la même clé crée alors une nouvelle tâche.
+
+        Args:
+            job (Job): La tâche.
+            group: Le groupe qui lit le résultat (voir submit).
+        Returns:
+            Le résultat, ou None si la tâche n'est pas terminée ou si le résultat a déjà été libéré.
+        """
+        with self._lock:
+            if job.status != "terminée" or job.result_taken:
+                return None
+            result = job.result
+            job.groups.discard(group)
+            if not job.groups:
+                job.result = None
+                job.result_taken = True
+            return result
+
+    def _run(self, job: Job, func):
+        job.status = "en cours"
+        try:
+            job.result = func(job)
+            job.fraction = 1.0
+            job.status = "terminée"
+        except JobCancelled:
+            job.status = "annulée"
+        except Exception as error: # L'erreur est affichée dans le dashboard, le worker continue
+            job.error = f"{type(error).__name__}: {error}"
+            job.status = "erreur"
+
+    def _prune(self):
+        # Appelée avec self._lock acquis : on oublie les tâches terminées les plus anciennes
+        finished = [job_id for job_id, job in self._jobs.items() if job.done]
+        for job_id in finished[:max(0, len(finished) - MAX_FINISHED_JOBS)]:
+            job = self._jobs.pop(job_id)
+            if self._by_key.get(job.key) is job:
+                del self._by_key[job.key]
+            for group in job.groups:
+                if self._by_group.get(group) is job:
+                    del self._by_group[group]
+
+    def shutdown(self):
+        """
+        Annule les tâches en attente et arrête le pool de threads.
+        """
+        self._executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,185 @@
+"""
+Traitement hors mémoire de la fréquentation des gares.
+
+process_frequentations, merge_gares_frequentations et merge_gares_communes travaillent sur toute la
+table gares x années en mémoire. Avec des comptages mensuels ou journaliers sur de nombreuses années,
+cette table ne tient plus en mémoire. Ici, on lit frequentation-gares.csv par paquets de gares, on
+applique les mêmes fonctions de src/data_processing_utils.py à chaque paquet, et on écrit le résultat
+dans un jeu de données Parquet partitionné par année (un répertoire ``Année=<année>`` par année).
+
+Le dashboard peut ensuite ne lire que les années et les colonnes dont il a besoin.
+"""
+import os
+import shutil
+
+import pandas as pd
+import geopandas as gpd
+
+import src.data_processing_utils as data_utils
+from src.profiling import instrument
+from src import station_metrics
+from src.station_metrics import add_station_metrics
+from src import validation
+
+DATASET_PATH = "./data/processed/gares_communes_parquet/" # Répertoire du jeu de données partitionné
+
+PARTITION_COLUMN = "Année"
+
+# Types imposés à l'écriture : sans cela, une colonne entièrement vide dans un paquet n'aurait pas
+# le même type que dans les autres paquets, et les partitions ne pourraient plus être lues ensemble.
+# L'année est écrite en int64 : relue depuis les noms de répertoires, elle ne peut pas redevenir un Int64.
+COLUMN_TYPES = {
+    "Année": "int64",
+    "code_uic": "Int64",
+    "libelle": "string",
+    "fret": "boolean",
+    "code_ligne": "string",
+    "code_postal": "Int64",
+    "Segmentation DRG": "string",
+    "Total Voyageurs": "float64",
+    "Total Voyageurs + Non Voyageurs": "float64",
+    "code_commune_INSEE": "string",
+    "nom_commune": "string",
+    "code_departement": "string",
+    "nom_departement": "string",
+    "nom_region": "string",
+    "PTOT": "float64",
+    "variation_annuelle": "float64",
+    "ratio_reprise": "float64",
+    "tcam": "float64",
+    "zscore_variation": "float64",
+    "anomalie": "boolean",
+    "x": "float64",
+    "y": "float64",
+}
+
+def _to_table(gares_communes_df: gpd.GeoDataFrame) -> pd.DataFrame:
+    """
+    Convertit une GeoDataFrame de gares en DataFrame écrivable en Parquet : les gares étant des points,
+    on remplace la géométrie par ses coordonnées x et y.
+    """
+    table = pd.DataFrame(gares_communes_df.drop(columns="geometry"))
+    table["x"] = gares_communes_df.geometry.x.values
+    table["y"] = gares_communes_df.geometry.y.values
+    table = table.astype({column: dtype for column, dtype in COLUMN_TYPES.items() if column in table.columns})
+    return table
+
+@instrument
+def build_gares_communes_dataset(frequentations_path: str, gares_df: gpd.GeoDataFrame, communes_population_df: pd.DataFrame,
+                                 output_path: str = DATASET_PATH, chunksize: int = 1000, gares_codes: pd.Series = None,
+                                 validation_reports: list = None) -> int:
+    """
+    Construit le jeu de données Parquet partitionné par année équivalent à gares_communes.geojson.
+    Le fichier de fréquentation est lu par paquets de ``chunksize`` gares ; les gares et les communes,
+    beaucoup plus petites, restent en mémoire. La mémoire utilisée est donc bornée par la taille d'un paquet.
+
+    Contrairement à merge_gares_frequentations, les gares sans aucune fréquentation ne sont pas gardées,
+    car elles n'apparaîtraient dans aucune partition.
+
+    Toutes les années d'une gare sont dans le même paquet, les indicateurs de src/station_metrics.py sont donc
+    calculés paquet par paquet. Seul le z-score compare chaque gare aux autres gares la même année : on cumule
+    les moments par année de tous les paquets, puis une seconde passe sur les partitions (une année à la fois)
+    recalcule les z-scores et les anomalies par rapport à toutes les gares, comme sans partitionnement.
+
+    Chaque paquet est validé par src/validation.py avant d'être traité. L'unicité des codes UIC n'est vérifiée
+    qu'à l'intérieur de chaque paquet.
+
+    Args:
+        frequentations_path (str): Chemin de frequentation-gares.csv.
+        gares_df (gpd.GeoDataFrame): Gares traitées par process_gares.
+        communes_population_df (pd.DataFrame): Communes traitées par treat_and_merge_communes_population.
+        output_path (str): Répertoire du jeu de données, supprimé puis recréé.
+        chunksize (int): Nombre de lignes (gares) de frequentation-gares.csv lues à la fois.
+        gares_codes (pd.Series): Codes UIC de liste-des-gares.geojson, pour vérifier que chaque gare existe.
+        validation_reports (list): Si donnée, le rapport de validation de frequentation-gares.csv y est ajouté.
+    Returns:
+        int: Nombre de lignes écrites.
+    """
+    if os.path.isdir(output_path):
+        shutil.rmtree(output_path)
+    os.makedirs(output_path)
+
+    written_rows = 0
+    chunk_reports = []
+    moments = [] # Moments par année de la variation en log, un par paquet
+    references = {"code_uic": gares_codes} if gares_codes is not None else None
+    for chunk in pd.read_csv(frequentations_path, sep=";", chunksize=chunksize):
+        chunk, report = validation.validate(chunk, "frequentations", references, append=bool(chunk_reports))
+        chunk_reports.append(report)
+        frequentations = data_utils.process_frequentations(chunk)
+        gares_chunk = gares_df[gares_df["code_uic"].isin(frequentations["code_uic"])]
+        gares_frequentations = data_utils.merge_gares_frequentations(gares_chunk, frequentations)
+        gares_communes = data_utils.merge_gares_communes(gares_frequentations, communes_population_df)
+        if gares_communes.empty:
+            continue
+        gares_communes = add_station_metrics(gares_communes) # Z-scores provisoires, recalculés ensuite
+        moments.append(station_metrics.log_change_moments(gares_communes))
+        # Chaque appel ajoute un nouveau fichier dans chaque partition (nom unique généré par pyarrow)
+        _to_table(gares_communes).to_parquet(output_path, engine="pyarrow", partition_cols=[PARTITION_COLUMN], index=False)
+        written_rows += len(gares_communes)
+    if validation_reports is not None and chunk_reports:
+        validation_reports.append(validation.merge_reports(chunk_reports))
+    if written_rows:
+        _rescore_partitions(output_path, station_metrics.combine_moments(moments))
+    return written_rows
+
+def _rescore_partitions(dataset_path: str, year_moments: pd.DataFrame):
+    """
+    Recalcule les z-scores et les anomalies de chaque partition avec les moments de toutes les gares.
+    Une seule année est en mémoire à la fois ; sa partition est réécrite en un seul fichier.
+
+    La nouvelle partition est d'abord écrite dans un répertoire temporaire, puis mise à la place de l'ancienne
+    avec os.replace : si l'écriture échoue, l'ancienne partition est intacte. Les répertoires temporaires
+    commencent par un point, pyarrow les ignore donc à la lecture.
+    """
+    for year in available_years(dataset_path):
+        partition = f"{PARTITION_COLUMN}={year}"
+        table = pd.read_parquet(dataset_path, engine="pyarrow", filters=[(PARTITION_COLUMN, "=", year)])
+        table = station_metrics.score_variations(table.assign(**{PARTITION_COLUMN: year}), year_moments) # Année relue comme une catégorie
+        table = table.astype({column: dtype for column, dtype in COLUMN_TYPES.items() if column in table.columns})
+
+        new_path = os.path.join(dataset_path, f".{partition}.new")
+        old_path = os.path.join(dataset_path, f".{partition}.old")
+        for path in (new_path, old_path): # Restes d'une réécriture interrompue
+            if os.path.isdir(path):
+                shutil.rmtree(path)
+        os.makedirs(new_path)
+        # Comme dans les partitions écrites par pyarrow, l'année n'est que dans le nom du répertoire
+        table.drop(columns=PARTITION_COLUMN).to_parquet(os.path.join(new_path, "part-0.parquet"), engine="pyarrow", index=False)
+        # os.replace ne remplace pas un répertoire non vide : l'ancienne partition est d'abord mise de côté
+        os.replace(os.path.join(dataset_path, partition), old_path)
+        os.replace(new_path, os.path.join(dataset_path, partition))
+        shutil.rmtree(old_path)
+
+def available_years(dataset_path: str = DATASET_PATH) -> list:
+    """
+    Returns:
+        list: Les années présentes dans le jeu de données, lues à partir des noms de répertoires.
+    """
+    prefix = f"{PARTITION_COLUMN}="
+    return sorted(int(name[len(prefix):]) for name in os.listdir(dataset_path) if name.startswith(prefix))
+
+@instrument
+def read_gares_communes(dataset_path: str = DATASET_PATH, years: list = None, columns: list = None) -> pd.DataFrame:
+    """
+    Lit le jeu de données partitionné. Seules les partitions des années demandées sont ouvertes,
+    et seules les colonnes demandées sont lues.
+
+    Args:
+        dataset_path (str): Répertoire du jeu de données.
+        years (list): Années à lire, toutes si None.
+        columns (list): Colonnes à lire, toutes si None. La colonne Année est toujours lue.
+    Returns:
+        pd.DataFrame: Les gares et leur fréquentation. Si les coordonnées sont lues, on renvoie une
+        GeoDataFrame avec la même géométrie que gares_communes.geojson.
+    """
+    filters = [(PARTITION_COLUMN, "in", [int(year) for year in years])] if years is not None else None
+    if columns is not None:
+        columns = list(dict.fromkeys([PARTITION_COLUMN, *columns]))
+    gares_communes = pd.read_parquet(dataset_path, engine="pyarrow", filters=filters, columns=columns)
+    # La colonne de partition est relue comme une catégorie, on la remet en entier comme dans process_frequentations
+    gares_communes[PARTITION_COLUMN] = gares_communes[PARTITION_COLUMN].astype(int).astype("Int64")
+    if {"x", "y"}.issubset(gares_communes.columns):
+        geometry = gpd.points_from_xy(gares_communes["x"], gares_communes["y"])
+        gares_communes = gpd.GeoDataFrame(gares_communes.drop(columns=["x", "y"]), geometry=geometry, crs="EPSG:4326")
+    return gares_communes
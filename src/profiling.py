@@ -0,0 +1,235 @@
+"""
+Instrumentation légère du pipeline et du dashboard.
+
+Chaque étape instrumentée (fonction décorée par ``instrument`` ou bloc ``with profile_stage(...)``)
+enregistre le temps réel, le temps CPU, la variation du pic de mémoire résidente (RSS) et le nombre
+de lignes en entrée et en sortie. Les mesures sont écrites au format JSON lines dans ``REPORT_PATH``
+(une ligne par étape).
+
+L'instrumentation est désactivée par défaut, on l'active avec la variable d'environnement
+``SNCF_PROFILE=1`` ou en appelant ``configure(enabled=True)``. On peut en plus capturer un profil
+complet de chaque étape avec ``SNCF_PROFILER=cprofile`` ou ``SNCF_PROFILER=pyinstrument``.
+"""
+import os
+import sys
+import json
+import time
+import threading
+import functools
+import cProfile
+from contextlib import contextmanager
+from datetime import datetime
+
+try:
+    import resource # N'existe pas sous Windows
+except ImportError:
+    resource = None
+
+REPORT_PATH = "./data/reports/run_report.jsonl" # Fichier où sont ajoutées les mesures de chaque étape
+PROFILES_PATH = "./data/reports/profiles/" # Répertoire où sont enregistrés les profils cProfile / pyinstrument
+
+PROFILERS = ("cprofile", "pyinstrument")
+
+_config = {
+    "enabled": os.environ.get("SNCF_PROFILE", "0") == "1",
+    "profiler": os.environ.get("SNCF_PROFILER") or None,
+    "report_path": REPORT_PATH,
+    "run_id": datetime.now().strftime("%Y%m%dT%H%M%S") + f"-{os.getpid()}",
+}
+_write_lock = threading.Lock()
+_profiler_lock = threading.Lock() # Un seul profiler actif à la fois dans le processus
+_local = threading.local() # Profondeur d'imbrication des étapes, propre à chaque thread (callbacks Dash)
+
+def configure(enabled: bool = None, profiler: str = None, report_path: str = None):
+    """
+    Modifie la configuration de l'instrumentation. Les paramètres laissés à None ne sont pas modifiés.
+
+    Args:
+        enabled (bool): Active ou désactive l'enregistrement des mesures.
+        profiler (str): "cprofile", "pyinstrument" ou "" pour ne pas capturer de profil.
+        report_path (str): Chemin du fichier JSON lines où écrire les mesures.
+    """
+    if enabled is not None:
+        _config["enabled"] = enabled
+    if profiler is not None:
+        if profiler and profiler not in PROFILERS:
+            raise ValueError(f"Profiler inconnu : {profiler} (valeurs possibles : {PROFILERS})")
+        _config["profiler"] = profiler or None
+    if report_path is not None:
+        _config["report_path"] = report_path
+
+def is_enabled() -> bool:
+    """
+    Returns:
+        bool: True si l'instrumentation est active.
+    """
+    return _config["enabled"]
+
+def _peak_rss_mb() -> float:
+    """
+    Pic de mémoire résidente du processus depuis son lancement, en Mo.
+    ru_maxrss est en kilo-octets sous Linux et en octets sous macOS.
+    """
+    if resource is None:
+        return float("nan")
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if sys.platform == "darwin":
+        return peak / (1024 * 1024)
+    return peak / 1024
+
+def count_rows(obj) -> int:
+    """
+    Nombre de lignes d'un DataFrame / GeoDataFrame / Series / array, None si l'objet n'en a pas.
+    On se base sur l'attribut shape pour ne pas avoir à importer pandas ici.
+    """
+    shape = getattr(obj, "shape", None)
+    if isinstance(shape, tuple) and len(shape) > 0:
+        return int(shape[0])
+    return None
+
+def _write_record(record: dict):
+    report_path = _config["report_path"]
+    os.makedirs(os.path.dirname(report_path) or ".", exist_ok=True)
+    line = json.dumps(record, ensure_ascii=False, default=str)
+    with _write_lock:
+        with open(report_path, "a", encoding="utf-8") as report_file:
+            report_file.write(line + "\n")
+
+def _start_profiler():
+    """
+    Démarre le profiler configuré. On renvoie None si aucun profiler n'est demandé, si
+    pyinstrument n'est pas installé ou si un autre thread est déjà en train de profiler.
+    """
+    if _config["profiler"] is None or not _profiler_lock.acquire(blocking=False):
+        return None
+    if _config["profiler"] == "cprofile":
+        profiler = cProfile.Profile()
+        profiler.enable()
+        return profiler
+    if _config["profiler"] == "pyinstrument":
+        try:
+            from pyinstrument import Profiler # Dépendance optionnelle
+        except ImportError:
+            _profiler_lock.release()
+            return None
+        profiler = Profiler()
+        profiler.start()
+        return profiler
+    _profiler_lock.release()
+    return None
+
+def _stop_profiler(profiler, stage_name: str) -> str:
+    """
+    Arrête le profiler et enregistre le profil dans ``PROFILES_PATH``.
+
+    Returns:
+        str: Chemin du fichier de profil.
+    """
+    if isinstance(profiler, cProfile.Profile):
+        profiler.disable()
+    else:
+        profiler.stop()
+    _profiler_lock.release()
+
+    os.makedirs(PROFILES_PATH, exist_ok=True)
+    safe_name = "".join(c if c.isalnum() or c in "-_." else "_" for c in stage_name)
+    base_path = os.path.join(PROFILES_PATH, f"{_config['run_id']}_{safe_name}")
+    if isinstance(profiler, cProfile.Profile):
+        profile_path = base_path + ".prof" # Lisible avec snakeviz ou pstats
+        profiler.dump_stats(profile_path)
+    else:
+        profile_path = base_path + ".html"
+        with open(profile_path, "w", encoding="utf-8") as profile_file:
+            profile_file.write(profiler.output_html())
+    return profile_path
+
+@contextmanager
+def profile_stage(name: str, rows_in: int = None, **extra):
+    """
+    Mesure une étape du pipeline. Le dictionnaire renvoyé par le ``with`` peut être complété,
+    par exemple avec ``stage["rows_out"] = len(df)``.
+
+    Les profils (cProfile / pyinstrument) ne sont capturés que pour les étapes de premier niveau,
+    car les deux outils ne supportent pas d'être imbriqués.
+
+    Args:
+        name (str): Nom de l'étape, tel qu'il apparaîtra dans le rapport.
+        rows_in (int): Nombre de lignes en entrée, si connu.
+        **extra: Informations supplémentaires à écrire dans le rapport (chemin du fichier, etc.).
+    Yields:
+        dict: L'enregistrement de l'étape.
+    """
+    if not _config["enabled"]:
+        yield {}
+        return
+
+    depth = getattr(_local, "depth", 0)
+    record = {
+        "run_id": _config["run_id"],
+        "stage": name,
+        "depth": depth,
+        "thread": threading.current_thread().name,
+        "rows_in": rows_in,
+        "rows_out": None,
+        **extra,
+    }
+    profiler = _start_profiler() if depth == 0 else None
+    rss_before = _peak_rss_mb()
+    cpu_start = time.process_time()
+    wall_start = time.perf_counter()
+    _local.depth = depth + 1
+    status = "ok"
+    try:
+        yield record
+    except BaseException:
+        status = "error"
+        raise
+    finally:
+        _local.depth = depth
+        record["wall_s"] = round(time.perf_counter() - wall_start, 6)
+        record["cpu_s"] = round(time.process_time() - cpu_start, 6)
+        record["peak_rss_delta_mb"] = round(_peak_rss_mb() - rss_before, 3) # Ne croît que si l'étape dépasse le pic précédent
+        record["status"] = status
+        record["timestamp"] = datetime.now().isoformat(timespec="seconds")
+        if profiler is not None:
+            record["profile"] = _stop_profiler(profiler, name)
+        _write_record(record)
+
+def instrument(func=None, *, name: str = None):
+    """
+    Décorateur qui mesure chaque appel de la fonction avec ``profile_stage``.
+    Les lignes en entrée sont la somme des lignes des arguments positionnels qui sont des tables,
+    les lignes en sortie celles de la valeur de retour. Si un argument est une chaîne de caractères
+    (un chemin de fichier pour read_file / read_csv / to_file), on l'enregistre dans le rapport.
+
+    S'utilise avec ou sans arguments :
+        @instrument
+        def f(df): ...
+
+        read_csv = instrument(pd.read_csv, name="pd.read_csv")
+
+    Args:
+        func (callable): Fonction à instrumenter.
+        name (str): Nom de l'étape, par défaut le nom qualifié de la fonction.
+    Returns:
+        callable: La fonction instrumentée.
+    """
+    if func is None:
+        return functools.partial(instrument, name=name)
+
+    stage_name = name or f"{func.__module__}.{func.__qualname__}"
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        if not _config["enabled"]:
+            return func(*args, **kwargs)
+        row_counts = [count_rows(arg) for arg in args]
+        row_counts = [count for count in row_counts if count is not None]
+        paths = [arg for arg in args if isinstance(arg, (str, os.PathLike))]
+        extra = {"path": str(paths[0])} if paths else {}
+        with profile_stage(stage_name, rows_in=sum(row_counts) if row_counts else None, **extra) as stage:
+            result = func(*args, **kwargs)
+            stage["rows_out"] = count_rows(result)
+        return result
+
+    return wrapper
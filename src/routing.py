@@ -0,0 +1,288 @@
+"""
+Graphe du réseau ferré pour les calculs d'itinéraires et d'isochrones.
+
+Les tronçons de shapes_speeds deviennent les arêtes d'un graphe non orienté : les extrémités des
+tronçons sont fusionnées en nœuds quand elles sont à moins de ``SNAP_TOLERANCE_M`` mètres, et le
+poids d'une arête est son temps de parcours à la vitesse maximale (longueur / v_max). Chaque gare
+est rattachée au nœud le plus proche.
+
+Le graphe est stocké sous forme compacte (CSR : ``indptr``, ``indices``, ``weights``) dans un
+dictionnaire de tableaux numpy, enregistré en .npz par treat_data.py. Les plus courts chemins sont
+calculés avec A* et l'heuristique ALT : on précalcule les distances depuis quelques nœuds repères
+(landmarks), et l'inégalité triangulaire donne une borne inférieure de la distance restante.
+"""
+import heapq
+
+import numpy as np
+import pandas as pd
+import geopandas as gpd
+import shapely
+
+from src.profiling import instrument
+from src.data_processing_utils import LAMBERT_93
+
+GRAPH_PATH = "./data/processed/reseau_graph.npz"
+
+SNAP_TOLERANCE_M = 10 # Distance en dessous de laquelle deux extrémités de tronçons sont le même nœud
+STATION_MAX_DISTANCE_M = 2000 # Distance maximale entre une gare et le nœud auquel elle est rattachée
+DEFAULT_SPEED_KMH = 40 # Vitesse utilisée pour les tronçons sans v_max
+N_LANDMARKS = 8
+
+@instrument
+def build_graph(shapes_speeds_df: gpd.GeoDataFrame, gares_df: gpd.GeoDataFrame, n_landmarks: int = N_LANDMARKS,
+                snap_tolerance: float = SNAP_TOLERANCE_M) -> dict:
+    """
+    Construit le graphe du réseau à partir des tronçons et des gares.
+
+    Les extrémités sont fusionnées en les arrondissant sur une grille de ``snap_tolerance`` mètres :
+    deux extrémités très proches mais de part et d'autre d'une ligne de la grille restent séparées,
+    ce qui est rare avec des tronçons qui partagent exactement leurs extrémités.
+
+    Args:
+        shapes_speeds_df (gpd.GeoDataFrame): Tronçons avec leur vitesse maximale (voir merge_shapes_speeds).
+        gares_df (gpd.GeoDataFrame): Gares avec code_uic, libelle et géométrie (une ou plusieurs lignes par gare).
+        n_landmarks (int): Nombre de nœuds repères pour l'heuristique ALT.
+        snap_tolerance (float): Taille de la grille de fusion des extrémités, en mètres.
+    Returns:
+        dict: Le graphe, voir la documentation du module.
+    """
+    # Tronçons en projection métrique, découpés en lignes simples
+    segments = shapes_speeds_df[["v_max", "geometry"]].to_crs(LAMBERT_93).reset_index(drop=True)
+    segments["segment"] = np.arange(len(segments)) # Position du tronçon dans shapes_speeds_df
+    segments = segments.explode(index_parts=False)
+    segments = segments[segments.geometry.notna() & ~segments.geometry.is_empty]
+    geometries = segments.geometry.to_numpy()
+
+    # Nœuds : extrémités des tronçons, fusionnées sur une grille
+    start = shapely.get_coordinates(shapely.get_point(geometries, 0))
+    end = shapely.get_coordinates(shapely.get_point(geometries, -1))
+    grid = np.round(np.vstack([start, end]) / snap_tolerance).astype(np.int64)
+    _, first_index, node_of_endpoint = np.unique(grid, axis=0, return_index=True, return_inverse=True)
+    node_of_endpoint = node_of_endpoint.ravel()
+    node_xy = np.vstack([start, end])[first_index]
+    u = node_of_endpoint[:len(geometries)]
+    v = node_of_endpoint[len(geometries):]
+
+    # Arêtes : temps de parcours en secondes à la vitesse maximale
+    speeds = pd.to_numeric(segments["v_max"], errors="coerce").fillna(DEFAULT_SPEED_KMH).clip(lower=1).to_numpy(dtype=float)
+    lengths = shapely.length(geometries)
+    travel_times = lengths / (speeds / 3.6)
+    keep = u != v # Les boucles ne servent à rien pour les plus courts chemins
+    graph = _to_csr(len(node_xy), u[keep], v[keep], travel_times[keep], lengths[keep], segments["segment"].to_numpy()[keep])
+    graph["node_xy"] = node_xy
+
+    # Gares : rattachées au nœud le plus proche
+    gares = gares_df.drop_duplicates(subset=["code_uic"])[["code_uic", "libelle", "geometry"]]
+    gares = gares[gares.geometry.notna() & gares["code_uic"].notna()]
+    gares_lambert = gares.to_crs(LAMBERT_93)
+    tree = shapely.STRtree(shapely.points(node_xy))
+    station_index, node_index = tree.query_nearest(gares_lambert.geometry.to_numpy(), max_distance=STATION_MAX_DISTANCE_M, all_matches=False)
+    station_node = np.full(len(gares), -1, dtype=np.int64)
+    station_node[station_index] = node_index
+    graph["station_code_uic"] = gares["code_uic"].to_numpy(dtype=np.int64)
+    graph["station_name"] = gares["libelle"].astype(str).to_numpy(dtype=str)
+    graph["station_lonlat"] = shapely.get_coordinates(gares.to_crs("EPSG:4326").geometry.to_numpy())
+    graph["station_node"] = station_node
+
+    graph["landmark_dist"] = _select_landmarks(graph, n_landmarks, station_node[station_node >= 0])
+    return graph
+
+def _to_csr(n_nodes: int, u: np.ndarray, v: np.ndarray, travel_times: np.ndarray, lengths: np.ndarray, segment: np.ndarray) -> dict:
+    """
+    Construit la représentation CSR du graphe non orienté : chaque arête apparaît dans les deux sens,
+    et les voisins du nœud i sont ``indices[indptr[i]:indptr[i + 1]]``.
+    """
+    sources = np.concatenate([u, v])
+    order = np.argsort(sources, kind="stable")
+    indptr = np.zeros(n_nodes + 1, dtype=np.int64)
+    indptr[1:] = np.cumsum(np.bincount(sources, minlength=n_nodes))
+    return {
+        "indptr": indptr,
+        "indices": np.concatenate([v, u])[order],
+        "weights": np.concatenate([travel_times, travel_times])[order],
+        "lengths": np.concatenate([lengths, lengths])[order],
+        "edge_segment": np.concatenate([segment, segment])[order],
+    }
+
+def _adjacency(graph: dict) -> tuple:
+    """
+    Les boucles Python sont beaucoup plus rapides sur des listes que sur des tableaux numpy : on convertit
+    le CSR une seule fois et on le garde dans le graphe (ces clés ne sont pas enregistrées par save_graph).
+    """
+    if "_adjacency" not in graph:
+        graph["_adjacency"] = (
+            graph["indptr"].tolist(),
+            graph["indices"].tolist(),
+            graph["weights"].tolist(),
+        )
+    return graph["_adjacency"]
+
+def dijkstra(graph: dict, source: int, max_cost: float = np.inf) -> tuple:
+    """
+    Temps de parcours depuis ``source`` vers tous les nœuds atteignables en moins de ``max_cost`` secondes.
+
+    Args:
+        graph (dict): Le graphe.
+        source (int): Nœud de départ.
+        max_cost (float): Temps maximal en secondes.
+    Returns:
+        tuple: (distances, prédécesseurs), deux tableaux numpy de la taille du nombre de nœuds.
+        Les nœuds non atteints ont une distance infinie et un prédécesseur à -1.
+    """
+    indptr, indices, weights = _adjacency(graph)
+    n_nodes = len(indptr) - 1
+    dist = [np.inf] * n_nodes
+    predecessor = [-1] * n_nodes
+    dist[source] = 0.0
+    heap = [(0.0, source)]
+    while heap:
+        d, node = heapq.heappop(heap)
+        if d > dist[node]:
+            continue # Entrée périmée
+        for k in range(indptr[node], indptr[node + 1]):
+            neighbor = indices[k]
+            nd = d + weights[k]
+            if nd < dist[neighbor] and nd <= max_cost:
+                dist[neighbor] = nd
+                predecessor[neighbor] = node
+                heapq.heappush(heap, (nd, neighbor))
+    return np.array(dist), np.array(predecessor)
+
+def _select_landmarks(graph: dict, n_landmarks: int, candidates: np.ndarray) -> np.ndarray:
+    """
+    Choisit les nœuds repères par la méthode du point le plus éloigné : chaque repère est le nœud le plus
+    loin des repères déjà choisis, ce qui répartit les repères en périphérie du réseau.
+
+    Returns:
+        np.ndarray: Distances de chaque repère à chaque nœud, de forme (n_landmarks, nombre de nœuds).
+        On garde des float64 : arrondies en float32, les distances pourraient surestimer la borne
+        de l'heuristique, et A* ne renverrait plus forcément le plus court chemin.
+    """
+    n_nodes = len(graph["indptr"]) - 1
+    landmark_dist = np.full((n_landmarks, n_nodes), np.inf)
+    if n_nodes == 0:
+        return landmark_dist[:0]
+    current = int(candidates[0]) if len(candidates) else 0
+    for i in range(n_landmarks):
+        landmark_dist[i] = dijkstra(graph, current)[0]
+        closest = landmark_dist[:i + 1].min(axis=0)
+        closest[~np.isfinite(closest)] = -1 # On reste dans la composante connexe des repères
+        current = int(np.argmax(closest))
+    return landmark_dist
+
+def _landmark_rows(graph: dict) -> list:
+    """
+    Distances des repères converties une seule fois en listes, comme pour _adjacency.
+    """
+    if "_landmark_rows" not in graph:
+        graph["_landmark_rows"] = graph["landmark_dist"].astype(float).tolist()
+    return graph["_landmark_rows"]
+
+def _landmark_heuristic(graph: dict, target: int):
+    """
+    Borne inférieure du temps restant vers ``target`` : pour un nœud v, max sur les repères L de
+    |d(L, target) - d(L, v)|. Les repères qui n'atteignent pas l'un des deux nœuds sont ignorés.
+    La borne est calculée à la demande pour chaque nœud visité, et non pour tout le graphe à chaque requête.
+
+    Returns:
+        callable: Fonction qui associe sa borne à un nœud.
+    """
+    rows = [(row, row[target]) for row in _landmark_rows(graph) if row[target] != np.inf]
+
+    def heuristic(node: int) -> float:
+        bound = 0.0
+        for row, to_target in rows:
+            from_landmark = row[node]
+            if from_landmark != np.inf:
+                bound = max(bound, abs(to_target - from_landmark))
+        return bound
+    return heuristic
+
+def shortest_path(graph: dict, source: int, target: int, use_landmarks: bool = True) -> tuple:
+    """
+    Plus court chemin en temps entre deux nœuds, avec A* et l'heuristique ALT.
+
+    Args:
+        graph (dict): Le graphe.
+        source (int): Nœud de départ.
+        target (int): Nœud d'arrivée.
+        use_landmarks (bool): Si False, l'heuristique est nulle (Dijkstra classique), pour comparaison.
+    Returns:
+        tuple: (temps en secondes, longueur en mètres, liste des nœuds, liste des positions des tronçons
+        dans shapes_speeds_df). Si ``target`` n'est pas atteignable, on renvoie (inf, inf, [], []).
+    """
+    indptr, indices, weights = _adjacency(graph)
+    heuristic = _landmark_heuristic(graph, target) if use_landmarks else lambda node: 0.0
+    dist = {source: 0.0}
+    predecessor = {source: (-1, -1)} # Nœud précédent et position de l'arête dans le CSR
+    closed = set()
+    heap = [(heuristic(source), source)]
+    while heap:
+        _, node = heapq.heappop(heap)
+        if node in closed:
+            continue
+        if node == target:
+            break
+        closed.add(node)
+        d = dist[node]
+        for k in range(indptr[node], indptr[node + 1]):
+            neighbor = indices[k]
+            nd = d + weights[k]
+            if nd < dist.get(neighbor, np.inf):
+                dist[neighbor] = nd
+                predecessor[neighbor] = (node, k)
+                heapq.heappush(heap, (nd + heuristic(neighbor), neighbor))
+    if target not in dist:
+        return np.inf, np.inf, [], []
+
+    nodes, edges = [target], []
+    while nodes[-1] != source:
+        previous, edge = predecessor[nodes[-1]]
+        nodes.append(previous)
+        edges.append(edge)
+    nodes.reverse()
+    edges.reverse()
+    return dist[target], float(graph["lengths"][edges].sum()), nodes, graph["edge_segment"][edges].tolist()
+
+def isochrone(graph: dict, source: int, max_seconds: float) -> pd.DataFrame:
+    """
+    Gares atteignables depuis le nœud ``source`` en moins de ``max_seconds`` secondes.
+
+    Returns:
+        pd.DataFrame: Colonnes code_uic, libelle, lon, lat et temps (en secondes), triée par temps.
+    """
+    dist, _ = dijkstra(graph, source, max_cost=max_seconds)
+    station_node = graph["station_node"]
+    mapped = station_node >= 0
+    times = np.full(len(station_node), np.inf)
+    times[mapped] = dist[station_node[mapped]]
+    reached = np.isfinite(times)
+    return pd.DataFrame({
+        "code_uic": graph["station_code_uic"][reached],
+        "libelle": graph["station_name"][reached],
+        "lon": graph["station_lonlat"][reached, 0],
+        "lat": graph["station_lonlat"][reached, 1],
+        "temps": times[reached],
+    }).sort_values("temps").reset_index(drop=True)
+
+def station_node(graph: dict, code_uic: int) -> int:
+    """
+    Returns:
+        int: Le nœud auquel la gare est rattachée, -1 si la gare est inconnue ou trop loin du réseau.
+    """
+    matches = np.flatnonzero(graph["station_code_uic"] == int(code_uic))
+    return int(graph["station_node"][matches[0]]) if len(matches) else -1
+
+def save_graph(graph: dict, path: str = GRAPH_PATH):
+    """
+    Enregistre le graphe au format .npz (les clés commençant par "_" sont des caches, non enregistrés).
+    """
+    np.savez_compressed(path, **{key: value for key, value in graph.items() if not key.startswith("_")})
+
+def load_graph(path: str = GRAPH_PATH) -> dict:
+    """
+    Returns:
+        dict: Le graphe enregistré par save_graph.
+    """
+    with np.load(path) as graph_file:
+        return {key: graph_file[key] for key in graph_file.files}
@@ -0,0 +1,139 @@
+"""
+Instantané (snapshot) de l'état préparé du dashboard, pour accélérer son lancement.
+
+Au premier lancement, main.py lit les fichiers de data/processed et construit toutes les figures.
+Cet état (DataFrames chargées, agrégats, layout Dash avec les figures déjà construites) est
+enregistré dans un seul fichier. Aux lancements suivants, le fichier est ouvert avec mmap : les
+tableaux numpy sont sérialisés hors bande (pickle protocole 5) et relus directement depuis la
+projection en mémoire du fichier, sans copie.
+
+Le fichier contient les empreintes des données traitées et du code des graphiques : si l'un d'eux
+a changé, l'instantané est ignoré et reconstruit.
+
+Format du fichier :
+    MAGIC | taille de l'en-tête (8 octets) | en-tête JSON | pickle | buffers alignés sur 64 octets
+Les positions du pickle et des buffers dans l'en-tête sont relatives au début des données, c'est-à-dire
+à la première position alignée après l'en-tête : elles ne dépendent pas de la taille de l'en-tête.
+"""
+import os
+import json
+import mmap
+import pickle
+import hashlib
+
+SNAPSHOT_PATH = "./data/processed/dashboard.snapshot"
+
+MAGIC = b"SNCFSNAP2"
+ALIGNMENT = 64 # Alignement des buffers, pour que numpy puisse les utiliser tels quels
+
+def file_hash(path: str) -> str:
+    """
+    Empreinte d'un fichier, ou de tous les fichiers d'un répertoire (jeu de données Parquet partitionné).
+
+    Args:
+        path (str): Chemin du fichier ou du répertoire.
+    Returns:
+        str: Empreinte hexadécimale, ou None si le chemin n'existe pas.
+    """
+    if os.path.isdir(path):
+        file_paths = sorted(
+            os.path.join(root, name) for root, _, names in os.walk(path) for name in names
+            if "__pycache__" not in root # Les fichiers compilés changent sans que le code change
+        )
+    elif os.path.isfile(path):
+        file_paths = [path]
+    else:
+        return None
+    digest = hashlib.blake2b(digest_size=16)
+    for file_path in file_paths:
+        digest.update(os.path.relpath(file_path, path).encode())
+        with open(file_path, "rb") as file:
+            for block in iter(lambda: file.read(1 << 20), b""):
+                digest.update(block)
+    return digest.hexdigest()
+
+def compute_hashes(paths: list) -> dict:
+    """
+    Returns:
+        dict: Dictionnaire chemin -> empreinte pour chaque chemin de ``paths``.
+    """
+    return {path: file_hash(path) for path in paths}
+
+def _align(offset: int) -> int:
+    return (offset + ALIGNMENT - 1) // ALIGNMENT * ALIGNMENT
+
+def _data_start(header_size: int) -> int:
+    # Début des données : première position alignée après l'en-tête
+    return _align(len(MAGIC) + 8 + header_size)
+
+def save_snapshot(state: dict, hashes: dict, path: str = SNAPSHOT_PATH):
+    """
+    Enregistre l'état du dashboard. Le fichier est d'abord écrit à côté puis renommé, pour qu'un
+    lancement concurrent ne lise jamais un fichier à moitié écrit.
+
+    Args:
+        state (dict): État à enregistrer (DataFrames, layout Dash...), doit être picklable.
+        hashes (dict): Empreintes des données et du code dont dépend l'état (voir compute_hashes).
+        path (str): Chemin de l'instantané.
+    """
+    buffers = []
+    payload = pickle.dumps(state, protocol=5, buffer_callback=buffers.append)
+    raw_buffers = [buffer.raw() for buffer in buffers]
+
+    header = {"hashes": hashes, "payload": [0, len(payload)], "buffers": []}
+    offset = _align(len(payload))
+    for raw_buffer in raw_buffers:
+        header["buffers"].append([offset, raw_buffer.nbytes])
+        offset = _align(offset + raw_buffer.nbytes)
+    header_bytes = json.dumps(header).encode()
+    data_start = _data_start(len(header_bytes))
+
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "wb") as file:
+        file.write(MAGIC)
+        file.write(len(header_bytes).to_bytes(8, "little"))
+        file.write(header_bytes)
+        for (position, _), data in zip([header["payload"], *header["buffers"]], [payload, *raw_buffers]):
+            file.seek(data_start + position)
+            file.write(data)
+    os.replace(tmp_path, path)
+
+def read_header(path: str = SNAPSHOT_PATH) -> dict:
+    """
+    Lit l'en-tête de l'instantané sans lire le reste du fichier.
+
+    Returns:
+        dict: L'en-tête, ou None si le fichier n'existe pas ou n'est pas un instantané. La clé "data_start"
+        donne la position des données, à laquelle s'ajoutent les positions du pickle et des buffers.
+    """
+    if not os.path.isfile(path):
+        return None
+    with open(path, "rb") as file:
+        if file.read(len(MAGIC)) != MAGIC:
+            return None
+        header_size = int.from_bytes(file.read(8), "little")
+        header = json.loads(file.read(header_size))
+    header["data_start"] = _data_start(header_size)
+    return header
+
+def load_snapshot(hashes: dict, path: str = SNAPSHOT_PATH) -> dict:
+    """
+    Charge l'état du dashboard si l'instantané existe et correspond aux empreintes données.
+    Les tableaux numpy de l'état pointent directement dans la projection en mémoire du fichier
+    (en lecture seule) : le fichier n'est lu depuis le disque qu'au fur et à mesure des accès.
+
+    Args:
+        hashes (dict): Empreintes actuelles des données et du code (voir compute_hashes).
+        path (str): Chemin de l'instantané.
+    Returns:
+        dict: L'état enregistré, ou None si l'instantané est absent ou périmé.
+    """
+    header = read_header(path)
+    if header is None or header["hashes"] != hashes:
+        return None
+    with open(path, "rb") as file:
+        mapped = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) # Reste ouvert tant que des tableaux l'utilisent
+    view = memoryview(mapped)[header["data_start"]:]
+    payload_offset, payload_size = header["payload"]
+    buffers = [view[offset:offset + size] for offset, size in header["buffers"]]
+    return pickle.loads(view[payload_offset:payload_offset + payload_size], buffers=buffers)
@@ -0,0 +1,165 @@
+"""
+Rattachement des gares à la commune qui les contient, par jointure spatiale.
+
+merge_gares_communes associait les gares aux communes par le code postal de frequentation-gares.csv.
+Un code postal couvre souvent plusieurs communes, d'où des correspondances ambiguës. Ici on utilise
+la géométrie des gares : chaque gare est rattachée au polygone de commune qui la contient.
+
+Les polygones des communes (un fichier GeoJSON de plusieurs dizaines de Mo) ne sont lus qu'une fois :
+ils sont mis en cache au format WKB dans ``INDEX_CACHE_PATH`` (un seul tableau d'octets et les positions
+de chaque polygone, lisibles sans pickle), avec l'empreinte du fichier source.
+L'index spatial (STRtree de shapely) est reconstruit au chargement, ce qui prend quelques millisecondes,
+et toutes les gares sont rattachées en un seul appel à ``STRtree.query``.
+
+Les rattachements sont enregistrés dans ``ASSIGNMENTS_PATH``. Lors d'un nouveau traitement, seules les
+gares nouvelles ou dont les coordonnées ont changé sont rattachées à nouveau.
+"""
+import os
+
+import numpy as np
+import pandas as pd
+import geopandas as gpd
+import shapely
+
+from src.profiling import instrument
+from src.snapshot import file_hash
+
+COMMUNES_POLYGONS_PATH = "./data/raw/communes-version-simplifiee.geojson" # Voir config/sources.json
+INDEX_CACHE_PATH = "./data/processed/communes_index.npz"
+ASSIGNMENTS_PATH = "./data/processed/gares_localisation.csv"
+COORDINATE_TOLERANCE = 1e-8 # Écart en degrés (environ 1 mm) en dessous duquel une gare n'a pas bougé
+
+def build_commune_index(communes_polygons_df: gpd.GeoDataFrame, source_hash: str = None) -> dict:
+    """
+    Construit l'index spatial des communes.
+
+    Args:
+        communes_polygons_df (gpd.GeoDataFrame): Polygones des communes, avec leur code INSEE dans la colonne "code".
+        source_hash (str): Empreinte du fichier source, enregistrée avec le cache.
+    Returns:
+        dict: Codes INSEE, géométries et STRtree des communes, et empreinte du fichier source.
+    """
+    communes_polygons_df = communes_polygons_df[communes_polygons_df.geometry.notna()].to_crs("EPSG:4326")
+    geometries = communes_polygons_df.geometry.to_numpy()
+    return {
+        "code_commune_INSEE": communes_polygons_df["code"].astype(str).to_numpy(dtype=str),
+        "geometries": geometries,
+        "tree": shapely.STRtree(geometries),
+        "source_hash": source_hash,
+    }
+
+def save_commune_index(index: dict, cache_path: str = INDEX_CACHE_PATH):
+    """
+    Enregistre les géométries de l'index au format WKB. L'arbre n'est pas enregistré, il est reconstruit au chargement.
+    Les WKB sont concaténés dans un seul tableau d'octets, avec la position de début de chacun : le cache se lit
+    sans pickle.
+    """
+    wkb = shapely.to_wkb(index["geometries"])
+    offsets = np.zeros(len(wkb) + 1, dtype=np.int64)
+    offsets[1:] = np.cumsum([len(geometry) for geometry in wkb])
+    np.savez(
+        cache_path,
+        code_commune_INSEE=index["code_commune_INSEE"],
+        wkb=np.frombuffer(b"".join(wkb), dtype=np.uint8),
+        wkb_offsets=offsets,
+        source_hash=np.array(index["source_hash"] or ""),
+    )
+
+@instrument
+def load_commune_index(source_path: str = COMMUNES_POLYGONS_PATH, cache_path: str = INDEX_CACHE_PATH) -> dict:
+    """
+    Charge l'index spatial des communes depuis le cache s'il correspond au fichier source,
+    sinon lit le fichier source, construit l'index et met à jour le cache.
+
+    Args:
+        source_path (str): Chemin du GeoJSON des polygones des communes.
+        cache_path (str): Chemin du cache.
+    Returns:
+        dict: L'index (voir build_commune_index).
+    """
+    source_hash = file_hash(source_path)
+    if os.path.isfile(cache_path):
+        with np.load(cache_path, allow_pickle=False) as cache:
+            if "wkb_offsets" in cache.files and str(cache["source_hash"]) == source_hash:
+                wkb, offsets = cache["wkb"].tobytes(), cache["wkb_offsets"]
+                geometries = shapely.from_wkb([wkb[start:end] for start, end in zip(offsets[:-1], offsets[1:])])
+                return {
+                    "code_commune_INSEE": cache["code_commune_INSEE"],
+                    "geometries": geometries,
+                    "tree": shapely.STRtree(geometries),
+                    "source_hash": source_hash,
+                }
+    index = build_commune_index(gpd.read_file(source_path), source_hash)
+    save_commune_index(index, cache_path)
+    return index
+
+def assign_communes(index: dict, points: np.ndarray) -> np.ndarray:
+    """
+    Rattache des points aux communes qui les contiennent, en un seul appel à l'index spatial.
+
+    Args:
+        index (dict): L'index (voir build_commune_index).
+        points (np.ndarray): Tableau de points shapely (longitude, latitude).
+    Returns:
+        np.ndarray: Code INSEE de la commune de chaque point, None pour les points hors de toute commune
+        (en mer, à l'étranger, ou exactement sur une limite de communes).
+    """
+    codes = np.full(len(points), None, dtype=object)
+    point_index, commune_index = index["tree"].query(points, predicate="within")
+    # Les communes ne se chevauchent pas : au plus une commune par point. Par sécurité, on garde la première.
+    point_index, first = np.unique(point_index, return_index=True)
+    codes[point_index] = index["code_commune_INSEE"][commune_index[first]]
+    return codes
+
+@instrument
+def assign_stations(gares_df: gpd.GeoDataFrame, index: dict, previous: pd.DataFrame = None) -> pd.DataFrame:
+    """
+    Rattache chaque gare à sa commune. Si on donne les rattachements d'un traitement précédent,
+    seules les gares nouvelles ou dont les coordonnées ont changé sont rattachées à nouveau.
+    Les rattachements précédents ne sont pas réutilisés si les polygones des communes ont changé.
+
+    Args:
+        gares_df (gpd.GeoDataFrame): Gares traitées par process_gares.
+        index (dict): L'index des communes (voir load_commune_index).
+        previous (pd.DataFrame): Rattachements précédents (voir load_assignments), ou None.
+    Returns:
+        pd.DataFrame: Colonnes code_uic, x, y, code_commune_INSEE et index_hash (empreinte des polygones).
+    """
+    gares_df = gares_df[gares_df.geometry.notna()].drop_duplicates(subset=["code_uic"])
+    gares_df = gares_df.to_crs("EPSG:4326")
+    assignments = pd.DataFrame({
+        "code_uic": gares_df["code_uic"].to_numpy(),
+        "x": gares_df.geometry.x.to_numpy(),
+        "y": gares_df.geometry.y.to_numpy(),
+    })
+    assignments["code_commune_INSEE"] = None
+    to_assign = np.ones(len(assignments), dtype=bool)
+
+    if previous is not None:
+        previous = previous[previous["index_hash"] == index["source_hash"]]
+        previous = previous.drop_duplicates(subset=["code_uic"])
+        known = assignments.merge(
+            previous[["code_uic", "x", "y", "code_commune_INSEE"]],
+            on="code_uic", how="left", suffixes=("", "_previous")
+        )
+        # Comparaison avec une tolérance : des coordonnées relues depuis un CSV peuvent différer au dernier chiffre
+        unchanged = (
+            np.isclose(known["x"], known["x_previous"], rtol=0, atol=COORDINATE_TOLERANCE)
+            & np.isclose(known["y"], known["y_previous"], rtol=0, atol=COORDINATE_TOLERANCE)
+        )
+        assignments.loc[unchanged, "code_commune_INSEE"] = known.loc[unchanged, "code_commune_INSEE_previous"].to_numpy()
+        to_assign = ~unchanged
+
+    points = gares_df.geometry.to_numpy()[to_assign]
+    assignments.loc[to_assign, "code_commune_INSEE"] = assign_communes(index, points)
+    assignments["index_hash"] = index["source_hash"]
+    return assignments
+
+def load_assignments(path: str = ASSIGNMENTS_PATH) -> pd.DataFrame:
+    """
+    Returns:
+        pd.DataFrame: Les rattachements enregistrés lors du traitement précédent, ou None s'il n'y en a pas.
+    """
+    if not os.path.isfile(path):
+        return None
+    return pd.read_csv(path, dtype={"code_commune_INSEE": str, "index_hash": str}, float_precision="round_trip")
@@ -0,0 +1,143 @@
+"""
+Indicateurs de séries temporelles par gare, calculés sur la table longue gares_communes
+(une ligne par gare et par année, voir merge_gares_communes).
+
+Tous les indicateurs sont calculés en une seule fois pour toutes les gares, de façon vectorisée
+(groupby / transform, pas de boucle sur les gares), puis stockés comme colonnes de la table.
+Le dashboard n'a plus qu'à filtrer et trier ces colonnes.
+"""
+import numpy as np
+import pandas as pd
+
+from src.profiling import instrument
+
+BASELINE_YEAR = 2019 # Année de référence pour le ratio de reprise (dernière année avant le COVID)
+ANOMALY_THRESHOLD = 3 # Seuil du z-score au-delà duquel une variation est considérée comme anormale
+
+# Colonnes ajoutées par add_station_metrics, avec leur libellé pour le dashboard
+METRICS = {
+    "variation_annuelle": "Variation annuelle (%)",
+    "ratio_reprise": f"Ratio de reprise (vs {BASELINE_YEAR})",
+    "tcam": "Taux de croissance annuel moyen (%)",
+    "zscore_variation": "Z-score de la variation annuelle",
+}
+
+@instrument
+def add_station_metrics(gares_communes_df: pd.DataFrame, value_column: str = "Total Voyageurs",
+                        baseline_year: int = BASELINE_YEAR, year_moments: pd.DataFrame = None) -> pd.DataFrame:
+    """
+    Ajoute à la table longue des gares les indicateurs suivants :
+    - variation_annuelle : variation en % par rapport à l'année précédente de la même gare ;
+    - ratio_reprise : fréquentation de l'année divisée par celle de ``baseline_year`` (1 = niveau retrouvé) ;
+    - tcam : taux de croissance annuel moyen (CAGR) en % entre la première et la dernière année connues de la gare,
+      identique sur toutes les lignes de la gare ;
+    - zscore_variation : écart de la variation (en log) de la gare à la moyenne des variations de toutes les gares
+      la même année, en nombre d'écarts-types ;
+    - anomalie : True si la valeur absolue du z-score dépasse ``ANOMALY_THRESHOLD``.
+
+    Les variations depuis ou vers une fréquentation nulle ou manquante valent NaN.
+
+    Args:
+        gares_communes_df (pd.DataFrame): Table longue des gares (colonnes code_uic, Année et ``value_column``).
+        value_column (str): Colonne de fréquentation à utiliser.
+        baseline_year (int): Année de référence du ratio de reprise.
+        year_moments (pd.DataFrame): Moments par année de la variation en log de toutes les gares, pour calculer
+            les z-scores quand la table ne contient qu'une partie des gares (voir log_change_moments).
+            Si None, ils sont calculés sur la table.
+    Returns:
+        pd.DataFrame: Copie de la table triée par gare et année, avec les colonnes des indicateurs.
+    """
+    metrics_df = gares_communes_df.sort_values(["code_uic", "Année"]).reset_index(drop=True) # Copie triée, pour que shift() suive les années
+    values = metrics_df[value_column].astype("float64").where(lambda v: v > 0) # Les fréquentations nulles rendent les ratios infinis
+    years = metrics_df["Année"].astype("float64")
+    by_station = values.groupby(metrics_df["code_uic"])
+
+    # Variation annuelle : on vérifie que la ligne précédente est bien l'année précédente de la même gare
+    previous_values = by_station.shift(1)
+    previous_years = years.groupby(metrics_df["code_uic"]).shift(1)
+    previous_values = previous_values.where(previous_years == years - 1)
+    metrics_df["variation_annuelle"] = (values / previous_values - 1) * 100
+
+    # Ratio de reprise par rapport à l'année de référence
+    baseline = values.where(metrics_df["Année"] == baseline_year).groupby(metrics_df["code_uic"]).transform("max")
+    metrics_df["ratio_reprise"] = values / baseline
+
+    # Taux de croissance annuel moyen entre la première et la dernière année où la fréquentation est connue
+    known = metrics_df.loc[values.notna(), ["code_uic"]].assign(value=values, year=years) # Lignes triées, donc first / last suivent les années
+    station_span = known.groupby("code_uic").agg(
+        first_value=("value", "first"),
+        last_value=("value", "last"),
+        first_year=("year", "first"),
+        last_year=("year", "last"),
+    )
+    n_years = (station_span["last_year"] - station_span["first_year"]).where(lambda n: n > 0)
+    cagr = ((station_span["last_value"] / station_span["first_value"]) ** (1 / n_years) - 1) * 100
+    metrics_df["tcam"] = metrics_df["code_uic"].map(cagr)
+
+    # Z-score de la variation en log, par rapport aux autres gares de la même année
+    if year_moments is None:
+        year_moments = log_change_moments(metrics_df)
+    return score_variations(metrics_df, year_moments)
+
+def _log_change(metrics_df: pd.DataFrame) -> pd.Series:
+    # log(valeur / valeur précédente), retrouvé à partir de la variation annuelle en %
+    return np.log1p(metrics_df["variation_annuelle"] / 100)
+
+def log_change_moments(metrics_df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Moments par année de la variation en log : nombre de valeurs, moyenne et somme des carrés des écarts
+    à la moyenne. Les moments de plusieurs paquets de gares se combinent avec combine_moments, ce qui permet
+    de calculer les z-scores par rapport à toutes les gares sans les avoir toutes en mémoire.
+
+    Args:
+        metrics_df (pd.DataFrame): Table avec la colonne variation_annuelle (voir add_station_metrics).
+    Returns:
+        pd.DataFrame: Colonnes n, mean et m2, indexée par année.
+    """
+    log_change = _log_change(metrics_df)
+    by_year = log_change.groupby(metrics_df["Année"])
+    moments = pd.DataFrame({"n": by_year.count(), "mean": by_year.mean()})
+    moments["m2"] = ((log_change - by_year.transform("mean")) ** 2).groupby(metrics_df["Année"]).sum()
+    moments.index = moments.index.astype("float64")
+    return moments[moments["n"] > 0]
+
+def combine_moments(moments_list: list) -> pd.DataFrame:
+    """
+    Combine les moments de plusieurs paquets de gares (formule de Chan et al. pour la variance).
+
+    Args:
+        moments_list (list): Moments renvoyés par log_change_moments.
+    Returns:
+        pd.DataFrame: Les moments de l'ensemble des gares, même format.
+    """
+    combined = None
+    for moments in moments_list:
+        if combined is None:
+            combined = moments.copy()
+            continue
+        left = combined.reindex(combined.index.union(moments.index)).fillna({"n": 0, "mean": 0.0, "m2": 0.0})
+        right = moments.reindex(left.index).fillna({"n": 0, "mean": 0.0, "m2": 0.0})
+        n = left["n"] + right["n"]
+        delta = right["mean"] - left["mean"]
+        combined = pd.DataFrame({
+            "n": n,
+            "mean": left["mean"] + delta * right["n"] / n,
+            "m2": left["m2"] + right["m2"] + delta ** 2 * left["n"] * right["n"] / n,
+        })
+    return combined if combined is not None else pd.DataFrame({"n": [], "mean": [], "m2": []})
+
+def score_variations(metrics_df: pd.DataFrame, year_moments: pd.DataFrame) -> pd.DataFrame:
+    """
+    Calcule zscore_variation et anomalie à partir des moments par année de toutes les gares.
+
+    Args:
+        metrics_df (pd.DataFrame): Table avec la colonne variation_annuelle (voir add_station_metrics).
+        year_moments (pd.DataFrame): Moments par année (voir log_change_moments et combine_moments).
+    Returns:
+        pd.DataFrame: La table, avec les colonnes zscore_variation et anomalie.
+    """
+    stats = year_moments.reindex(metrics_df["Année"].astype("float64").to_numpy())
+    std = np.sqrt(stats["m2"] / (stats["n"] - 1)).where(stats["n"] > 1) # Écart-type corrigé, comme pandas
+    metrics_df["zscore_variation"] = (_log_change(metrics_df).to_numpy() - stats["mean"].to_numpy()) / std.to_numpy()
+    metrics_df["anomalie"] = metrics_df["zscore_variation"].abs() > ANOMALY_THRESHOLD
+    return metrics_df
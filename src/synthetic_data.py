@@ -0,0 +1,303 @@
+"""
+Génération de jeux de données synthétiques ayant la même forme que les données brutes de la SNCF
+(voir data/provenance.md). Les fichiers de data/raw ne sont que des exemples, ces générateurs
+permettent de tester et de mesurer le pipeline à une échelle réaliste, ou plus grande.
+
+Un facteur d'échelle de 1 correspond à peu près à la taille des vrais jeux de données
+(~1 500 tronçons de lignes, ~3 900 gares, ~39 000 communes). Les colonnes et leurs types sont
+ceux des fichiers téléchargés par get_data.py, avant traitement.
+"""
+import numpy as np
+import pandas as pd
+import geopandas as gpd
+import shapely
+
+YEARS = list(range(2015, 2024)) # Années présentes dans frequentation-gares.csv
+
+REGIONS = [
+    "Auvergne-Rhône-Alpes", "Bourgogne-Franche-Comté", "Bretagne", "Centre-Val de Loire", "Corse",
+    "Grand Est", "Hauts-de-France", "Île-de-France", "Normandie", "Nouvelle-Aquitaine",
+    "Occitanie", "Pays de la Loire", "Provence-Alpes-Côte d'Azur",
+]
+
+# Emprise approximative de la France métropolitaine (longitude, latitude)
+FRANCE_BOUNDS = (-1.5, 43.0, 7.5, 50.5)
+
+BASE_SIZES = {
+    "lines": 300, # Nombre de lignes (chaque ligne est découpée en plusieurs tronçons)
+    "gares": 3900,
+    "communes": 39000,
+    "emissions": 130,
+}
+
+def _format_pk(pk_m: np.ndarray) -> np.ndarray:
+    """
+    Formate des points kilométriques en mètres au format "kkk+mmm" utilisé par la SNCF.
+    """
+    pk_m = pk_m.astype(int)
+    return np.char.add(np.char.add(np.char.zfill((pk_m // 1000).astype(str), 3), "+"), np.char.zfill((pk_m % 1000).astype(str), 3))
+
+def generate_shapes_speeds(scale: float = 1.0, seed: int = 0) -> tuple:
+    """
+    Génère les tronçons de formes-des-lignes-du-rfn.geojson et vitesse-maximale-nominale-sur-ligne.geojson.
+    Chaque ligne est une marche aléatoire découpée en tronçons. La plupart des lignes partent de l'extrémité
+    d'un tronçon déjà créé, pour obtenir un réseau connexe. Les tronçons de vitesse reprennent exactement
+    la géométrie des tronçons de forme, comme dans les vraies données.
+
+    Args:
+        scale (float): Facteur d'échelle.
+        seed (int): Graine du générateur aléatoire.
+    Returns:
+        tuple: (shapes, speeds), deux GeoDataFrame au format brut.
+    """
+    rng = np.random.default_rng(seed)
+    n_lines = max(1, int(BASE_SIZES["lines"] * scale))
+    min_lon, min_lat, max_lon, max_lat = FRANCE_BOUNDS
+
+    segments = [] # Liste de tableaux de coordonnées (5 sommets par tronçon)
+    endpoints = [] # Extrémités existantes, pour brancher les nouvelles lignes dessus
+    line_index = []
+    pk_start = []
+    pk_end = []
+    for line in range(n_lines):
+        if endpoints and rng.random() < 0.8:
+            start = endpoints[rng.integers(len(endpoints))]
+        else:
+            start = np.array([rng.uniform(min_lon, max_lon), rng.uniform(min_lat, max_lat)])
+        heading = rng.uniform(0, 2 * np.pi)
+        n_segments = rng.integers(2, 9)
+        steps = rng.normal(0, 0.3, size=n_segments * 4).cumsum() + heading # Direction qui varie doucement
+        lengths = rng.uniform(0.01, 0.05, size=n_segments * 4)
+        vertices = np.vstack([start, start + np.column_stack([np.cos(steps) * lengths, np.sin(steps) * lengths]).cumsum(axis=0)])
+        vertices[:, 0] = vertices[:, 0].clip(min_lon, max_lon)
+        vertices[:, 1] = vertices[:, 1].clip(min_lat, max_lat)
+        pk = 0
+        for i in range(n_segments):
+            segment = vertices[i * 4:i * 4 + 5]
+            segments.append(segment)
+            line_index.append(line)
+            pk_start.append(pk)
+            pk += int(np.hypot(*np.diff(segment, axis=0).T).sum() * 80000) # ~80 km par degré
+            pk_end.append(pk)
+        endpoints.extend([vertices[0], vertices[-1]])
+
+    n = len(segments)
+    line_index = np.array(line_index)
+    pk_start = np.array(pk_start)
+    pk_end = np.array(pk_end)
+    codes = (np.arange(n_lines) * 1000 + 100000).astype(str)[line_index]
+    geometry = shapely.linestrings(np.stack(segments))
+
+    shapes = gpd.GeoDataFrame({
+        "code_ligne": codes,
+        "libelle": rng.choice(["Exploitée", "Fermée", "Neutralisée"], size=n, p=[0.85, 0.1, 0.05]),
+        "pk_debut_r": _format_pk(pk_start),
+        "pk_fin_r": _format_pk(pk_end),
+        "geometry": geometry,
+    }, crs="EPSG:4326")
+
+    # Vitesses : les lignes rapides ont des vitesses élevées sur tous leurs tronçons
+    line_speed = rng.choice([40, 60, 80, 100, 120, 140, 160, 200, 220, 300, 320], size=n_lines,
+                            p=[0.1, 0.15, 0.15, 0.15, 0.12, 0.1, 0.1, 0.05, 0.03, 0.03, 0.02])
+    v_max = line_speed[line_index].astype(object) # Colonne de type object, comme à la lecture du vrai fichier
+    v_max[rng.random(n) < 0.02] = None # Quelques vitesses manquantes, comme dans les vraies données
+    speeds = gpd.GeoDataFrame({
+        "code_ligne": codes,
+        "lib_ligne": np.char.add("Ligne synthétique ", codes),
+        "v_max": v_max,
+        "pkd": _format_pk(pk_start),
+        "pkf": _format_pk(pk_end),
+        "geometry": geometry,
+    }, crs="EPSG:4326")
+    return shapes, speeds
+
+def generate_communes_population(scale: float = 1.0, seed: int = 0) -> tuple:
+    """
+    Génère 20230823-communes-departement-region.csv et insee-pop-communes.csv.
+    Comme dans les vraies données, un code postal peut être partagé par plusieurs communes.
+
+    Args:
+        scale (float): Facteur d'échelle.
+        seed (int): Graine du générateur aléatoire.
+    Returns:
+        tuple: (communes, population), deux DataFrame au format brut.
+    """
+    rng = np.random.default_rng(seed + 1)
+    n = max(1, int(BASE_SIZES["communes"] * scale))
+    min_lon, min_lat, max_lon, max_lat = FRANCE_BOUNDS
+
+    departements = rng.integers(1, 96, size=n)
+    # Numéro de la commune dans son département : sur 3 chiffres comme les vrais codes, ou plus aux grandes
+    # échelles, pour que les codes restent uniques
+    numero = pd.Series(departements).groupby(departements).cumcount().to_numpy() + 1
+    code_insee = departements * 10 ** max(3, len(str(numero.max()))) + numero
+    communes = pd.DataFrame({
+        "code_commune_INSEE": code_insee, # Entier, le zéro initial est perdu comme dans le vrai fichier
+        "nom_commune_postal": np.char.add("COMMUNE ", np.arange(n).astype(str)),
+        "code_postal": departements * 1000 + rng.integers(0, 100, size=n) * 10,
+        "latitude": rng.uniform(min_lat, max_lat, size=n),
+        "longitude": rng.uniform(min_lon, max_lon, size=n),
+        "nom_commune": np.char.add("Commune ", np.arange(n).astype(str)),
+        "code_departement": np.char.zfill(departements.astype(str), 2),
+        "nom_departement": np.char.add("Département ", departements.astype(str)),
+        "nom_region": np.array(REGIONS)[departements % len(REGIONS)],
+    })
+    population = pd.DataFrame({
+        "DEPCOM": np.char.zfill(code_insee.astype(str), 5),
+        "COM": communes["nom_commune"],
+        "PMUN": rng.lognormal(6.5, 1.5, size=n).astype(int),
+    })
+    population["PCAP"] = (population["PMUN"] * 0.02).astype(int)
+    population["PTOT"] = population["PMUN"] + population["PCAP"]
+    return communes, population
+
+def generate_commune_polygons(communes: pd.DataFrame) -> gpd.GeoDataFrame:
+    """
+    Génère communes-version-simplifiee.geojson : chaque commune est la cellule de Voronoï de son point
+    (latitude, longitude), limitée à l'emprise de la France. Les cellules ne se chevauchent pas et
+    couvrent toute l'emprise, comme des limites de communes.
+
+    Args:
+        communes (pd.DataFrame): Communes générées par generate_communes_population.
+    Returns:
+        gpd.GeoDataFrame: Les polygones des communes au format brut (colonnes code et nom).
+    """
+    points = shapely.points(communes["longitude"].to_numpy(), communes["latitude"].to_numpy())
+    bounds = shapely.box(*FRANCE_BOUNDS)
+    cells = shapely.get_parts(shapely.voronoi_polygons(shapely.multipoints(points), extend_to=bounds))
+    cells = shapely.intersection(cells, bounds)
+    # Les cellules ne sont pas dans l'ordre des points : on retrouve le point contenu dans chaque cellule
+    cell_index, point_index = shapely.STRtree(points).query(cells, predicate="contains")
+    return gpd.GeoDataFrame({
+        "code": np.char.zfill(communes["code_commune_INSEE"].to_numpy().astype(str), 5)[point_index],
+        "nom": communes["nom_commune"].to_numpy()[point_index],
+        "geometry": cells[cell_index],
+    }, crs="EPSG:4326")
+
+def generate_points(n: int, seed: int = 0) -> np.ndarray:
+    """
+    Returns:
+        np.ndarray: ``n`` points shapely tirés uniformément dans l'emprise de la France.
+    """
+    rng = np.random.default_rng(seed + 5)
+    min_lon, min_lat, max_lon, max_lat = FRANCE_BOUNDS
+    return shapely.points(rng.uniform(min_lon, max_lon, size=n), rng.uniform(min_lat, max_lat, size=n))
+
+def generate_gares(shapes: gpd.GeoDataFrame, communes: pd.DataFrame, scale: float = 1.0, seed: int = 0) -> gpd.GeoDataFrame:
+    """
+    Génère liste-des-gares.geojson. Les gares sont placées sur les extrémités des tronçons,
+    et associées à une commune tirée au hasard.
+
+    Args:
+        shapes (gpd.GeoDataFrame): Tronçons générés par generate_shapes_speeds.
+        communes (pd.DataFrame): Communes générées par generate_communes_population.
+        scale (float): Facteur d'échelle.
+        seed (int): Graine du générateur aléatoire.
+    Returns:
+        gpd.GeoDataFrame: Les gares au format brut.
+    """
+    rng = np.random.default_rng(seed + 2)
+    n = max(1, int(BASE_SIZES["gares"] * scale))
+    # Codes UIC uniques : 87xxxxxx comme les vraies gares françaises, sur plus de chiffres si les gares sont plus nombreuses
+    n_codes = max(999999, 2 * n)
+    segment = rng.integers(len(shapes), size=n)
+    points = shapely.get_point(shapes.geometry.values[segment], rng.choice([0, -1], size=n))
+    points = shapely.points(shapely.get_coordinates(points) + rng.normal(0, 1e-4, size=(n, 2)))
+    commune = rng.integers(len(communes), size=n)
+
+    gares = gpd.GeoDataFrame({
+        "code_uic": (87000000 + rng.choice(n_codes, size=n, replace=False)).astype(str),
+        "libelle": np.char.add("Gare ", np.arange(n).astype(str)),
+        "fret": rng.choice(["O", "N"], size=n, p=[0.3, 0.7]),
+        "voyageurs": rng.choice(["O", "N"], size=n, p=[0.8, 0.2]),
+        "code_ligne": shapes["code_ligne"].values[segment],
+        "rg_troncon": 1,
+        "pk": shapes["pk_debut_r"].values[segment],
+        "commune": communes["nom_commune"].str.upper().values[commune],
+        "departemen": communes["nom_departement"].str.upper().values[commune],
+        "geometry": points,
+    }, crs="EPSG:4326")
+    return gares
+
+def generate_frequentations(gares: gpd.GeoDataFrame, communes: pd.DataFrame, years: list = None, seed: int = 0) -> pd.DataFrame:
+    """
+    Génère frequentation-gares.csv au format large (une colonne par année), avec une chute
+    de la fréquentation en 2020 et une reprise progressive ensuite.
+    Le code postal de chaque gare est celui de sa commune.
+
+    Args:
+        gares (gpd.GeoDataFrame): Gares générées par generate_gares.
+        communes (pd.DataFrame): Communes générées par generate_communes_population.
+        years (list): Années à générer, par défaut 2015-2023.
+        seed (int): Graine du générateur aléatoire.
+    Returns:
+        pd.DataFrame: La fréquentation au format brut.
+    """
+    rng = np.random.default_rng(seed + 3)
+    years = years or YEARS
+    n = len(gares)
+    code_postal_by_commune = pd.Series(communes["code_postal"].values, index=communes["nom_commune"].str.upper().values)
+    frequentations = pd.DataFrame({
+        "Nom de la gare": gares["libelle"].values,
+        "Code UIC": gares["code_uic"].astype(int).values,
+        "Code postal": code_postal_by_commune.reindex(gares["commune"].values).values,
+        "Segmentation DRG": rng.choice(["a", "b", "c"], size=n, p=[0.05, 0.25, 0.7]),
+    })
+    base = rng.lognormal(11, 2, size=n)
+    covid_effect = {2020: 0.55, 2021: 0.75, 2022: 0.92}
+    for year in years:
+        trend = 1.02 ** (year - years[0]) * covid_effect.get(year, 1.0)
+        travelers = (base * trend * rng.lognormal(0, 0.05, size=n)).round()
+        frequentations[f"Total Voyageurs {year}"] = travelers
+        frequentations[f"Total Voyageurs + Non voyageurs {year}"] = (travelers * 1.1).round()
+    return frequentations
+
+def generate_emissions(scale: float = 1.0, seed: int = 0) -> pd.DataFrame:
+    """
+    Génère emission-co2-perimetre-complet.csv (une ligne par trajet origine-destination).
+
+    Args:
+        scale (float): Facteur d'échelle.
+        seed (int): Graine du générateur aléatoire.
+    Returns:
+        pd.DataFrame: Les émissions au format brut.
+    """
+    rng = np.random.default_rng(seed + 4)
+    n = max(1, int(BASE_SIZES["emissions"] * scale))
+    distance = rng.uniform(20, 1000, size=n).round()
+    return pd.DataFrame({
+        "Transporteur": rng.choice(["TGV", "TER", "Intercités", "International"], size=n),
+        "Origine": np.char.add("Gare ", rng.integers(0, 1000, size=n).astype(str)),
+        "Origine_uic": 87000000 + rng.integers(0, 999999, size=n),
+        "Destination": np.char.add("Gare ", rng.integers(0, 1000, size=n).astype(str)),
+        "Destination_uic": 87000000 + rng.integers(0, 999999, size=n),
+        "Distance entre les gares": distance,
+        "Train - Empreinte carbone (kgCO2e)": distance * rng.uniform(0.002, 0.03, size=n),
+        "Autocar longue distance - Empreinte carbone (kgCO2e)": distance * 0.03,
+        "Avion - Empreinte carbone (kgCO2e)": distance * rng.uniform(0.15, 0.3, size=n),
+        "Voiture électrique (2,2 pers.) - Empreinte carbone (kgCO2e)": distance * 0.045,
+        "Voiture thermique (2,2 pers.) - Empreinte carbone (kgCO2e)": distance * 0.1,
+    })
+
+def generate_raw_datasets(scale: float = 1.0, seed: int = 0) -> dict:
+    """
+    Génère l'ensemble des jeux de données bruts, dans le même ordre que get_data.py.
+
+    Args:
+        scale (float): Facteur d'échelle.
+        seed (int): Graine du générateur aléatoire.
+    Returns:
+        dict: Dictionnaire nom du jeu de données -> DataFrame.
+    """
+    shapes, speeds = generate_shapes_speeds(scale, seed)
+    communes, population = generate_communes_population(scale, seed)
+    gares = generate_gares(shapes, communes, scale, seed)
+    return {
+        "shapes": shapes,
+        "speeds": speeds,
+        "gares": gares,
+        "frequentations": generate_frequentations(gares, communes, seed=seed),
+        "communes": communes,
+        "population": population,
+        "emissions": generate_emissions(scale, seed),
+    }
@@ -0,0 +1,263 @@
+"""
+Validation des données brutes, juste après leur lecture par treat_data.py.
+
+Pour chaque source, ``SCHEMAS`` décrit les colonnes attendues et des règles sur les lignes : type et plage
+des valeurs numériques, valeurs autorisées, unicité d'une clé, géométrie présente, et références vers une
+autre source (un code UIC de frequentation-gares.csv doit exister dans liste-des-gares.geojson, par exemple).
+Toutes les règles sont vectorisées (une opération pandas par règle, aucune boucle sur les lignes).
+
+Chaque règle a une gravité :
+
+- ``"quarantaine"`` : les lignes qui ne la respectent pas sont retirées des données et enregistrées dans
+  ``QUARANTINE_PATH/<source>.csv``, avec la liste des règles non respectées ;
+- ``"avertissement"`` : les lignes sont gardées, elles sont seulement comptées dans le rapport.
+
+Une colonne attendue manquante est une erreur : le traitement s'arrête avec une ValueError, car les
+fonctions de src/data_processing_utils.py échoueraient de toute façon plus loin.
+"""
+import os
+import json
+import time
+
+import pandas as pd
+
+QUARANTINE_PATH = "./data/quarantine/"
+REPORT_PATH = "./data/quarantine/rapport_validation.json"
+
+YEARS = [str(year) for year in range(2015, 2024)] # Années lues par process_frequentations
+
+# Règles : (nom, type, paramètres, gravité). Les types sont les fonctions _check_<type> ci-dessous.
+SCHEMAS = {
+    "shapes": {
+        "columns": ["code_ligne", "libelle", "geometry", "pk_debut_r", "pk_fin_r"],
+        "rules": [
+            ("geometrie_manquante", "geometry", {}, "quarantaine"),
+        ],
+    },
+    "speeds": {
+        "columns": ["code_ligne", "lib_ligne", "v_max", "geometry", "pkd", "pkf"],
+        "rules": [
+            ("v_max_invalide", "numeric", {"column": "v_max", "minimum": 0, "maximum": 350, "nullable": True}, "quarantaine"),
+            # process_speeds convertit v_max en entier sans arrondir : une vitesse décimale est une donnée erronée
+            ("v_max_non_entier", "integer", {"column": "v_max"}, "quarantaine"),
+            ("geometrie_manquante", "geometry", {}, "quarantaine"),
+        ],
+    },
+    "gares": {
+        "columns": ["code_uic", "libelle", "fret", "voyageurs", "code_ligne", "geometry"],
+        "rules": [
+            ("code_uic_invalide", "numeric", {"column": "code_uic", "minimum": 0, "maximum": None, "nullable": False}, "quarantaine"),
+            ("fret_invalide", "values", {"column": "fret", "allowed": ["O", "N"]}, "quarantaine"),
+            ("voyageurs_invalide", "values", {"column": "voyageurs", "allowed": ["O", "N"]}, "quarantaine"),
+            ("geometrie_manquante", "geometry", {}, "quarantaine"),
+            # Une gare peut apparaître sur plusieurs lignes, process_gares garde la première
+            ("code_uic_duplique", "unique", {"columns": ["code_uic"]}, "avertissement"),
+        ],
+    },
+    "frequentations": {
+        "columns": ["Nom de la gare", "Code UIC", "Code postal", "Segmentation DRG",
+                    *[f"Total Voyageurs {year}" for year in YEARS],
+                    *[f"Total Voyageurs + Non voyageurs {year}" for year in YEARS]],
+        "rules": [
+            ("code_uic_invalide", "numeric", {"column": "Code UIC", "minimum": 0, "maximum": None, "nullable": False}, "quarantaine"),
+            ("code_uic_duplique", "unique", {"columns": ["Code UIC"]}, "quarantaine"),
+            *[(f"voyageurs_{year}_invalide", "numeric", {"column": f"Total Voyageurs {year}", "minimum": 0, "maximum": None, "nullable": True}, "quarantaine")
+              for year in YEARS],
+            *[(f"voyageurs_non_voyageurs_{year}_invalide", "numeric",
+               {"column": f"Total Voyageurs + Non voyageurs {year}", "minimum": 0, "maximum": None, "nullable": True}, "quarantaine")
+              for year in YEARS],
+            ("gare_inconnue", "reference", {"column": "Code UIC", "reference": "code_uic"}, "avertissement"),
+        ],
+    },
+    "communes": {
+        "columns": ["code_commune_INSEE", "code_postal", "latitude", "longitude", "nom_commune",
+                    "code_departement", "nom_departement", "nom_region"],
+        "rules": [
+            ("code_insee_manquant", "numeric_or_text", {"column": "code_commune_INSEE"}, "quarantaine"),
+            ("latitude_invalide", "numeric", {"column": "latitude", "minimum": -90, "maximum": 90, "nullable": True}, "quarantaine"),
+            ("longitude_invalide", "numeric", {"column": "longitude", "minimum": -180, "maximum": 180, "nullable": True}, "quarantaine"),
+        ],
+    },
+    "population": {
+        "columns": ["DEPCOM", "PTOT"],
+        "rules": [
+            ("code_insee_manquant", "numeric_or_text", {"column": "DEPCOM"}, "quarantaine"),
+            ("code_insee_duplique", "unique", {"columns": ["DEPCOM"]}, "quarantaine"),
+            ("population_invalide", "numeric", {"column": "PTOT", "minimum": 0, "maximum": None, "nullable": True}, "quarantaine"),
+            ("commune_inconnue", "reference", {"column": "DEPCOM", "reference": "code_commune_INSEE"}, "avertissement"),
+        ],
+    },
+    "emissions": {
+        "columns": ["Transporteur", "Distance entre les gares", "Train - Empreinte carbone (kgCO2e)"],
+        "rules": [
+            ("distance_invalide", "numeric", {"column": "Distance entre les gares", "minimum": 0, "maximum": None, "nullable": False}, "quarantaine"),
+            ("empreinte_train_invalide", "numeric", {"column": "Train - Empreinte carbone (kgCO2e)", "minimum": 0, "maximum": None, "nullable": True}, "quarantaine"),
+        ],
+    },
+}
+
+def clear_quarantine(quarantine_path: str = QUARANTINE_PATH):
+    """
+    Supprime les fichiers de quarantaine d'un traitement précédent.
+    """
+    if os.path.isdir(quarantine_path):
+        for file_name in os.listdir(quarantine_path):
+            os.remove(os.path.join(quarantine_path, file_name))
+
+def _check_numeric(df: pd.DataFrame, column: str, minimum: float, maximum: float, nullable: bool, **_) -> pd.Series:
+    """
+    Lignes dont la valeur n'est pas un nombre, est hors de [minimum, maximum], ou est manquante si ``nullable`` est False.
+    """
+    values = pd.to_numeric(df[column], errors="coerce")
+    bad = values.isna() & df[column].notna() # Valeur présente mais pas numérique
+    if not nullable:
+        bad |= df[column].isna()
+    if minimum is not None:
+        bad |= values < minimum
+    if maximum is not None:
+        bad |= values > maximum
+    return bad
+
+def _check_integer(df: pd.DataFrame, column: str, **_) -> pd.Series:
+    """
+    Lignes dont la valeur est un nombre non entier (les valeurs manquantes ou non numériques relèvent de _check_numeric).
+    """
+    values = pd.to_numeric(df[column], errors="coerce")
+    return values.notna() & (values != values.round())
+
+def _check_numeric_or_text(df: pd.DataFrame, column: str, **_) -> pd.Series:
+    """
+    Lignes dont l'identifiant est manquant ou vide (les codes INSEE de Corse, "2A004", ne sont pas numériques).
+    """
+    return df[column].isna() | (df[column].astype(str).str.strip() == "")
+
+def _check_values(df: pd.DataFrame, column: str, allowed: list, **_) -> pd.Series:
+    """
+    Lignes dont la valeur est présente mais n'est pas dans ``allowed``.
+    """
+    return df[column].notna() & ~df[column].isin(allowed)
+
+def _check_unique(df: pd.DataFrame, columns: list, **_) -> pd.Series:
+    """
+    Lignes dont la clé a déjà été vue plus haut : la première occurrence est gardée.
+    """
+    return df.duplicated(subset=columns, keep="first")
+
+def _check_geometry(df: pd.DataFrame, **_) -> pd.Series:
+    return df.geometry.isna() | df.geometry.is_empty
+
+def _check_reference(df: pd.DataFrame, column: str, reference: str, references: dict, **_) -> pd.Series:
+    """
+    Lignes dont la valeur n'existe pas dans la source de référence. Les codes sont comparés sous forme
+    de texte sans zéros initiaux ni ".0", car les différentes sources ne les écrivent pas de la même façon.
+    Si la référence n'est pas fournie, la règle n'est pas vérifiée.
+    """
+    if reference not in references:
+        return pd.Series(False, index=df.index)
+    normalize = lambda values: values.astype(str).str.strip().str.replace(r"\.0$", "", regex=True).str.lstrip("0")
+    return ~normalize(df[column]).isin(set(normalize(pd.Series(references[reference]).dropna())))
+
+CHECKS = {
+    "numeric": _check_numeric,
+    "integer": _check_integer,
+    "numeric_or_text": _check_numeric_or_text,
+    "values": _check_values,
+    "unique": _check_unique,
+    "geometry": _check_geometry,
+    "reference": _check_reference,
+}
+
+def validate(df: pd.DataFrame, source: str, references: dict = None, quarantine_path: str = QUARANTINE_PATH,
+             append: bool = False) -> tuple:
+    """
+    Valide une source brute selon son schéma et met en quarantaine les lignes invalides.
+
+    Args:
+        df (pd.DataFrame): Données brutes, telles que lues dans data/raw.
+        source (str): Nom de la source (clé de SCHEMAS).
+        references (dict): Valeurs des autres sources pour les règles de référence, par exemple
+            {"code_uic": gares["code_uic"]}.
+        quarantine_path (str): Répertoire où enregistrer les lignes invalides, rien n'est enregistré si None.
+        append (bool): Si True, les lignes invalides sont ajoutées au fichier de quarantaine existant
+            (source lue par paquets, voir src/partitioned_data.py).
+    Returns:
+        tuple: (données sans les lignes en quarantaine, rapport de validation sous forme de dictionnaire)
+    """
+    start = time.perf_counter()
+    schema = SCHEMAS[source]
+    missing_columns = [column for column in schema["columns"] if column not in df.columns]
+    if missing_columns:
+        raise ValueError(f"Colonnes manquantes dans les données {source} : {missing_columns}")
+
+    failures = {}
+    for name, check, params, severity in schema["rules"]:
+        failures[name] = (CHECKS[check](df, references=references or {}, **params), severity)
+
+    quarantined = pd.Series(False, index=df.index)
+    for mask, severity in failures.values():
+        if severity == "quarantaine":
+            quarantined |= mask
+
+    if quarantine_path is not None and quarantined.any():
+        _write_quarantine(df[quarantined], {name: mask[quarantined] for name, (mask, severity) in failures.items()}, source, quarantine_path, append)
+
+    report = {
+        "source": source,
+        "lignes": len(df),
+        "quarantaine": int(quarantined.sum()),
+        "regles": {name: {"lignes": int(mask.sum()), "gravite": severity} for name, (mask, severity) in failures.items() if mask.any()},
+        "duree_s": round(time.perf_counter() - start, 6),
+    }
+    return df[~quarantined], report
+
+def _write_quarantine(bad_rows: pd.DataFrame, failures: dict, source: str, quarantine_path: str, append: bool = False):
+    """
+    Enregistre les lignes en quarantaine, avec les règles qu'elles ne respectent pas (colonne regles).
+    """
+    reasons = pd.Series("", index=bad_rows.index)
+    for name, mask in failures.items():
+        reasons = reasons.where(~mask, reasons + name + ";")
+    bad_rows = pd.DataFrame(bad_rows).assign(regles=reasons.str.rstrip(";"))
+    if "geometry" in bad_rows.columns:
+        bad_rows["geometry"] = bad_rows["geometry"].astype(str) # WKT, pour un CSV lisible
+    os.makedirs(quarantine_path, exist_ok=True)
+    file_path = os.path.join(quarantine_path, f"{source}.csv")
+    if append and os.path.isfile(file_path):
+        bad_rows.to_csv(file_path, mode="a", header=False, index=False)
+    else:
+        bad_rows.to_csv(file_path, index=False)
+
+def merge_reports(reports: list) -> dict:
+    """
+    Fusionne les rapports d'une même source validée par paquets.
+
+    Returns:
+        dict: Un rapport unique, ou None si ``reports`` est vide.
+    """
+    if not reports:
+        return None
+    merged = {"source": reports[0]["source"], "lignes": 0, "quarantaine": 0, "regles": {}, "duree_s": 0.0}
+    for report in reports:
+        merged["lignes"] += report["lignes"]
+        merged["quarantaine"] += report["quarantaine"]
+        merged["duree_s"] = round(merged["duree_s"] + report["duree_s"], 6)
+        for name, rule in report["regles"].items():
+            merged_rule = merged["regles"].setdefault(name, {"lignes": 0, "gravite": rule["gravite"]})
+            merged_rule["lignes"] += rule["lignes"]
+    return merged
+
+def write_report(reports: list, path: str = REPORT_PATH):
+    """
+    Enregistre les rapports de validation en JSON et en affiche un résumé (une ligne par source).
+
+    Args:
+        reports (list): Rapports renvoyés par validate.
+        path (str): Chemin du fichier JSON.
+    """
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path, "w", encoding="utf-8") as report_file:
+        json.dump(reports, report_file, ensure_ascii=False, indent=2)
+    for report in reports:
+        rules = ", ".join(f"{name} ({rule['lignes']})" for name, rule in report["regles"].items()) or "aucune anomalie"
+        print(f"Validation {report['source']:<15} {report['lignes']:>8} lignes, {report['quarantaine']:>6} en quarantaine, "
+              f"{report['duree_s']:.3f}s : {rules}")
@@ -0,0 +1,50 @@
+import time
+
+from src.data_store import DataStore, DataVersion, clear_completion_marker, write_completion_marker
+
+def test_cached_computes_once():
+    version = DataVersion(1, {}, {})
+    calls = []
+    assert version.cached("a", lambda: calls.append(1) or "valeur") == "valeur"
+    assert version.cached("a", lambda: calls.append(1) or "autre") == "valeur"
+    assert len(calls) == 1
+
+def test_cached_evicts_least_recently_used():
+    version = DataVersion(1, {}, {}, cache_max_entries=2)
+    version.cached("a", lambda: 1)
+    version.cached("b", lambda: 2)
+    version.cached("a", lambda: 0) # "a" devient la plus récemment utilisée
+    version.cached("c", lambda: 3) # "b" est oubliée
+    assert version.cached("a", lambda: -1) == 1
+    assert version.cached("b", lambda: -2) == -2
+
+def test_reload_keeps_acquired_version_until_release(tmp_path):
+    states = iter([{"n": 1}, {"n": 2}])
+    store = DataStore(lambda: next(states), [str(tmp_path)])
+    with store.acquire() as version:
+        store.reload()
+        assert version.state == {"n": 1} # Toujours utilisable pendant la requête
+        assert store.current.number == 2
+    assert version.state is None
+
+def test_watcher_reloads_only_on_new_marker(tmp_path):
+    marker_path = str(tmp_path / "_TRAITEMENT_TERMINE")
+    data_path = tmp_path / "donnees.csv"
+    data_path.write_text("a")
+    loads = []
+    store = DataStore(lambda: loads.append(1) or len(loads), [str(data_path)], poll_interval=0.01, marker_path=marker_path)
+    store.start()
+    try:
+        clear_completion_marker(marker_path)
+        data_path.write_text("ab") # Écriture en cours : pas de rechargement sans marqueur
+        time.sleep(0.1)
+        assert store.current.number == 1
+        write_completion_marker(marker_path)
+        deadline = time.time() + 2
+        while store.current.number == 1 and time.time() < deadline:
+            time.sleep(0.01)
+        assert store.current.number == 2
+        time.sleep(0.1) # Le même marqueur ne déclenche pas un second rechargement
+        assert store.current.number == 2
+    finally:
+        store.stop()
@@ -0,0 +1,83 @@
+import io
+from types import SimpleNamespace
+
+import pandas as pd
+import geopandas as gpd
+import pyarrow.parquet as pq
+import shapely
+from flask import Flask
+
+from src import export
+from src.data_store import DataStore
+from src.charts.covid import region_year_totals
+from src.charts.reseau import filter_speed_range
+
+def state() -> dict:
+    shapes_speeds = gpd.GeoDataFrame({
+        "v_max": [80, 160, 300],
+        "lib_ligne": ["Ligne 1", "Ligne 2", "Ligne 3"],
+    }, geometry=[shapely.LineString([(0, i), (1, i)]) for i in range(3)], crs="EPSG:4326")
+    gares_covid = pd.DataFrame({
+        "Année": [2019, 2019, 2020, 2020, 2020],
+        "nom_region": ["Bretagne", "Île-de-France", "Bretagne", "Bretagne", "Île-de-France"],
+        "Total Voyageurs": [10.0, 100.0, 5.0, 3.0, 40.0],
+    })
+    return {"shapes_speeds_df": shapes_speeds, "gares_covid": gares_covid}
+
+def client(tmp_path, monkeypatch):
+    monkeypatch.setattr(export, "CHUNK_ROWS", 2) # Plusieurs paquets même sur de petites données
+    store = DataStore(state, [str(tmp_path)], marker_path=str(tmp_path / "_TRAITEMENT_TERMINE"))
+    app = SimpleNamespace(server=Flask(__name__))
+    export.register_export_routes(app, store)
+    return app.server.test_client(), store
+
+def test_filter_speed_range_includes_bounds():
+    assert filter_speed_range(state()["shapes_speeds_df"], [80, 160])["v_max"].tolist() == [80, 160]
+
+def test_region_year_totals():
+    totals = region_year_totals(state()["gares_covid"], with_idf=False)
+    assert totals.to_dict("records") == [
+        {"Année": 2019, "nom_region": "Bretagne", "Total Voyageurs": 10.0},
+        {"Année": 2020, "nom_region": "Bretagne", "Total Voyageurs": 8.0},
+    ]
+
+def test_csv_export_is_filtered_and_projected(tmp_path, monkeypatch):
+    test_client, _ = client(tmp_path, monkeypatch)
+    response = test_client.get("/export/troncons?v_min=100&columns=lib_ligne,v_max")
+    assert response.status_code == 200
+    assert pd.read_csv(io.BytesIO(response.data)).to_dict("records") == [
+        {"lib_ligne": "Ligne 2", "v_max": 160},
+        {"lib_ligne": "Ligne 3", "v_max": 300},
+    ]
+
+def test_parquet_export_has_one_row_group_per_chunk(tmp_path, monkeypatch):
+    test_client, _ = client(tmp_path, monkeypatch)
+    response = test_client.get("/export/troncons?format=parquet")
+    parquet_file = pq.ParquetFile(io.BytesIO(response.data))
+    assert parquet_file.metadata.num_rows == 3
+    assert parquet_file.metadata.num_row_groups == 2
+    assert shapely.from_wkb(parquet_file.read().column("geometry").to_pylist()[0]).equals(shapely.LineString([(0, 0), (1, 0)]))
+
+def test_geojson_export(tmp_path, monkeypatch):
+    test_client, _ = client(tmp_path, monkeypatch)
+    features = test_client.get("/export/troncons?format=geojson&columns=v_max").get_json()["features"]
+    assert [feature["properties"] for feature in features] == [{"v_max": 80}, {"v_max": 160}, {"v_max": 300}]
+
+def test_etag_and_not_modified(tmp_path, monkeypatch):
+    test_client, store = client(tmp_path, monkeypatch)
+    first = test_client.get("/export/voyageurs_regions?annees=2020,2019&regions=Bretagne")
+    etag = first.headers["ETag"]
+    # Paramètres équivalents dans un autre ordre : même ETag
+    same = test_client.get("/export/voyageurs_regions?regions=Bretagne&annees=2019,2020", headers={"If-None-Match": etag})
+    assert same.status_code == 304 and same.data == b""
+    other = test_client.get("/export/voyageurs_regions?annees=2019", headers={"If-None-Match": etag})
+    assert other.status_code == 200
+    store.reload() # Nouvelle version des données : l'ETag change
+    assert test_client.get("/export/voyageurs_regions?annees=2020,2019&regions=Bretagne", headers={"If-None-Match": etag}).status_code == 200
+
+def test_invalid_requests(tmp_path, monkeypatch):
+    test_client, _ = client(tmp_path, monkeypatch)
+    assert test_client.get("/export/inconnu").status_code == 404
+    assert test_client.get("/export/voyageurs_regions?format=geojson").status_code == 400
+    assert test_client.get("/export/troncons?columns=inconnue").status_code == 400
+    assert test_client.get("/export/troncons?v_min=abc").status_code == 400
@@ -0,0 +1,75 @@
+import threading
+
+from src.jobs import JobQueue
+
+def wait(job, timeout: float = 2):
+    job.future.exception(timeout=timeout) # Attend la fin de la tâche, sans lever son exception
+
+def test_same_key_shares_one_job():
+    queue = JobQueue()
+    release = threading.Event()
+    calls = []
+
+    def func(job):
+        calls.append(1)
+        release.wait(2)
+        return "carte"
+
+    first = queue.submit("cle", func, group=("page 1", "carte"))
+    second = queue.submit("cle", func, group=("page 2", "carte"))
+    assert first is second
+    release.set()
+    wait(first)
+    assert calls == [1]
+    assert first.status == "terminée"
+    queue.shutdown()
+
+def test_result_is_released_once_every_group_has_read_it():
+    queue = JobQueue()
+    job = queue.submit("cle", lambda job: "carte", group="page 1")
+    queue.submit("cle", lambda job: "carte", group="page 2")
+    wait(job)
+    assert queue.take_result(job, "page 1") == "carte"
+    assert job.result == "carte" # La page 2 ne l'a pas encore lu
+    assert queue.take_result(job, "page 2") == "carte"
+    assert job.result is None and queue.take_result(job, "page 2") is None
+    assert queue.submit("cle", lambda job: "carte", group="page 1") is not job # Résultat libéré : nouvelle tâche
+    queue.shutdown()
+
+def test_superseded_job_is_cancelled_at_next_progress():
+    queue = JobQueue(max_workers=1)
+    started, release = threading.Event(), threading.Event()
+
+    def slow(job):
+        started.set()
+        release.wait(2)
+        job.progress(0.5, "Rendu")
+        return "ancienne carte"
+
+    old = queue.submit("option A", slow, group="page")
+    started.wait(2)
+    new = queue.submit("option B", lambda job: "nouvelle carte", group="page")
+    release.set()
+    wait(old)
+    wait(new)
+    assert old.status == "annulée"
+    assert new.status == "terminée" and new.result == "nouvelle carte"
+    queue.shutdown()
+
+def test_pending_job_is_never_run():
+    queue = JobQueue(max_workers=1)
+    release = threading.Event()
+    blocker = queue.submit("bloque", lambda job: release.wait(2), group="autre page")
+    pending = queue.submit("option A", lambda job: "jamais", group="page")
+    queue.submit("option B", lambda job: "carte", group="page")
+    assert pending.status == "annulée"
+    release.set()
+    wait(blocker)
+    queue.shutdown()
+
+def test_error_is_reported():
+    queue = JobQueue()
+    job = queue.submit("cle", lambda job: 1 / 0)
+    wait(job)
+    assert job.status == "erreur" and "ZeroDivisionError" in job.error
+    queue.shutdown()
@@ -0,0 +1,51 @@
+import numpy as np
+import pandas as pd
+
+import src.data_processing_utils as data_utils
+from src import synthetic_data
+from src.partitioned_data import available_years, build_gares_communes_dataset, read_gares_communes
+from src.station_metrics import add_station_metrics
+
+def build_dataset(tmp_path, chunksize: int = 50) -> tuple:
+    """
+    Construit le jeu de données partitionné à partir de petites données synthétiques.
+
+    Returns:
+        tuple: (répertoire du jeu de données, gares et fréquentation calculées en mémoire comme dans treat_data.py)
+    """
+    raw = synthetic_data.generate_raw_datasets(scale=0.05, seed=0)
+    frequentations_path = tmp_path / "frequentation-gares.csv"
+    raw["frequentations"].to_csv(frequentations_path, sep=";", index=False)
+    gares = data_utils.process_gares(raw["gares"])
+    communes_population = data_utils.treat_and_merge_communes_population(raw["communes"], raw["population"])
+
+    dataset_path = str(tmp_path / "gares_communes_parquet")
+    build_gares_communes_dataset(str(frequentations_path), gares, communes_population, dataset_path, chunksize=chunksize)
+
+    gares_frequentations = data_utils.merge_gares_frequentations(gares, data_utils.process_frequentations(raw["frequentations"]))
+    expected = add_station_metrics(data_utils.merge_gares_communes(gares_frequentations, communes_population))
+    return dataset_path, expected
+
+def test_chunked_build_matches_in_memory(tmp_path):
+    dataset_path, expected = build_dataset(tmp_path)
+    result = read_gares_communes(dataset_path)
+    # Les gares sans fréquentation ne sont pas gardées dans le jeu partitionné
+    expected = expected[expected["Année"].notna()]
+    key = ["code_uic", "Année"]
+    result = result.sort_values(key).reset_index(drop=True)
+    expected = expected.sort_values(key).reset_index(drop=True)
+    assert len(result) == len(expected)
+    assert (result["code_uic"].to_numpy() == expected["code_uic"].to_numpy()).all()
+    assert (result["Année"].to_numpy() == expected["Année"].to_numpy()).all()
+    for column in ["Total Voyageurs", "PTOT", "variation_annuelle", "zscore_variation"]:
+        assert np.allclose(result[column].astype(float), expected[column].astype(float), equal_nan=True), column
+    assert (result["anomalie"].fillna(False).to_numpy() == expected["anomalie"].fillna(False).to_numpy()).all()
+    assert result.geometry.geom_equals_exact(expected.geometry, tolerance=1e-9).all()
+
+def test_read_prunes_years_and_columns(tmp_path):
+    dataset_path, _ = build_dataset(tmp_path)
+    assert {2019, 2020}.issubset(available_years(dataset_path))
+    gares_covid = read_gares_communes(dataset_path, years=[2019, 2020], columns=["nom_region", "Total Voyageurs"])
+    assert sorted(gares_covid["Année"].unique()) == [2019, 2020]
+    assert list(gares_covid.columns) == ["Année", "nom_region", "Total Voyageurs"]
+    assert isinstance(gares_covid, pd.DataFrame) and "geometry" not in gares_covid.columns
@@ -0,0 +1,38 @@
+import json
+
+import pandas as pd
+
+from src import profiling
+
+def double(df: pd.DataFrame) -> pd.DataFrame:
+    return pd.concat([df, df])
+
+def test_instrumented_call_writes_one_record(tmp_path, monkeypatch):
+    # Équivalent de SNCF_PROFILE=1, lu à l'import du module
+    report_path = tmp_path / "run_report.jsonl"
+    monkeypatch.setitem(profiling._config, "enabled", True)
+    monkeypatch.setitem(profiling._config, "profiler", None)
+    monkeypatch.setitem(profiling._config, "report_path", str(report_path))
+
+    result = profiling.instrument(double, name="double")(pd.DataFrame({"a": [1, 2, 3]}))
+    assert len(result) == 6
+    records = [json.loads(line) for line in report_path.read_text(encoding="utf-8").splitlines()]
+    assert len(records) == 1
+    assert records[0]["stage"] == "double"
+    assert (records[0]["rows_in"], records[0]["rows_out"]) == (3, 6)
+    assert records[0]["status"] == "ok"
+
+def test_disabled_instrumentation_calls_function_directly(tmp_path, monkeypatch):
+    report_path = tmp_path / "run_report.jsonl"
+    monkeypatch.setitem(profiling._config, "enabled", False)
+    monkeypatch.setitem(profiling._config, "report_path", str(report_path))
+    calls = []
+
+    def func(*args, **kwargs):
+        calls.append((args, kwargs))
+        return "résultat"
+
+    monkeypatch.setattr(profiling, "profile_stage", None) # Un appel à profile_stage échouerait
+    assert profiling.instrument(func)(1, key=2) == "résultat"
+    assert calls == [((1,), {"key": 2})]
+    assert not report_path.exists()
@@ -0,0 +1,28 @@
+import pandas as pd
+import geopandas as gpd
+import shapely
+
+from src.charts.reseau import generate_widget, map_caption
+from src.data_processing_utils import compute_length_totals
+
+def shapes_speeds() -> gpd.GeoDataFrame:
+    return gpd.GeoDataFrame({
+        "v_max": [80, 160],
+        "lib_ligne": ["Ligne 1", "Ligne 2"],
+        "code_ligne": ["1", "2"],
+        "nom_region": ["Bretagne", "Normandie"],
+        "longueur_km": [10.0, 30.0],
+    }, geometry=[shapely.LineString([(0, 45), (1, 45)]), shapely.LineString([(0, 46), (1, 46)])], crs="EPSG:4326")
+
+def gares() -> gpd.GeoDataFrame:
+    return gpd.GeoDataFrame({"Total Voyageurs": [], "Année": [], "nom_region": [], "libelle": [], "PTOT": []}, geometry=[], crs="EPSG:4326")
+
+def test_widget_with_empty_length_totals():
+    # Par exemple quand la validation a mis toutes les lignes de longueurs_reseau.csv en quarantaine
+    empty_totals = compute_length_totals(shapes_speeds()).iloc[0:0]
+    assert "0 % de la longueur" in str(generate_widget(shapes_speeds(), gares(), empty_totals))
+    assert map_caption(empty_totals, "Toutes les lignes") == "Lignes affichées : 0 km, soit 0 % du réseau."
+
+def test_widget_shares():
+    layout = str(generate_widget(shapes_speeds(), gares(), compute_length_totals(shapes_speeds())))
+    assert "50 % des tronçons" in layout and "75 % de la longueur" in layout
@@ -0,0 +1,57 @@
+import numpy as np
+
+from src import routing
+
+def random_graph(n_nodes: int = 60, n_edges: int = 150, seed: int = 0) -> dict:
+    rng = np.random.default_rng(seed)
+    u = rng.integers(0, n_nodes, n_edges)
+    v = rng.integers(0, n_nodes, n_edges)
+    keep = u != v
+    u, v = u[keep], v[keep]
+    lengths = rng.uniform(100, 10000, len(u))
+    travel_times = lengths / rng.uniform(5, 90, len(u))
+    graph = routing._to_csr(n_nodes, u, v, travel_times, lengths, np.arange(len(u)))
+    graph["landmark_dist"] = routing._select_landmarks(graph, 4, np.array([0]))
+    return graph
+
+def test_landmark_distances_are_float64():
+    assert random_graph()["landmark_dist"].dtype == np.float64
+
+def test_shortest_path_matches_dijkstra():
+    graph = random_graph()
+    for source in range(0, 60, 7):
+        dist, _ = routing.dijkstra(graph, source)
+        for target in range(60):
+            seconds, _, nodes, segments = routing.shortest_path(graph, source, target)
+            if np.isinf(dist[target]):
+                assert np.isinf(seconds) and nodes == []
+            else:
+                assert np.isclose(seconds, dist[target])
+                assert nodes[0] == source and nodes[-1] == target
+                assert len(segments) == len(nodes) - 1
+
+def test_landmark_heuristic_is_a_lower_bound():
+    graph = random_graph(seed=1)
+    target = 5
+    heuristic = routing._landmark_heuristic(graph, target)
+    dist, _ = routing.dijkstra(graph, target) # Graphe non orienté : d(v, target) = d(target, v)
+    for node in range(60):
+        if np.isfinite(dist[node]):
+            assert heuristic(node) <= dist[node] + 1e-9
+
+def test_compute_route_rejects_unmapped_stations():
+    from src.charts.itineraires import compute_route
+
+    graph = random_graph()
+    graph["station_code_uic"] = np.array([87000001, 87000002, 87000003])
+    graph["station_name"] = np.array(["Gare A", "Gare B", "Gare C"])
+    graph["station_lonlat"] = np.zeros((3, 2))
+    graph["station_node"] = np.array([0, 1, -1]) # Gare C trop loin du réseau
+
+    segments, reachable, summary = compute_route(graph, 87000003, 87000001, 60)
+    assert segments == [] and reachable is None
+    assert summary == "Gare de départ non rattachée au réseau."
+    segments, reachable, summary = compute_route(graph, 99999999, None, 60) # Gare inconnue
+    assert summary == "Gare de départ non rattachée au réseau."
+    segments, reachable, summary = compute_route(graph, 87000001, 87000003, 60)
+    assert segments == [] and summary.startswith("Gare d'arrivée non rattachée au réseau.")
@@ -0,0 +1,43 @@
+import numpy as np
+import pandas as pd
+import geopandas as gpd
+import shapely
+
+from src.data_processing_utils import LAMBERT_93, add_segment_lengths, compute_length_totals
+
+def segments() -> pd.DataFrame:
+    return pd.DataFrame({
+        "code_ligne": ["1", "1", "2"],
+        "lib_ligne": ["Ligne 1", "Ligne 1", "Ligne 2"],
+        "v_max": [80, 160, 300],
+        "nom_region": ["Bretagne", "Bretagne", "Normandie"],
+        "longueur_km": [10.0, 30.0, 60.0],
+    })
+
+def test_length_totals_by_group():
+    totals = compute_length_totals(segments()).set_index(["groupe", "cle"])
+    assert totals.loc[("ligne", "1"), "longueur_km"] == 40.0
+    assert totals.loc[("ligne", "1"), "longueur_grande_vitesse_km"] == 30.0
+    assert totals.loc[("ligne", "1"), "nombre_troncons"] == 2
+    assert totals.loc[("region", "Normandie"), "part_km"] == 60.0
+    assert totals.loc[("vitesse", "80"), "libelle"] == "80"
+    for groupe in ("vitesse", "ligne", "region"):
+        assert np.isclose(totals.loc[groupe, "part_km"].sum(), 100)
+
+def test_segment_lengths_are_metric():
+    # Tronçon de 10 km en Lambert-93, près de Paris
+    line = gpd.GeoSeries([shapely.LineString([(650000, 6860000), (660000, 6860000)])], crs=LAMBERT_93).to_crs("EPSG:4326")
+    shapes_speeds = gpd.GeoDataFrame({"v_max": [160]}, geometry=line)
+    communes = pd.DataFrame({"latitude": [48.85, 43.3], "longitude": [2.35, 5.4], "nom_region": ["Île-de-France", "Provence-Alpes-Côte d'Azur"]})
+    result = add_segment_lengths(shapes_speeds, communes)
+    assert np.isclose(result["longueur_km"].iloc[0], 10, rtol=1e-6)
+    assert result["nom_region"].iloc[0] == "Île-de-France"
+
+def test_segment_region_at_mid_length():
+    # Les sommets sont regroupés au début du tronçon : le milieu en longueur est loin d'eux
+    line = gpd.GeoSeries([shapely.LineString([(650000, 6860000), (651000, 6860000), (652000, 6860000), (750000, 6860000)])], crs=LAMBERT_93)
+    shapes_speeds = gpd.GeoDataFrame({"v_max": [160]}, geometry=line.to_crs("EPSG:4326"))
+    towns = gpd.GeoSeries([shapely.Point(651000, 6860000), shapely.Point(700000, 6860000)], crs=LAMBERT_93).to_crs("EPSG:4326")
+    communes = pd.DataFrame({"latitude": towns.y, "longitude": towns.x, "nom_region": ["Début", "Milieu"]})
+    result = add_segment_lengths(shapes_speeds, communes)
+    assert result["nom_region"].iloc[0] == "Milieu"
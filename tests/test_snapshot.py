@@ -0,0 +1,28 @@
+import pickle
+
+from src import snapshot
+
+def test_round_trip_with_many_buffers(tmp_path):
+    path = str(tmp_path / "dashboard.snapshot")
+    hashes = {"data/processed/emissions.csv": "abc"}
+    # Beaucoup de buffers hors bande : un en-tête plus long que l'ancienne réservation de taille fixe
+    blobs = [bytearray(str(i).encode() * (i + 1)) for i in range(500)]
+    state = {"buffers": [pickle.PickleBuffer(blob) for blob in blobs], "layout": {"titre": "Réseau"}}
+    snapshot.save_snapshot(state, hashes, path)
+
+    loaded = snapshot.load_snapshot(hashes, path)
+    assert loaded["layout"] == {"titre": "Réseau"}
+    assert [bytes(buffer) for buffer in loaded["buffers"]] == [bytes(blob) for blob in blobs]
+
+def test_stale_hashes_are_ignored(tmp_path):
+    path = str(tmp_path / "dashboard.snapshot")
+    snapshot.save_snapshot({"a": 1}, {"main.py": "v1"}, path)
+    assert snapshot.load_snapshot({"main.py": "v2"}, path) is None
+    assert snapshot.load_snapshot({"main.py": "v1"}, path) == {"a": 1}
+
+def test_data_is_aligned(tmp_path):
+    path = str(tmp_path / "dashboard.snapshot")
+    snapshot.save_snapshot({"buffer": pickle.PickleBuffer(bytearray(100))}, {}, path)
+    header = snapshot.read_header(path)
+    positions = [header["data_start"] + header["payload"][0]] + [header["data_start"] + offset for offset, _ in header["buffers"]]
+    assert all(position % snapshot.ALIGNMENT == 0 for position in positions)
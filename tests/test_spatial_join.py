@@ -0,0 +1,50 @@
+import numpy as np
+import geopandas as gpd
+import shapely
+
+from src import spatial_join
+
+def communes() -> gpd.GeoDataFrame:
+    return gpd.GeoDataFrame(
+        {"code": ["01001", "01002"]},
+        geometry=[shapely.box(0, 0, 1, 1), shapely.box(1, 0, 2, 1)],
+        crs="EPSG:4326",
+    )
+
+def stations() -> gpd.GeoDataFrame:
+    return gpd.GeoDataFrame(
+        {"code_uic": [1, 2, 3]},
+        geometry=gpd.points_from_xy([0.123456789123, 1.5, 5.0], [0.5, 0.987654321987, 0.5]),
+        crs="EPSG:4326",
+    )
+
+def test_assign_communes():
+    index = spatial_join.build_commune_index(communes())
+    codes = spatial_join.assign_communes(index, stations().geometry.to_numpy())
+    assert codes.tolist() == ["01001", "01002", None]
+
+def test_index_cache_round_trip(tmp_path):
+    source_path = str(tmp_path / "communes.geojson")
+    cache_path = str(tmp_path / "communes_index.npz")
+    communes().to_file(source_path, driver="GeoJSON")
+    built = spatial_join.load_commune_index(source_path, cache_path)
+    with np.load(cache_path, allow_pickle=False) as cache:
+        assert cache["wkb"].dtype == np.uint8
+    cached = spatial_join.load_commune_index(source_path, cache_path)
+    assert cached["code_commune_INSEE"].tolist() == built["code_commune_INSEE"].tolist()
+    assert all(shapely.equals(cached["geometries"], built["geometries"]))
+
+def test_incremental_assignment_reuses_unchanged_stations(tmp_path, monkeypatch):
+    index = spatial_join.build_commune_index(communes(), source_hash="v1")
+    path = str(tmp_path / "gares_localisation.csv")
+    spatial_join.assign_stations(stations(), index).to_csv(path, index=False)
+    previous = spatial_join.load_assignments(path)
+
+    moved = stations()
+    moved.loc[2, "geometry"] = shapely.Point(0.5, 0.5)
+    assigned_points = []
+    assign_communes = spatial_join.assign_communes
+    monkeypatch.setattr(spatial_join, "assign_communes", lambda index, points: assigned_points.append(len(points)) or assign_communes(index, points))
+    assignments = spatial_join.assign_stations(moved, index, previous)
+    assert assigned_points == [1] # Seule la gare déplacée est rattachée à nouveau
+    assert assignments["code_commune_INSEE"].tolist() == ["01001", "01002", "01001"]
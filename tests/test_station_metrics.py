@@ -0,0 +1,34 @@
+import numpy as np
+import pandas as pd
+
+from src.station_metrics import add_station_metrics, combine_moments, log_change_moments
+
+def long_table(n_stations: int = 40, seed: int = 0) -> pd.DataFrame:
+    rng = np.random.default_rng(seed)
+    years = np.arange(2015, 2024)
+    return pd.DataFrame({
+        "code_uic": np.repeat(np.arange(n_stations), len(years)),
+        "Année": np.tile(years, n_stations),
+        "Total Voyageurs": rng.lognormal(10, 1, n_stations * len(years)),
+    })
+
+def test_metrics_of_one_station():
+    df = pd.DataFrame({"code_uic": [1, 1, 1], "Année": [2019, 2020, 2021], "Total Voyageurs": [100.0, 50.0, 200.0]})
+    metrics = add_station_metrics(df)
+    assert np.isnan(metrics["variation_annuelle"].iloc[0])
+    assert metrics["variation_annuelle"].iloc[1:].tolist() == [-50.0, 300.0]
+    assert metrics["ratio_reprise"].tolist() == [1.0, 0.5, 2.0]
+    assert np.allclose(metrics["tcam"], (2 ** 0.5 - 1) * 100)
+
+def test_missing_year_gives_no_variation():
+    df = pd.DataFrame({"code_uic": [1, 1], "Année": [2019, 2021], "Total Voyageurs": [100.0, 200.0]})
+    assert add_station_metrics(df)["variation_annuelle"].isna().all()
+
+def test_zscores_by_chunk_match_global_zscores():
+    df = long_table()
+    expected = add_station_metrics(df)
+    chunks = [df[df["code_uic"] < 13], df[(df["code_uic"] >= 13) & (df["code_uic"] < 29)], df[df["code_uic"] >= 29]]
+    moments = combine_moments([log_change_moments(add_station_metrics(chunk)) for chunk in chunks])
+    rescored = pd.concat([add_station_metrics(chunk, year_moments=moments) for chunk in chunks]).reset_index(drop=True)
+    assert np.allclose(rescored["zscore_variation"], expected["zscore_variation"], equal_nan=True)
+    assert (rescored["anomalie"] == expected["anomalie"]).all()
@@ -0,0 +1,14 @@
+from src import synthetic_data
+
+def test_insee_codes_are_unique_at_large_scale():
+    # Environ 2000 communes par département : plus que les 3 chiffres des vrais codes
+    communes, population = synthetic_data.generate_communes_population(scale=5, seed=0)
+    assert communes["code_commune_INSEE"].is_unique
+    assert population["DEPCOM"].is_unique
+
+def test_uic_codes_are_unique_beyond_six_digits(monkeypatch):
+    monkeypatch.setitem(synthetic_data.BASE_SIZES, "gares", 1_200_000)
+    shapes, _ = synthetic_data.generate_shapes_speeds(scale=0.1, seed=0)
+    communes, _ = synthetic_data.generate_communes_population(scale=0.01, seed=0)
+    gares = synthetic_data.generate_gares(shapes, communes, scale=1, seed=0)
+    assert gares["code_uic"].is_unique
@@ -0,0 +1,28 @@
+import pandas as pd
+import geopandas as gpd
+import shapely
+
+from src import validation
+from src.data_processing_utils import process_speeds
+
+def speeds(v_max: list) -> gpd.GeoDataFrame:
+    n = len(v_max)
+    return gpd.GeoDataFrame({
+        "code_ligne": ["001000"] * n,
+        "lib_ligne": ["Ligne"] * n,
+        "v_max": v_max,
+        "pkd": ["000+000"] * n,
+        "pkf": ["001+000"] * n,
+    }, geometry=[shapely.LineString([(0, 0), (1, 1)])] * n, crs="EPSG:4326")
+
+def test_non_integer_speed_is_quarantined(tmp_path):
+    valid, report = validation.validate(speeds(["160", "87.5", None, "abc", "400"]), "speeds", quarantine_path=str(tmp_path))
+    assert valid["v_max"].tolist() == ["160", None]
+    assert report["regles"]["v_max_non_entier"]["lignes"] == 1
+    assert report["regles"]["v_max_invalide"]["lignes"] == 2
+    quarantined = pd.read_csv(tmp_path / "speeds.csv")
+    assert "v_max_non_entier" in quarantined["regles"].tolist()
+
+def test_valid_speeds_are_converted_without_rounding(tmp_path):
+    valid, _ = validation.validate(speeds(["160", "220.0"]), "speeds", quarantine_path=str(tmp_path))
+    assert process_speeds(valid)["v_max"].tolist() == [160, 220]
@@ -1,16 +1,50 @@
+import os
+import time
+import argparse
+
 import pandas as pd
 import geopandas as gpd
 
 import src.data_processing_utils as data_utils
+from src import profiling
+from src import partitioned_data
+from src import station_metrics
+from src import routing
+from src import spatial_join
+from src import validation
+from src.data_store import clear_completion_marker, write_completion_marker
+
+# Lectures et écritures instrumentées (voir src/profiling.py), activées avec SNCF_PROFILE=1
+read_file = profiling.instrument(gpd.read_file, name="gpd.read_file")
+read_csv = profiling.instrument(pd.read_csv, name="pd.read_csv")
+to_file = profiling.instrument(gpd.GeoDataFrame.to_file, name="gpd.GeoDataFrame.to_file")
+to_csv = profiling.instrument(pd.DataFrame.to_csv, name="pd.DataFrame.to_csv")
 
-def main():
+def main(partitioned: bool = False, chunksize: int = 1000):
     """
     Fonction pour le traitement et l'enregistrement des données.
+
+    Args:
+        partitioned (bool): Si True, la fréquentation des gares est traitée par paquets et enregistrée dans
+            un jeu de données Parquet partitionné par année (voir src/partitioned_data.py) au lieu de
+            gares_communes.geojson.
+        chunksize (int): Nombre de gares traitées à la fois en mode partitionné.
     """
+    start = time.perf_counter()
+    clear_completion_marker() # Le dashboard ne recharge pas les données pendant le traitement (voir src/data_store.py)
+    validation.clear_quarantine()
+    reports = [] # Rapports de validation des données brutes
+    
+    def validate(df, source, references=None):
+        # Validation juste après la lecture, les lignes invalides vont dans data/quarantine (voir src/validation.py)
+        valid_df, report = validation.validate(df, source, references)
+        reports.append(report)
+        return valid_df
+    
     # Chargement des données
     # 1_shapes.ipynb et 2_speeds.ipynb
-    shapes = gpd.read_file("data/raw/formes-des-lignes-du-rfn.geojson")
-    speeds = gpd.read_file("data/raw/vitesse-maximale-nominale-sur-ligne.geojson")
+    shapes = validate(read_file("data/raw/formes-des-lignes-du-rfn.geojson"), "shapes")
+    speeds = validate(read_file("data/raw/vitesse-maximale-nominale-sur-ligne.geojson"), "speeds")
     
     processed_shapes = data_utils.process_shapes(shapes)
     processed_speeds = data_utils.process_speeds(speeds)
@@ -20,36 +54,71 @@ def main():
     
     # 3_merge_shapes_speeds.ipynb
     shapes_speeds = data_utils.merge_shapes_speeds(processed_shapes, processed_speeds)
-    shapes_speeds.to_file("data/processed/shapes_speeds.geojson", driver="GeoJSON")
     
-    # 4_frequentation_gares.ipynb
-    frequentations = pd.read_csv('data/raw/frequentation-gares.csv', sep=';')
-    processed_frequentations = data_utils.process_frequentations(frequentations)
-    # processed_frequentations.to_csv("data/processed/frequentations.csv", index=False)
+    # Longueurs des tronçons en Lambert-93, calculées une seule fois pour le dashboard
+    communes = validate(read_csv('data/raw/20230823-communes-departement-region.csv'), "communes")
+    shapes_speeds = data_utils.add_segment_lengths(shapes_speeds, communes)
+    to_file(shapes_speeds, "data/processed/shapes_speeds.geojson", driver="GeoJSON")
+    length_totals = data_utils.compute_length_totals(shapes_speeds)
+    to_csv(length_totals, "data/processed/longueurs_reseau.csv", index=False)
     
     # 5_liste_gares.ipynb
-    gares = gpd.read_file('data/raw/liste-des-gares.geojson')
+    gares = validate(read_file('data/raw/liste-des-gares.geojson'), "gares")
     processed_gares = data_utils.process_gares(gares)
     # processed_gares.to_file("data/processed/gares.geojson", driver="GeoJSON")
     
+    # Rattachement des gares à la commune qui les contient (voir src/spatial_join.py).
+    # Sans les polygones des communes, merge_gares_communes utilise le code postal.
+    if os.path.isfile(spatial_join.COMMUNES_POLYGONS_PATH):
+        commune_index = spatial_join.load_commune_index()
+        assignments = spatial_join.assign_stations(processed_gares, commune_index, spatial_join.load_assignments())
+        to_csv(assignments, spatial_join.ASSIGNMENTS_PATH, index=False)
+        processed_gares = processed_gares.merge(assignments[["code_uic", "code_commune_INSEE"]], on="code_uic", how="left")
+    
+    # Graphe du réseau pour les itinéraires (voir src/routing.py)
+    graph = routing.build_graph(shapes_speeds, processed_gares)
+    routing.save_graph(graph, routing.GRAPH_PATH)
+    
     # 6_merge_gares_frequentation.ipynb
-    communes = pd.read_csv('data/raw/20230823-communes-departement-region.csv')
-    population = pd.read_csv('data/raw/insee-pop-communes.csv', sep=';')
+    population = validate(read_csv('data/raw/insee-pop-communes.csv', sep=';'), "population",
+                          references={"code_commune_INSEE": communes["code_commune_INSEE"]})
     
     communes_population = data_utils.treat_and_merge_communes_population(communes, population)
     # communes_population.to_csv("data/processed/communes_population.csv", index=False)
     
-    gares_frequentations = data_utils.merge_gares_frequentations(processed_gares, processed_frequentations)
-    # gares_frequentations.to_file("data/processed/gares_frequentations.geojson", driver="GeoJSON")
-    
-    gares_communes = data_utils.merge_gares_communes(gares_frequentations, communes_population)
-    gares_communes.to_file("data/processed/gares_communes.geojson", driver="GeoJSON")
+    if partitioned:
+        # 4_frequentation_gares.ipynb et 6_merge_gares_frequentation.ipynb, par paquets de gares
+        partitioned_data.build_gares_communes_dataset('data/raw/frequentation-gares.csv', processed_gares, communes_population,
+                                                      chunksize=chunksize, gares_codes=gares["code_uic"], validation_reports=reports)
+    else:
+        # 4_frequentation_gares.ipynb
+        frequentations = validate(read_csv('data/raw/frequentation-gares.csv', sep=';'), "frequentations",
+                                  references={"code_uic": gares["code_uic"]})
+        processed_frequentations = data_utils.process_frequentations(frequentations)
+        # processed_frequentations.to_csv("data/processed/frequentations.csv", index=False)
+        
+        gares_frequentations = data_utils.merge_gares_frequentations(processed_gares, processed_frequentations)
+        # gares_frequentations.to_file("data/processed/gares_frequentations.geojson", driver="GeoJSON")
+        
+        gares_communes = data_utils.merge_gares_communes(gares_frequentations, communes_population)
+        gares_communes = station_metrics.add_station_metrics(gares_communes)
+        to_file(gares_communes, "data/processed/gares_communes.geojson", driver="GeoJSON")
     
     # 7_emissions-co2.ipynb
-    emissions = pd.read_csv("data/raw/emission-co2-perimetre-complet.csv", sep=';')
+    emissions = validate(read_csv("data/raw/emission-co2-perimetre-complet.csv", sep=';'), "emissions")
     emissions_processed = data_utils.process_emissions(emissions)
-    emissions_processed.to_csv("data/processed/emissions.csv", index=False)
+    to_csv(emissions_processed, "data/processed/emissions.csv", index=False)
+    
+    validation.write_report(reports)
+    write_completion_marker() # En dernier : tous les fichiers de data/processed sont écrits
+    total_time = time.perf_counter() - start
+    validation_time = sum(report["duree_s"] for report in reports)
+    print(f"Validation : {round(validation_time, 3)}s sur {round(total_time, 3)}s de traitement ({100 * validation_time / total_time:.1f} %)")
     
     
 if __name__ == "__main__":
-    main()
+    parser = argparse.ArgumentParser(description="Traitement des données brutes de data/raw vers data/processed.")
+    parser.add_argument("--partitioned", action="store_true", help="Traite la fréquentation par paquets et l'enregistre en Parquet partitionné par année.")
+    parser.add_argument("--chunksize", type=int, default=1000, help="Nombre de gares traitées à la fois en mode partitionné.")
+    args = parser.parse_args()
+    main(partitioned=args.partitioned, chunksize=args.chunksize)